@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+"""Parallel compression of zip archives
+
+The :py:class:ParallelZipWriter writes standard zip archives, but the files are compressed by a pool of processes. A
+file is split into :py:const:CHUNK_SIZE chunks which are compressed independently to raw deflate streams, every chunk
+but the last is closed by a sync flush, so the concatenated chunks are one valid deflate stream (like pigz does). The
+CRC-32 of the chunks are combined by :py:func:crc32_combine, so the main process doesn't read the compressed files.
+
+The files of already compressed formats (see :py:const:STORED_EXTENSIONS) are stored without compression.
+"""
+
+# Imports -----------------------------------------------------------------------------------------------------------
+import logging
+import os
+import time
+import zlib
+from collections import deque
+from itertools import imap, islice
+from multiprocessing import Pool, cpu_count
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED, ZIP64_LIMIT
+
+# Authorship information  -------------------------------------------------------------------------------------------
+__author__ = "Zsolt Bokor Levente"
+__copyright__ = "Copyright 2016, Morgan Stanley - Training 360 Project"
+__credits__ = __author__
+__version__ = "1.0.0"
+__maintainer__ = __author__
+__email__ = ["bokor.zsolt5@gmail.com", "bokorzsolt@yahoo.com"]
+__status__ = "Development"
+
+# -------------------------------------------------------------------------------------------------------------------
+
+COMPRESSION_LEVEL = 6
+CHUNK_SIZE = 4 * 1024 * 1024
+STORED_EXTENSIONS = frozenset(['.jpg', '.jpeg', '.png', '.gif', '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp',
+                               '.zip', '.gz', '.bz2', '.xz', '.7z', '.mp3', '.mp4'])
+CRC32_POLYNOMIAL = 0xedb88320
+MEGABYTE = 1024 * 1024
+CHUNKS_IN_FLIGHT_PER_WORKER = 4
+module_logger = logging.getLogger('repository.archiving')
+_crc32_powers = []
+
+
+def _gf2_times(matrix, vector):
+    """Multiplies a 32x32 GF(2) matrix (a list of the columns) by a vector."""
+    total = 0
+    index = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[index]
+        vector >>= 1
+        index += 1
+    return total
+
+
+def _gf2_square(matrix):
+    """Squares a 32x32 GF(2) matrix."""
+    return [_gf2_times(matrix, column) for column in matrix]
+
+
+def _crc32_power(exponent):
+    """
+    Returns the operator which appends ``2 ** exponent`` zero bytes to a CRC-32 register. The operators are built by
+    repeated squaring and cached, there are at most as many of them as the bits of the longest chunk length.
+
+    :param exponent: The base 2 logarithm of the number of the bytes.
+    :return: A 32x32 GF(2) matrix.
+    """
+    if not _crc32_powers:
+        power = [CRC32_POLYNOMIAL] + [1 << n for n in xrange(31)]
+        for _ in xrange(3):
+            power = _gf2_square(power)
+        _crc32_powers.append(power)
+    while len(_crc32_powers) <= exponent:
+        _crc32_powers.append(_gf2_square(_crc32_powers[-1]))
+    return _crc32_powers[exponent]
+
+
+def crc32_combine(crc1, crc2, length2):
+    """Calculates the CRC-32 of two concatenated blocks from their CRC-32 (like zlib's crc32_combine). The register
+    is shifted by the cached power of two operators of the set bits of ``length2``, no operator is built per length.
+
+    :param crc1: The CRC-32 of the first block.
+    :param crc2: The CRC-32 of the second block.
+    :param length2: The length of the second block.
+    :return: The CRC-32 of the concatenated blocks.
+    """
+    if length2 == 0:
+        return crc1
+    # Appending zero bytes to a zero register leaves it zero, e.g. the first chunk of a file.
+    if crc1 == 0:
+        return crc2
+    exponent = 0
+    while length2:
+        if length2 & 1:
+            crc1 = _gf2_times(_crc32_power(exponent), crc1)
+        length2 >>= 1
+        exponent += 1
+    return crc1 ^ crc2
+
+
+def is_compressed(file_name):
+    """
+    :param file_name: The name of a file.
+    :return: Bool, TRUE if the file is in a compressed format, see :py:const:STORED_EXTENSIONS.
+    """
+    return os.path.splitext(file_name)[1].lower() in STORED_EXTENSIONS
+
+
+def compress_chunk(task):
+    """Compresses a chunk of a file to a raw deflate stream, it's called by the worker processes.
+
+    :param task: A tuple of the path of the file, the offset and the length of the chunk, the compression level and a
+    bool which is TRUE for the last chunk of the file (it finishes the stream).
+    :return: A tuple of the compressed data, the CRC-32 and the length of the chunk, or None if the file can't be read.
+    """
+    file_path, offset, length, level, last = task
+    try:
+        with open(file_path, 'rb') as data_file:
+            data_file.seek(offset)
+            data = data_file.read(length)
+    except (IOError, OSError):
+        return None
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.crc32(data) & 0xffffffff, len(data)
+
+
+def read_chunks(file_path, length):
+    """Reads a stored file in chunks.
+
+    :param file_path: The path of the file.
+    :param length: The number of the bytes to read.
+    :return: A generator of (data, CRC-32, length) tuples, it yields None if the file can't be read.
+    """
+    try:
+        with open(file_path, 'rb') as data_file:
+            remaining = length
+            while True:
+                data = data_file.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data, zlib.crc32(data) & 0xffffffff, len(data)
+    except (IOError, OSError):
+        yield None
+
+
+class ParallelZipWriter(object):
+    """Writes a zip archive, the files are compressed by a pool of processes.
+
+    The :py:class:ParallelZipWriter is defined by the path of the archive, the compression level and the number of the
+    worker processes, it counts the read and the written bytes to report the throughput.
+    """
+
+    def __init__(self, archive_file, compression_level = COMPRESSION_LEVEL, workers = None):
+        """
+        Initialisation of a new :py:class:ParallelZipWriter object.
+
+        :param archive_file: The path of the archive.
+        :param compression_level: The zlib compression level from 0 to 9, 0 stores every file without compression.
+        :param workers: The number of the compressing processes, None uses a process per CPU.
+        """
+        if compression_level not in range(10):
+            raise ValueError("The compression level must be between 0 and 9, not {}!".format(compression_level))
+        self._archive = ZipFile(archive_file, 'w', ZIP_DEFLATED, allowZip64 = True)
+        self._compression_level = compression_level
+        self._workers = workers or cpu_count()
+        self._start_time = time.time()
+        self._end_time = None
+        self.input_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def output_bytes(self):
+        """
+        :return: The number of the bytes written to the archive.
+        """
+        return self._archive.fp.tell() if self._archive.fp else os.path.getsize(self._archive.filename)
+
+    @property
+    def elapsed(self):
+        """
+        :return: The number of the seconds since the archive was opened until it was closed.
+        """
+        return (self._end_time or time.time()) - self._start_time
+
+    @property
+    def throughput(self):
+        """
+        :return: The number of the archived megabytes per second.
+        """
+        return self.input_bytes / float(MEGABYTE) / max(self.elapsed, 1e-6)
+
+    def write_directory(self, directory_path, arcname):
+        """
+        Writes a directory entry.
+
+        :param directory_path: The path of the directory.
+        :param arcname: The name of the directory in the archive.
+        :return:
+        """
+        self._archive.write(directory_path, arcname)
+
+    def write_string(self, arcname, data):
+        """
+        Writes a file entry from a string.
+
+        :param arcname: The name of the file in the archive.
+        :param data: The content of the file.
+        :return:
+        """
+        self._archive.writestr(arcname, data)
+        self.input_bytes += len(data)
+
+    def write_files(self, entries):
+        """
+        Writes files to the archive in the given order, the chunks are compressed in parallel ahead of the writing. The
+        process pool is used only if there is more than a chunk to compress.
+
+        :param entries: A list of (file path, name in the archive) tuples.
+        :return: The list of the names of the files which couldn't be read (e.g. they were deleted).
+        """
+        skipped = []
+        files = []
+        tasks = []
+        for file_path, arcname in entries:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                skipped.append(arcname)
+                continue
+            stored = self._compression_level == 0 or is_compressed(arcname)
+            chunks = 0 if stored else max(1, (stat.st_size + CHUNK_SIZE - 1) // CHUNK_SIZE)
+            for chunk in xrange(chunks):
+                tasks.append((file_path, chunk * CHUNK_SIZE, CHUNK_SIZE, self._compression_level, chunk == chunks - 1))
+            files.append((file_path, arcname, stat, stored, chunks))
+        pool = None
+        if self._workers > 1 and len(tasks) > 1:
+            pool = Pool(self._workers)
+            results = ParallelZipWriter.compress_in_window(pool, tasks, self._workers * CHUNKS_IN_FLIGHT_PER_WORKER)
+        else:
+            results = imap(compress_chunk, tasks)
+        try:
+            for file_path, arcname, stat, stored, chunks in files:
+                if stored:
+                    pieces = read_chunks(file_path, stat.st_size)
+                else:
+                    pieces = (next(results) for _ in xrange(chunks))
+                if not self._write_entry(arcname, stat, stored, pieces):
+                    skipped.append(arcname)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        return skipped
+
+    @classmethod
+    def compress_in_window(cls, pool, tasks, window):
+        """
+        Compresses the chunks by a process pool in order, at most ``window`` chunks are queued or compressed but not
+        written yet, so the compressed chunks don't pile up in the memory if the writing falls behind.
+
+        :param pool: The process pool.
+        :param tasks: A list of the tasks of :py:func:compress_chunk.
+        :param window: The maximal number of the chunks in flight.
+        :return: A generator of the results of :py:func:compress_chunk in the order of the ``tasks``.
+        """
+        tasks = iter(tasks)
+        pending = deque(pool.apply_async(compress_chunk, (task,)) for task in islice(tasks, window))
+        while pending:
+            result = pending.popleft().get()
+            for task in islice(tasks, 1):
+                pending.append(pool.apply_async(compress_chunk, (task,)))
+            yield result
+
+    def _write_entry(self, arcname, stat, stored, pieces):
+        """
+        Writes a file entry from it's compressed or stored pieces, the header is written like
+        :py:meth:ZipFile.write does: it's rewritten with the CRC-32 and the sizes after the data.
+
+        :param arcname: The name of the file in the archive.
+        :param stat: The stat result of the file.
+        :param stored: Bool, TRUE if the pieces are not compressed.
+        :param pieces: An iterator of (data, CRC-32, length) tuples, a None piece means the file couldn't be read.
+        :return: Bool, FALSE if the file couldn't be read, the entry is removed then.
+        """
+        archive_file = self._archive.fp
+        zinfo = ZipInfo(arcname, time.localtime(stat.st_mtime)[0:6])
+        zinfo.external_attr = (stat.st_mode & 0xFFFF) << 16L
+        zinfo.compress_type = ZIP_STORED if stored else ZIP_DEFLATED
+        zinfo.file_size = stat.st_size
+        zinfo.flag_bits = 0x00
+        zinfo.header_offset = archive_file.tell()
+        zinfo.CRC = 0
+        zinfo.compress_size = 0
+        self._archive._writecheck(zinfo)
+        self._archive._didModify = True
+        zip64 = zinfo.file_size * 1.05 > ZIP64_LIMIT
+        archive_file.write(zinfo.FileHeader(zip64))
+        crc = 0
+        file_size = 0
+        compress_size = 0
+        readable = True
+        for piece in pieces:
+            if piece is None:
+                readable = False
+                continue
+            data, piece_crc, length = piece
+            if readable:
+                archive_file.write(data)
+                crc = crc32_combine(crc, piece_crc, length)
+                file_size += length
+                compress_size += len(data)
+        if not readable:
+            archive_file.seek(zinfo.header_offset)
+            archive_file.truncate()
+            return False
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = compress_size
+        if not zip64 and (file_size > ZIP64_LIMIT or compress_size > ZIP64_LIMIT):
+            raise RuntimeError("The size of the {} file has increased during the compression!".format(arcname))
+        position = archive_file.tell()
+        archive_file.seek(zinfo.header_offset)
+        archive_file.write(zinfo.FileHeader(zip64))
+        archive_file.seek(position)
+        self._archive.filelist.append(zinfo)
+        self._archive.NameToInfo[zinfo.filename] = zinfo
+        self.input_bytes += file_size
+        return True
+
+    def close(self):
+        """
+        Writes the central directory and closes the archive.
+
+        :return:
+        """
+        if self._archive.fp:
+            self._archive.close()
+            self._end_time = time.time()
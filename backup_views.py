@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+"""Read-only views of backed up repositories
+
+The metadata of a backed up repository is read straight from the backup, nothing is extracted. A backup archive is
+read through it's central directory: a member is located by it's name and only the members which are needed are
+decompressed (the files of an incremental backup are read from the archive of the chain which stored them last, see
+:py:mod:backups). A deduplicated backup is read from the chunks of it's snapshot (see :py:mod:snapshots).
+
+The :py:class:ArchivedUserManager and the :py:class:ArchivedDocumentManager serve the same read methods as the
+:py:class:UserManager and the :py:class:DocumentManager, but they read the user files (or the sharded record files),
+the roles file and the metadata files of the documents only, the files of the documents are never read. So the
+inspection of a backup takes time proportional to the metadata of the repository, not to the size of the backup.
+"""
+
+# Imports -----------------------------------------------------------------------------------------------------------
+import logging
+import os
+from json import loads
+from zipfile import ZipFile
+
+from backups import BackupManifest, backup_chain, MANIFEST_ARCHIVE_NAME
+from documents import DocumentManager, LazyDocument, DocumentDoesntExistsError, DOCUMENT_METADATA_FILE_NAME_FORMAT
+from iniformat.reader import parse_ini_string
+from storage_utils import batched, ITER_BATCH_SIZE
+from user_shards import ShardedUserStore, SHARDS_DIRECTORY_NAME
+from users import UserManager, RoleManager, LazyUser, Role, UserIndex, ROLES_JOURNAL_FILE_NAME
+
+# Authorship information  -------------------------------------------------------------------------------------------
+__author__ = "Zsolt Bokor Levente"
+__copyright__ = "Copyright 2016, Morgan Stanley - Training 360 Project"
+__credits__ = __author__
+__version__ = "1.0.0"
+__maintainer__ = __author__
+__email__ = ["bokor.zsolt5@gmail.com", "bokorzsolt@yahoo.com"]
+__status__ = "Development"
+
+# -------------------------------------------------------------------------------------------------------------------
+
+module_logger = logging.getLogger('repository.backup_views')
+
+
+class ArchiveReader(object):
+    """Reads the files of a backup archive without extracting it.
+
+    The :py:class:ArchiveReader is defined by the backup directory and the name of the backup. A backup with a manifest
+    is read from the archives of it's chain, a backup without a manifest from it's own archive.
+    """
+
+    def __init__(self, backup_path, name):
+        """
+        Initialisation of a new :py:class:ArchiveReader object.
+
+        :param backup_path: The directory of the backup archives.
+        :param name: The name of the backup without the .zip extension.
+        :exception BrokenBackupChainError is raised if a backup of the chain is missing.
+        """
+        self._backup_path = backup_path
+        self._archives = dict()
+        manifest = BackupManifest.read(backup_path, name)
+        if manifest is not None:
+            sources = dict()
+            for chain_manifest in backup_chain(backup_path, manifest):
+                for relative_path in chain_manifest.archived:
+                    sources[relative_path] = chain_manifest.name
+            self._sources = dict((relative_path, sources[relative_path]) for relative_path in manifest.files)
+        else:
+            archive = self._archive(name)
+            self._sources = dict((member, name) for member in archive.namelist()
+                                 if not member.endswith('/') and member != MANIFEST_ARCHIVE_NAME)
+
+    def _archive(self, name):
+        """
+        Opens an archive of the backup, the archives are kept open until the reader is closed.
+
+        :param name: The name of the backup of the archive.
+        :return: :py:class:ZipFile object.
+        """
+        archive = self._archives.get(name)
+        if archive is None:
+            archive = self._archives[name] = ZipFile(os.path.join(self._backup_path, name + '.zip'), 'r')
+        return archive
+
+    def files(self):
+        """
+        :return: The list of the relative paths of the files in the backup.
+        """
+        return self._sources.keys()
+
+    def read(self, relative_path):
+        """
+        Reads a file of the backup.
+
+        :param relative_path: The path of the file relative to the repository, with '/' separators.
+        :exception KeyError is raised if the file is not in the backup.
+        :return: The content of the file.
+        """
+        return self._archive(self._sources[relative_path]).read(relative_path)
+
+    def close(self):
+        """
+        Closes the opened archives.
+
+        :return:
+        """
+        for archive in self._archives.itervalues():
+            archive.close()
+        self._archives = dict()
+
+
+class SnapshotReader(object):
+    """Reads the files of a snapshot of a deduplicated store from their chunks.
+
+    The :py:class:SnapshotReader is defined by the :py:class:SnapshotStore and the :py:class:Snapshot.
+    """
+
+    def __init__(self, store, snapshot):
+        """
+        Initialisation of a new :py:class:SnapshotReader object.
+
+        :param store: :py:class:SnapshotStore object.
+        :param snapshot: :py:class:Snapshot object.
+        """
+        self._store = store
+        self._snapshot = snapshot
+
+    def files(self):
+        """
+        :return: The list of the relative paths of the files in the snapshot.
+        """
+        return self._snapshot.files.keys()
+
+    def read(self, relative_path):
+        """
+        Reads a file of the snapshot.
+
+        :param relative_path: The path of the file relative to the repository, with '/' separators.
+        :exception KeyError is raised if the file is not in the snapshot.
+        :exception CorruptSnapshotError is raised if a chunk of the file is missing or corrupt.
+        :return: The content of the file.
+        """
+        return ''.join(self._store.read_chunk(digest) for digest in self._snapshot.files[relative_path][2])
+
+    def close(self):
+        """
+        Nothing to close, the chunk files are opened one at a time.
+
+        :return:
+        """
+        pass
+
+
+class ArchivedUserManager(object):
+    """Read-only :py:class:UserManager of a backed up repository.
+
+    The :py:class:ArchivedUserManager is defined by the reader of the backup and the relative path of the users
+    directory. The users and their roles are read when the manager is created, the records of the sharded record files
+    are replayed in order, so the last record of a user wins.
+    """
+
+    def __init__(self, reader, users_directory):
+        """
+        Initialisation of a new :py:class:ArchivedUserManager object.
+
+        :param reader: The :py:class:ArchiveReader or :py:class:SnapshotReader of the backup.
+        :param users_directory: The path of the users directory relative to the repository, with '/' separators.
+        """
+        self._reader = reader
+        self._user_files = dict()
+        self._records = dict()
+        roles_file = None
+        journal_file = None
+        shards_prefix = '{}/{}/'.format(users_directory, SHARDS_DIRECTORY_NAME)
+        record_files = []
+        for relative_path in reader.files():
+            directory, _, file_name = relative_path.rpartition('/')
+            if relative_path.startswith(shards_prefix) and file_name.endswith('.dat'):
+                record_files.append(relative_path)
+            elif directory != users_directory:
+                continue
+            elif file_name.isdigit():
+                self._user_files[int(file_name)] = relative_path
+            elif file_name.startswith('roles'):
+                roles_file = relative_path
+            elif file_name == ROLES_JOURNAL_FILE_NAME:
+                journal_file = relative_path
+        for record_file in record_files:
+            shard = ShardedUserStore.record_file_shard(record_file.rpartition('/')[2])
+            if shard is None:
+                continue
+            # The torn records are skipped like by the live store, see :py:meth:ShardedUserStore.rebuild_index.
+            for _, _, user_id, fields in ShardedUserStore.shard_records(reader.read(record_file).splitlines(True),
+                                                                         shard):
+                self._records[user_id] = fields
+        self._records = dict((user_id, fields) for user_id, fields in self._records.iteritems() if fields is not None)
+        self._users_roles = RoleManager.parse_roles(reader.read(roles_file), roles_file) if roles_file else dict()
+        if journal_file is not None:
+            for line in reader.read(journal_file).splitlines():
+                if line:
+                    record = loads(line)
+                    roles = RoleManager.replayed_roles(self._users_roles.pop(record['user'], None), record,
+                                                        roles_file or '')
+                    if roles is not None:
+                        self._users_roles[record['user']] = roles
+
+    def find_all_users(self):
+        """
+        Finds all available :py:class:User objects IDs.
+
+        :return: A sorted list of the :py:class:User object IDs.
+        """
+        return sorted(set(self._user_files).union(self._records))
+
+    def count_users(self):
+        """
+        Counts the :py:class:User objects.
+
+        :return: Integer.
+        """
+        return len(self.find_all_users())
+
+    def has_user(self, user_id):
+        """
+        :param user_id: :py:class:User object's ID.
+        :return: Bool, TRUE if the user exists.
+        """
+        return int(user_id) in self._records or int(user_id) in self._user_files
+
+    def read_user_record(self, user_id):
+        """
+        Reads the stored fields of a user from the sharded record files or from it's file.
+
+        :param user_id: :py:class:User object's ID.
+        :exception ValueError is raised if the user doesn't exists.
+        :return: A tuple of the first name, family name, birth date string, email address and password.
+        """
+        user_id = int(user_id)
+        if user_id in self._records:
+            return self._records[user_id]
+        if user_id not in self._user_files:
+            raise ValueError('The user id {} does not exist!'.format(user_id))
+        lines = self._reader.read(self._user_files[user_id]).split('\n')
+        return tuple((lines[i] if i < len(lines) else '') for i in range(5))
+
+    def load_user(self, user_id):
+        """
+        Load a user from the backup.
+
+        :param user_id: :py:class:User object's ID.
+        :exception ValueError is raised if the user doesn't exists.
+        :return: :py:class:User object.
+        """
+        return UserManager.build_user(self.read_user_record(user_id))
+
+    def iter_users(self, filter = None, batch_size = ITER_BATCH_SIZE):
+        """
+        Iterates over the :py:class:User objects in the order of their IDs, see :py:meth:UserManager.iter_users.
+
+        :param filter: A function which gets a :py:class:LazyUser and returns True if the user is needed, None accepts
+        every user.
+        :param batch_size: The number of users read at once.
+        :return: A generator of (user ID, :py:class:User object) tuples.
+        """
+        for batch in batched(self.find_all_users(), batch_size):
+            for user_id in batch:
+                fields = self.read_user_record(user_id)
+                if filter is not None and not filter(LazyUser(*fields)):
+                    continue
+                yield user_id, UserManager.build_user(fields)
+
+    def find_users_by_name(self, name):
+        """
+        Find :py:class:User objects by name, the search is case insensitive.
+
+        :param name: A string to search for in the full name of the users.
+        :return: :py:class:User objects IDs in a list.
+        """
+        name = UserIndex.search_key(name)
+        return [str(user_id) for user_id in self.find_all_users()
+                if name in UserIndex.index_entry(self.read_user_record(user_id))['name']]
+
+    def user_roles(self, user_id):
+        """
+        :param user_id: :py:class:User object's ID.
+        :return: The list of the :py:class:Role objects of the user, or None if the user has no roles.
+        """
+        return self._users_roles.get(int(user_id))
+
+    def has_role(self, user_id, role):
+        """
+        Checks if a :py:class:User object has a role.
+
+        :param user_id: :py:class:User object's ID.
+        :param role: Role string to search for.
+        :exception RuntimeError is raised if the user has no roles.
+        :return: Bool, TRUE if the :py:class:User object has a ``role``.
+        """
+        user_roles = self.user_roles(user_id)
+        if user_roles is None:
+            raise RuntimeError("No user with {} ID!".format(user_id))
+        return Role(role) in user_roles
+
+    def list_users_by_role(self):
+        """
+        Lists :py:class:User objects by role.
+
+        :return: A dictionary, the key is a role string and the value is the sorted list of the user IDs.
+        """
+        users_by_role = dict()
+        for user_id, roles in sorted(self._users_roles.iteritems()):
+            for role in roles:
+                users_by_role.setdefault(role.role, []).append(user_id)
+        return users_by_role
+
+
+class ArchivedDocumentManager(object):
+    """Read-only :py:class:DocumentManager of a backed up repository.
+
+    The :py:class:ArchivedDocumentManager is defined by the reader of the backup and the relative path of the documents
+    directory. Only the metadata files of the documents are read, they are parsed on the first access.
+    """
+
+    def __init__(self, reader, documents_directory):
+        """
+        Initialisation of a new :py:class:ArchivedDocumentManager object.
+
+        :param reader: The :py:class:ArchiveReader or :py:class:SnapshotReader of the backup.
+        :param documents_directory: The path of the documents directory relative to the repository, with '/'
+        separators.
+        """
+        self._reader = reader
+        self._metadata_files = dict()
+        self._metadata = dict()
+        for relative_path in reader.files():
+            parts = relative_path.rsplit('/', 2)
+            if len(parts) == 3 and parts[0] == documents_directory and parts[1].isdigit() and \
+                            parts[2] == DOCUMENT_METADATA_FILE_NAME_FORMAT.format(parts[1]):
+                self._metadata_files[int(parts[1])] = relative_path
+
+    def metadata(self, document_id):
+        """
+        Returns the parsed metadata file of a :py:class:Document.
+
+        :param document_id: The ID of the :py:class:Document.
+        :exception DocumentDoesntExistsError is raised if the document is not in the backup.
+        :return: The content of the metadata file as a dictionary.
+        """
+        document_id = int(document_id)
+        if document_id not in self._metadata_files:
+            raise DocumentDoesntExistsError("The document with {} id is not in the backup!".format(document_id))
+        meta_data = self._metadata.get(document_id)
+        if meta_data is None:
+            meta_data = self._metadata[document_id] = parse_ini_string(
+                self._reader.read(self._metadata_files[document_id]))
+        return meta_data
+
+    def find_all_documents(self):
+        """
+        Searches for all :py:class:Document object in the backup.
+
+        :return: A sorted list of :py:class:Document IDs.
+        """
+        return sorted(self._metadata_files)
+
+    def count_documents(self):
+        """
+        Count's all :py:class:Document objects in the backup.
+
+        :return: Number of :py:class:Document objects.
+        """
+        return len(self._metadata_files)
+
+    def load_document(self, document_id, user_manager = None, lazy = False):
+        """
+        Loads a document from the backup.
+
+        :param document_id: The ID of the :py:class:Document.
+        :param user_manager: The :py:class:ArchivedUserManager of the backup.
+        :param lazy: Bool, if it's True a :py:class:LazyDocument is returned.
+        :exception DocumentDoesntExistsError is raised if the document is not in the backup.
+        :return: :py:class:Document object.
+        """
+        properties = self.metadata(document_id)['document']
+        if lazy:
+            return LazyDocument(int(document_id), properties, user_manager)
+        return DocumentManager.build_document(properties, user_manager)
+
+    def iter_documents(self, filter = None, batch_size = ITER_BATCH_SIZE, user_manager = None, lazy = False):
+        """
+        Iterates over the :py:class:Document objects in the order of their IDs, see
+        :py:meth:DocumentManager.iter_documents.
+
+        :param filter: A function which gets a :py:class:LazyDocument and returns True if the document is needed, None
+        accepts every document.
+        :param batch_size: The number of documents read at once.
+        :param user_manager: The :py:class:ArchivedUserManager of the backup.
+        :param lazy: Bool, if it's True :py:class:LazyDocument objects are yielded.
+        :return: A generator of (document ID, :py:class:Document object) tuples.
+        """
+        for batch in batched(self.find_all_documents(), batch_size):
+            for document_id in batch:
+                properties = self.metadata(document_id)['document']
+                lazy_document = None
+                if filter is not None or lazy:
+                    lazy_document = LazyDocument(document_id, properties, user_manager)
+                    if filter is not None and not filter(lazy_document):
+                        continue
+                if lazy:
+                    yield document_id, lazy_document
+                else:
+                    yield document_id, DocumentManager.build_document(properties, user_manager)
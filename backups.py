@@ -0,0 +1,469 @@
+#!/usr/bin/env python
+"""Full and incremental backups of a repository
+
+Every backup archive written by :py:func:create_backup_archive has a manifest, it's stored in the archive and next to
+it (``<backup name>.manifest.json`` in the backup directory). The manifest describes the whole repository at the time of
+the backup:
+
+    files       - the size, modification time and SHA-1 digest of every file, keyed by the relative path
+    directories - the relative paths of the directories, so the empty directories are restored too
+    archived    - the files stored in the archive of the backup
+    deleted     - the files which were deleted since the previous backup
+
+A full backup archives every file. An incremental backup is based on the previous backup of the repository and archives
+only the new and the changed files, so a repository can be restored from the full backup and the chain of the
+incremental backups after it. A file is hashed only if it's size or modification time differs from the previous
+manifest, the unchanged files are not read.
+"""
+
+# Imports -----------------------------------------------------------------------------------------------------------
+import hashlib
+import logging
+import os
+from datetime import datetime
+from fnmatch import fnmatch
+from json import dumps, loads
+from shutil import rmtree
+from zipfile import ZipFile
+
+from archiving import ParallelZipWriter, COMPRESSION_LEVEL, MEGABYTE
+from iniformat.writer import write_atomically
+
+# Authorship information  -------------------------------------------------------------------------------------------
+__author__ = "Zsolt Bokor Levente"
+__copyright__ = "Copyright 2016, Morgan Stanley - Training 360 Project"
+__credits__ = __author__
+__version__ = "1.0.0"
+__maintainer__ = __author__
+__email__ = ["bokor.zsolt5@gmail.com", "bokorzsolt@yahoo.com"]
+__status__ = "Development"
+
+# -------------------------------------------------------------------------------------------------------------------
+
+FULL_BACKUP = 'full'
+INCREMENTAL_BACKUP = 'incremental'
+MANIFEST_SUFFIX = '.manifest.json'
+MANIFEST_ARCHIVE_NAME = '.backup_manifest.json'
+MAX_INCREMENTAL_CHAIN = 6
+HASH_BLOCK_SIZE = 1024 * 1024
+MTIME_PRECISION = 1e-6
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+module_logger = logging.getLogger('repository.backups')
+
+
+class BrokenBackupChainError(Exception):
+    """
+    This exception is raised when a backup of the chain of an incremental backup is missing.
+    """
+    pass
+
+
+class BackupManifest(object):
+    """The manifest of a backup archive.
+
+    The :py:class:BackupManifest is defined by the name of the backup, the kind of the backup (full or incremental), the
+    name of the backup it's based on, the creation time, the location of the backed up repository and the file lists
+    described in :py:mod:backups.
+    """
+
+    def __init__(self, name, kind, base, sequence, created, repository, files, directories, archived, deleted,
+                 statistics = None):
+        """
+        Initialisation of a new :py:class:BackupManifest object.
+
+        :param name: The name of the backup archive without the .zip extension.
+        :param kind: :py:const:FULL_BACKUP or :py:const:INCREMENTAL_BACKUP.
+        :param base: The name of the previous backup of the chain, None for a full backup.
+        :param sequence: The number of the backup in it's chain, 0 for a full backup.
+        :param created: The UTC datetime of the backup.
+        :param repository: The absolute path of the backed up repository.
+        :param files: A dictionary of (size, modification time, digest) tuples keyed by relative path.
+        :param directories: The list of the relative paths of the directories.
+        :param archived: The list of the relative paths of the archived files.
+        :param deleted: The list of the relative paths of the files deleted since the previous backup.
+        :param statistics: A dictionary of the number of the archived bytes ('input_bytes'), the size of the archive
+        ('archive_bytes') and the duration of the archiving in seconds ('seconds'), or None. They are known only when
+        the archive is closed, so they are stored only in the manifest next to the archive.
+        """
+        self.name = name
+        self.kind = kind
+        self.base = base
+        self.sequence = sequence
+        self.created = created
+        self.repository = repository
+        self.files = files
+        self.directories = directories
+        self.archived = archived
+        self.deleted = deleted
+        self.statistics = statistics
+
+    @property
+    def throughput(self):
+        """
+        :return: The number of the archived megabytes per second, or None if there are no statistics.
+        """
+        if not self.statistics:
+            return None
+        return self.statistics['input_bytes'] / float(MEGABYTE) / max(self.statistics['seconds'], 1e-6)
+
+    def to_json(self):
+        """
+        :return: The JSON representation of the manifest.
+        """
+        return dumps({'name': self.name, 'kind': self.kind, 'base': self.base, 'sequence': self.sequence,
+                      'created': self.created.strftime(DATE_FORMAT), 'repository': self.repository,
+                      'files': dict((p, list(entry)) for p, entry in self.files.iteritems()),
+                      'directories': self.directories, 'archived': self.archived, 'deleted': self.deleted,
+                      'statistics': self.statistics},
+                     sort_keys = True)
+
+    @classmethod
+    def from_json(cls, content):
+        """
+        Parses a manifest.
+
+        :param content: The JSON representation of the manifest.
+        :return: :py:class:BackupManifest object.
+        """
+        data = loads(content)
+        return cls(data['name'], data['kind'], data['base'], data['sequence'],
+                   datetime.strptime(data['created'], DATE_FORMAT), data['repository'],
+                   dict((p, tuple(entry)) for p, entry in data['files'].iteritems()), data['directories'],
+                   data['archived'], data['deleted'], data.get('statistics'))
+
+    @classmethod
+    def manifest_file(cls, backup_path, name):
+        """
+        :param backup_path: The directory of the backup archives.
+        :param name: The name of the backup.
+        :return: The path of the manifest stored next to the backup archive.
+        """
+        return os.path.join(backup_path, name + MANIFEST_SUFFIX)
+
+    @classmethod
+    def read(cls, backup_path, name):
+        """
+        Reads the manifest of a backup, the manifest stored in the archive is read if there is no manifest next to it.
+
+        :param backup_path: The directory of the backup archives.
+        :param name: The name of the backup.
+        :return: :py:class:BackupManifest object, or None if the backup has no manifest.
+        """
+        manifest_file = BackupManifest.manifest_file(backup_path, name)
+        if os.path.exists(manifest_file):
+            with open(manifest_file) as json_file:
+                return BackupManifest.from_json(json_file.read())
+        archive_file = os.path.join(backup_path, name + '.zip')
+        if os.path.exists(archive_file):
+            with ZipFile(archive_file, 'r') as archive:
+                if MANIFEST_ARCHIVE_NAME in archive.namelist():
+                    return BackupManifest.from_json(archive.read(MANIFEST_ARCHIVE_NAME))
+        return None
+
+    def write(self, backup_path):
+        """
+        Writes the manifest next to the backup archive.
+
+        :param backup_path: The directory of the backup archives.
+        :return:
+        """
+        write_atomically(BackupManifest.manifest_file(backup_path, self.name), self.to_json())
+
+
+def file_digest(file_path):
+    """Calculates the SHA-1 digest of a file.
+
+    :param file_path: The path of the file.
+    :return: The hexadecimal digest.
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as data_file:
+        for block in iter(lambda: data_file.read(HASH_BLOCK_SIZE), ''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_excluded(relative_path, include = None, exclude = None):
+    """Determines if a file is left out of a backup by the filters. The patterns are matched to the relative path of the
+    file (e.g. 'documents/*.pdf'), a file in an excluded directory is excluded too.
+
+    :param relative_path: The path of the file relative to the repository, with '/' separators.
+    :param include: A list of patterns, if it's given only the matching files are backed up.
+    :param exclude: A list of patterns of the files and directories which are not backed up.
+    :return: Bool, TRUE if the file is not backed up.
+    """
+    if exclude and any(fnmatch(relative_path, pattern) for pattern in exclude):
+        return True
+    return bool(include) and not any(fnmatch(relative_path, pattern) for pattern in include)
+
+
+def walk_repository(location, directories, excluded = None, include = None, exclude = None):
+    """Walks the files of a repository which are backed up. The excluded directories are listed, but their content is
+    not walked, so they are restored as empty directories.
+
+    :param location: The path of the repository.
+    :param directories: A list, the relative paths of the walked directories are appended to it.
+    :param excluded: The absolute path of a directory which is not walked (e.g. the backup directory), or None.
+    :param include: A list of patterns of the backed up files, see :py:func:is_excluded.
+    :param exclude: A list of patterns of the files and directories which are not backed up.
+    :return: A generator of (file path, relative path) tuples, the relative paths have '/' separators.
+    """
+    for directory_path, directory_names, file_names in os.walk(location):
+        if excluded is not None:
+            directory_names[:] = [d for d in directory_names
+                                  if os.path.abspath(os.path.join(directory_path, d)) != excluded]
+        relative_directory = os.path.relpath(directory_path, location).replace(os.sep, '/')
+        if relative_directory != '.':
+            directories.append(relative_directory)
+            if is_excluded(relative_directory, None, exclude):
+                del directory_names[:]
+                continue
+        for file_name in file_names:
+            relative_path = file_name if relative_directory == '.' else relative_directory + '/' + file_name
+            if not is_excluded(relative_path, include, exclude):
+                yield os.path.join(directory_path, file_name), relative_path
+
+
+def is_unchanged(entry, stat):
+    """Determines if a file is the same as in a previous backup by it's size and modification time. The modification
+    times are compared to a microsecond, because a restored modification time is not more precise.
+
+    :param entry: The (size, modification time, ...) tuple of the file in the previous backup, or None.
+    :param stat: The stat result of the file.
+    :return: Bool, TRUE if the file is unchanged.
+    """
+    return entry is not None and entry[0] == stat.st_size and abs(entry[1] - stat.st_mtime) < MTIME_PRECISION
+
+
+def is_selected(relative_path, paths):
+    """Determines if a file or directory is restored by a selective restore.
+
+    :param relative_path: The path of the file or directory relative to the repository, with '/' separators.
+    :param paths: A list of the relative paths of the restored files and directories, None selects everything.
+    :return: Bool, TRUE if the file or directory is restored.
+    """
+    return paths is None or any(relative_path == p or relative_path.startswith(p + '/') for p in paths)
+
+
+def select_paths(files, directories, paths):
+    """Selects the files and the directories of a backup which are restored by a selective restore.
+
+    :param files: The relative paths of the files in the backup.
+    :param directories: The relative paths of the directories in the backup.
+    :param paths: A list of the relative paths of the restored files and directories, None selects everything.
+    :exception ValueError is raised if one of the ``paths`` is not in the backup.
+    :return: A tuple of the list of the selected files and the list of the selected directories.
+    """
+    selected_files = [p for p in files if is_selected(p, paths)]
+    selected_directories = [p for p in directories if is_selected(p, paths)]
+    if paths is not None:
+        missing = [p for p in paths if not any(is_selected(s, [p]) for s in selected_files + selected_directories)]
+        if missing:
+            raise ValueError("The {} is not in the backup!".format(', '.join(missing)))
+    return selected_files, selected_directories
+
+
+def clear_restored(location, paths):
+    """Deletes the files and the directories of a repository which are replaced by a restore, the rest of the
+    repository is kept.
+
+    :param location: The path of the repository.
+    :param paths: A list of the relative paths of the restored files and directories, None deletes the whole
+    repository.
+    :return:
+    """
+    if paths is None and os.path.exists(location):
+        rmtree(location)
+    if not os.path.exists(location):
+        os.makedirs(location)
+    for relative_path in paths or []:
+        restored_path = os.path.join(location, *relative_path.split('/'))
+        if os.path.isdir(restored_path):
+            rmtree(restored_path)
+        elif os.path.exists(restored_path):
+            os.remove(restored_path)
+
+
+def scan_repository(location, previous = None, excluded = None, include = None, exclude = None):
+    """Lists the files and the directories of a repository (see :py:func:walk_repository). The digest of a file is
+    taken from the ``previous`` manifest if it's size and modification time are the same, otherwise the file is hashed.
+
+    :param location: The path of the repository.
+    :param previous: The :py:class:BackupManifest of the previous backup, or None.
+    :param excluded: The absolute path of a directory which is not scanned (e.g. the backup directory), or None.
+    :param include: A list of patterns of the backed up files, see :py:func:is_excluded.
+    :param exclude: A list of patterns of the files and directories which are not backed up.
+    :return: A tuple of the dictionary of the (size, modification time, digest) tuples keyed by relative path and the
+    sorted list of the relative paths of the directories.
+    """
+    previous_files = previous.files if previous is not None else dict()
+    files = dict()
+    directories = []
+    for file_path, relative_path in walk_repository(location, directories, excluded, include, exclude):
+        try:
+            stat = os.stat(file_path)
+            entry = previous_files.get(relative_path)
+            if not is_unchanged(entry, stat):
+                entry = (stat.st_size, stat.st_mtime, file_digest(file_path))
+        except (IOError, OSError):
+            module_logger.warning("The {} file is deleted during the backup.".format(relative_path))
+            continue
+        files[relative_path] = entry
+    return files, sorted(directories)
+
+
+def list_manifests(backup_path, repository = None):
+    """Reads the manifests of the backups in a backup directory.
+
+    :param backup_path: The directory of the backup archives.
+    :param repository: The absolute path of a repository, only it's backups are listed, None lists every backup.
+    :return: The list of the :py:class:BackupManifest objects ordered by creation time.
+    """
+    manifests = []
+    if os.path.isdir(backup_path):
+        for file_name in os.listdir(backup_path):
+            if file_name.endswith(MANIFEST_SUFFIX):
+                manifest = BackupManifest.read(backup_path, file_name[:-len(MANIFEST_SUFFIX)])
+                if repository is None or manifest.repository == repository:
+                    manifests.append(manifest)
+    return sorted(manifests, key = lambda m: (m.created, m.sequence))
+
+
+def find_backup_at(backup_path, repository, point_in_time):
+    """Finds the last backup of a repository which was created before a point in time.
+
+    :param backup_path: The directory of the backup archives.
+    :param repository: The absolute path of the repository.
+    :param point_in_time: UTC datetime.
+    :exception ValueError is raised if there is no backup before the ``point_in_time``.
+    :return: :py:class:BackupManifest object.
+    """
+    manifests = [m for m in list_manifests(backup_path, repository) if m.created <= point_in_time]
+    if not manifests:
+        raise ValueError("There is no backup of the {} repository before {}!".format(repository, point_in_time))
+    return manifests[-1]
+
+
+def backup_chain(backup_path, manifest):
+    """Lists the backups needed to restore a backup: the full backup and the incremental backups after it.
+
+    :param backup_path: The directory of the backup archives.
+    :param manifest: The :py:class:BackupManifest of the backup.
+    :exception BrokenBackupChainError is raised if a backup of the chain is missing.
+    :return: The list of the :py:class:BackupManifest objects from the full backup to ``manifest``.
+    """
+    chain = [manifest]
+    while chain[-1].kind == INCREMENTAL_BACKUP:
+        base = BackupManifest.read(backup_path, chain[-1].base)
+        if base is None:
+            raise BrokenBackupChainError("The {} backup of the {} backup is missing!".format(chain[-1].base,
+                                                                                          manifest.name))
+        chain.append(base)
+    chain.reverse()
+    return chain
+
+
+def create_backup_archive(location, backup_path, name, incremental = False, include = None, exclude = None,
+                          compression_level = COMPRESSION_LEVEL, workers = None):
+    """Creates a backup archive of a repository and it's manifest.
+
+    The files are read from the live repository and written straight into the archive, nothing is copied before. The
+    archive is written to a temporary file which is renamed when it's complete, so an interrupted backup doesn't leave
+    a truncated archive behind. A file which is deleted during the backup is left out of it. The files are compressed
+    by a pool of ``workers`` processes, see :py:class:ParallelZipWriter.
+
+    An incremental backup is based on the last backup of the repository in the ``backup_path``, it's a full backup if
+    there is no previous backup or the chain of the previous backup has :py:const:MAX_INCREMENTAL_CHAIN incremental
+    backups already.
+
+    :param location: The path of the repository.
+    :param backup_path: The directory of the backup archives.
+    :param name: The name of the backup archive without the .zip extension.
+    :param incremental: Bool, TRUE creates an incremental backup.
+    :param include: A list of patterns of the backed up files, see :py:func:is_excluded.
+    :param exclude: A list of patterns of the files and directories which are not backed up.
+    :param compression_level: The zlib compression level from 0 to 9.
+    :param workers: The number of the compressing processes, None uses a process per CPU.
+    :return: The :py:class:BackupManifest of the new backup.
+    """
+    repository = os.path.abspath(location)
+    previous_manifests = list_manifests(backup_path, repository)
+    previous = previous_manifests[-1] if previous_manifests else None
+    files, directories = scan_repository(location, previous, os.path.abspath(backup_path), include, exclude)
+    if incremental and previous is not None and previous.sequence < MAX_INCREMENTAL_CHAIN:
+        kind, base, sequence = INCREMENTAL_BACKUP, previous.name, previous.sequence + 1
+        archived = sorted(p for p, entry in files.iteritems()
+                          if p not in previous.files or previous.files[p][2] != entry[2])
+    else:
+        kind, base, sequence = FULL_BACKUP, None, 0
+        archived = sorted(files)
+    deleted = sorted(p for p in previous.files if p not in files) if previous is not None else []
+    manifest = BackupManifest(name, kind, base, sequence, datetime.utcnow(), repository, files, directories, archived,
+                              deleted)
+    archive_file = os.path.join(backup_path, name + '.zip')
+    temporary_file = archive_file + '.tmp'
+    try:
+        with ParallelZipWriter(temporary_file, compression_level, workers) as archive:
+            if kind == FULL_BACKUP:
+                for relative_path in directories:
+                    archive.write_directory(os.path.join(location, *relative_path.split('/')), relative_path)
+            for relative_path in archive.write_files([(os.path.join(location, *relative_path.split('/')),
+                                                       relative_path) for relative_path in archived]):
+                module_logger.warning("The {} file is deleted during the backup.".format(relative_path))
+                archived.remove(relative_path)
+                del files[relative_path]
+            archive.write_string(MANIFEST_ARCHIVE_NAME, manifest.to_json())
+        os.rename(temporary_file, archive_file)
+    except Exception:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+        raise
+    manifest.statistics = {'input_bytes': archive.input_bytes, 'archive_bytes': os.path.getsize(archive_file),
+                           'seconds': archive.elapsed}
+    manifest.write(backup_path)
+    module_logger.info("The {} backup of {} is created: {} of {} files are archived, {} are deleted, {:.1f} MB/s."
+                       .format(kind, repository, len(archived), len(files), len(deleted), manifest.throughput))
+    return manifest
+
+
+def restore_backup_archive(location, backup_path, manifest, paths = None):
+    """Restores a repository from a backup and the backups of it's chain. The files are extracted from the last backup
+    which archived them and their modification times are restored, so the next incremental backup doesn't hash them.
+
+    A selective restore extracts only the members of the archives under the selected ``paths``, the members are located
+    by the central directory of the archive, and it replaces only the selected files and directories of the repository.
+
+    :param location: The path of the restored repository, an existing repository is deleted once the chain is checked.
+    :param backup_path: The directory of the backup archives.
+    :param manifest: The :py:class:BackupManifest of the backup.
+    :param paths: A list of the relative paths of the restored files and directories (e.g. 'users'), None restores
+    the whole repository.
+    :exception BrokenBackupChainError is raised if a backup of the chain is missing.
+    :exception ValueError is raised if one of the ``paths`` is not in the backup.
+    :return:
+    """
+    files, directories = select_paths(manifest.files, manifest.directories, paths)
+    chain = backup_chain(backup_path, manifest)
+    sources = dict()
+    for chain_manifest in chain:
+        for relative_path in chain_manifest.archived:
+            sources[relative_path] = chain_manifest.name
+    files_by_source = dict()
+    for relative_path in files:
+        files_by_source.setdefault(sources[relative_path], []).append(relative_path)
+    for source in files_by_source:
+        if not os.path.exists(os.path.join(backup_path, source + '.zip')):
+            raise BrokenBackupChainError("The archive of the {} backup is missing!".format(source))
+    clear_restored(location, paths)
+    for relative_path in directories:
+        directory = os.path.join(location, *relative_path.split('/'))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    for source, relative_paths in files_by_source.iteritems():
+        with ZipFile(os.path.join(backup_path, source + '.zip'), 'r') as archive:
+            for relative_path in relative_paths:
+                archive.extract(relative_path, location)
+                mtime = manifest.files[relative_path][1]
+                os.utime(os.path.join(location, *relative_path.split('/')), (mtime, mtime))
+    module_logger.info("{} files of the {} repository are restored from {} backups.".format(len(files), location,
+                                                                                             len(chain)))
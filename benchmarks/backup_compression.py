@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Micro-benchmark of the compression of the backups.
+
+Generates document files and compares :py:func:shutil.make_archive (one core) to the :py:class:ParallelZipWriter with
+one and with every CPU. Run it from the root of the project:
+
+    python -m benchmarks.backup_compression [number_of_megabytes]
+"""
+
+# Imports -----------------------------------------------------------------------------------------------------------
+import os
+import random
+import sys
+import tempfile
+import time
+from multiprocessing import cpu_count
+from shutil import make_archive, rmtree
+
+from archiving import ParallelZipWriter, MEGABYTE
+
+# Authorship information  -------------------------------------------------------------------------------------------
+__author__ = "Zsolt Bokor Levente"
+__copyright__ = "Copyright 2016, Morgan Stanley - Training 360 Project"
+__credits__ = __author__
+__version__ = "1.0.0"
+__maintainer__ = __author__
+__email__ = ["bokor.zsolt5@gmail.com", "bokorzsolt@yahoo.com"]
+__status__ = "Development"
+
+# -------------------------------------------------------------------------------------------------------------------
+
+NUMBER_OF_MEGABYTES = 256
+FILE_SIZE = 8 * MEGABYTE
+WORDS = ['document', 'repository', 'review', 'project', 'report', 'user', 'metadata', 'backup', 'archive', 'file']
+
+
+def generate_files(directory, number_of_megabytes):
+    """Writes compressible text files of :py:const:FILE_SIZE bytes to ``directory``."""
+    block = ' '.join(random.choice(WORDS) for _ in xrange(MEGABYTE // 6))[:MEGABYTE]
+    file_paths = []
+    for i in xrange(max(1, number_of_megabytes * MEGABYTE // FILE_SIZE)):
+        file_path = os.path.join(directory, 'document_{}.txt'.format(i))
+        with open(file_path, 'wb') as data_file:
+            for _ in xrange(FILE_SIZE // MEGABYTE):
+                data_file.write(block)
+        file_paths.append(file_path)
+    return file_paths
+
+
+def parallel_archive(archive_file, file_paths, workers):
+    with ParallelZipWriter(archive_file, workers = workers) as archive:
+        archive.write_files([(p, os.path.basename(p)) for p in file_paths])
+
+
+def main(number_of_megabytes = NUMBER_OF_MEGABYTES):
+    directory = tempfile.mkdtemp(prefix = 'edms_compression_benchmark_')
+    try:
+        source = os.path.join(directory, 'source')
+        os.makedirs(source)
+        file_paths = generate_files(source, number_of_megabytes)
+        size = sum(os.path.getsize(p) for p in file_paths) / float(MEGABYTE)
+        results = []
+        for name, function in [
+                ('make_archive', lambda: make_archive(os.path.join(directory, 'legacy'), 'zip', source)),
+                ('1 process', lambda: parallel_archive(os.path.join(directory, 'single.zip'), file_paths, 1)),
+                ('{} processes'.format(cpu_count()),
+                 lambda: parallel_archive(os.path.join(directory, 'parallel.zip'), file_paths, cpu_count()))]:
+            start_time = time.time()
+            function()
+            results.append((name, time.time() - start_time))
+        for name, duration in results:
+            print("{:<15} {:8.3f} s  {:8.1f} MB/s  x{:.2f}".format(name, duration, size / duration,
+                                                                  results[0][1] / duration))
+    finally:
+        rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else NUMBER_OF_MEGABYTES)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""Micro-benchmark of the :py:mod:iniformat.reader module.
+
+Generates document metadata files and compares the legacy line-by-line reader to the single pass reader and to the
+:py:func:parse_many function. Run it from the root of the project:
+
+    python -m benchmarks.iniformat_reader [number_of_files]
+"""
+
+# Imports -----------------------------------------------------------------------------------------------------------
+import sys
+import tempfile
+import time
+from os import path
+from shutil import rmtree
+
+from iniformat.reader import read_ini_file, parse_many
+
+# Authorship information  -------------------------------------------------------------------------------------------
+__author__ = "Zsolt Bokor Levente"
+__copyright__ = "Copyright 2016, Morgan Stanley - Training 360 Project"
+__credits__ = __author__
+__version__ = "1.0.0"
+__maintainer__ = __author__
+__email__ = ["bokor.zsolt5@gmail.com", "bokorzsolt@yahoo.com"]
+__status__ = "Development"
+
+# -------------------------------------------------------------------------------------------------------------------
+
+NUMBER_OF_FILES = 10000
+REPEAT = 3
+METADATA_TEMPLATE = """[document]
+title=Title of document {0}
+description=Description of document {0}
+author=[1, 2]
+files=['part1.pdf', 'part2.pdf']
+doc_format=pdf
+creation_date=2016/12/1 10:20:30 123456
+modification_date=2016/12/2 10:20:30 123456
+state=new
+is_public=False
+
+"""
+
+
+def legacy_read_ini_file(file_path):
+    """The reader before the single pass parser, one function call per line for the classification and the split."""
+    content = {}
+    section_name = ''
+    with open(file_path) as ini_file:
+        for line in ini_file:
+            line = line.rstrip('\n')
+            if legacy_is_section_header(line):
+                section_name = line[1:-1]
+                content[section_name] = {}
+            elif legacy_is_property(line):
+                key, value = legacy_get_property(line)
+                content[section_name][key] = value
+    return content
+
+
+def legacy_is_section_header(line):
+    return len(line) >= 2 and line[0] == '[' and line[-1] == ']'
+
+
+def legacy_is_property(line):
+    return '=' in line
+
+
+def legacy_get_property(line):
+    splitted = line.split('=')
+    if len(splitted) == 2:
+        return splitted[0].strip(), splitted[1].strip()
+    raise ValueError('Invalid property line!')
+
+
+def generate_files(directory, number_of_files):
+    """Writes ``number_of_files`` document metadata files to ``directory``."""
+    file_paths = []
+    for i in xrange(number_of_files):
+        file_path = path.join(directory, '{}_document_metadata.edd'.format(i))
+        with open(file_path, 'w') as metadata_file:
+            metadata_file.write(METADATA_TEMPLATE.format(i))
+        file_paths.append(file_path)
+    return file_paths
+
+
+def best_time(function, file_paths):
+    """Runs ``function`` on ``file_paths`` :py:const:REPEAT times and returns the best duration in seconds."""
+    durations = []
+    for _ in xrange(REPEAT):
+        start_time = time.time()
+        function(file_paths)
+        durations.append(time.time() - start_time)
+    return min(durations)
+
+
+def main(number_of_files = NUMBER_OF_FILES):
+    directory = tempfile.mkdtemp(prefix = 'edms_reader_benchmark_')
+    try:
+        file_paths = generate_files(directory, number_of_files)
+        assert [legacy_read_ini_file(p) for p in file_paths] == parse_many(file_paths)
+        results = [
+            ('legacy reader', best_time(lambda paths: [legacy_read_ini_file(p) for p in paths], file_paths)),
+            ('read_ini_file', best_time(lambda paths: [read_ini_file(p) for p in paths], file_paths)),
+            ('parse_many', best_time(parse_many, file_paths))]
+        for name, duration in results:
+            print("{:<15} {:8.3f} s  {:10.0f} files/s  x{:.2f}".format(
+                name, duration, number_of_files / duration, results[0][1] / duration))
+    finally:
+        rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else NUMBER_OF_FILES)
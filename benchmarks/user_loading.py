@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Micro-benchmark of the loading of the users.
+
+Builds :py:class:User objects from stored fields with the validating constructor (as the users were loaded before) and
+with :py:meth:UserManager.build_user, then loads the users of a sharded repository with
+:py:meth:UserManager.load_users. Run it from the root of the project:
+
+    python -m benchmarks.user_loading [number_of_users]
+"""
+
+# Imports -----------------------------------------------------------------------------------------------------------
+import sys
+import tempfile
+import time
+from datetime import datetime
+from os import path
+from shutil import rmtree
+
+from repository import Repository
+from users import User, UserManager, USER_SHARDS_STORAGE
+
+# Authorship information  -------------------------------------------------------------------------------------------
+__author__ = "Zsolt Bokor Levente"
+__copyright__ = "Copyright 2016, Morgan Stanley - Training 360 Project"
+__credits__ = __author__
+__version__ = "1.0.0"
+__maintainer__ = __author__
+__email__ = ["bokor.zsolt5@gmail.com", "bokorzsolt@yahoo.com"]
+__status__ = "Development"
+
+# -------------------------------------------------------------------------------------------------------------------
+
+NUMBER_OF_USERS = 100000
+REPEAT = 3
+
+
+def legacy_build_user(fields):
+    """The user building before the trusted path, every field is validated and the date is parsed by strptime."""
+    first_name, family_name, birth, email, password = fields
+    return User(first_name, family_name, datetime.strptime(birth, "%Y-%m-%d").date(), email, password)
+
+
+def generate_fields(number_of_users):
+    """Returns the stored fields of ``number_of_users`` users."""
+    return [('First{}'.format(i), 'Family{}'.format(i), '19{:02}-{:02}-{:02}'.format(i % 100, i % 12 + 1, i % 28 + 1),
+             'user{}@mail.com'.format(i), 'password{}'.format(i)) for i in xrange(number_of_users)]
+
+
+def best_time(function):
+    """Runs ``function`` :py:const:REPEAT times and returns the best duration in seconds."""
+    durations = []
+    for _ in xrange(REPEAT):
+        start_time = time.time()
+        function()
+        durations.append(time.time() - start_time)
+    return min(durations)
+
+
+def load_repository_users(location, all_fields):
+    """Stores the users in a sharded repository and returns a function which loads all of them uncached."""
+    user_manager = Repository(location = location, users_storage = USER_SHARDS_STORAGE)._user_manager
+    for user_id, fields in enumerate(all_fields, 1):
+        user_manager._shards.write(user_id, fields)
+    user_ids = range(1, len(all_fields) + 1)
+
+    def load_users():
+        user_manager._user_cache.clear()
+        user_manager.load_users(user_ids)
+
+    return load_users
+
+
+def main(number_of_users = NUMBER_OF_USERS):
+    all_fields = generate_fields(number_of_users)
+    assert [str(legacy_build_user(f)) for f in all_fields[:100]] == \
+           [str(UserManager.build_user(f)) for f in all_fields[:100]]
+    results = [
+        ('validated build', best_time(lambda: [legacy_build_user(f) for f in all_fields])),
+        ('trusted build', best_time(lambda: [UserManager.build_user(f) for f in all_fields]))]
+    directory = tempfile.mkdtemp(prefix = 'edms_user_benchmark_')
+    try:
+        results.append(('load_users', best_time(load_repository_users(path.join(directory, 'repository'),
+                                                                      all_fields))))
+    finally:
+        rmtree(directory)
+    for name, duration in results:
+        print("{:<16} {:8.3f} s  {:10.0f} users/s  x{:.2f}".format(
+            name, duration, number_of_users / duration, results[0][1] / duration))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else NUMBER_OF_USERS)
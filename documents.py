@@ -3,17 +3,27 @@
 
 The documents are represented as a directory which name is a number, ID. This directory includes the files that are
 represented in the document's abstraction level. The document manager operates on documents: count, save, add, load etc.
+
+The metadata of a document is stored in the [ID]_document_metadata.edd file of the document directory, or in the
+database if the repository is configured to use the SQLite backend (see :py:mod:metadata_store). The documents can be
+searched by keywords with the full-text index of :py:mod:search.
 """
 
 # Imports -----------------------------------------------------------------------------------------------------------
 import logging
 from datetime import datetime
-from os import path, makedirs, listdir, remove
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from os import path, makedirs, listdir, remove, stat
 from shutil import move, rmtree
+from threading import RLock
 
+from iniformat.cache import cached_read_ini_file
 from iniformat.reader import read_ini_file
-from iniformat.writer import write_ini_file
-from storage_utils import get_next_id
+from iniformat.writer import write_ini_file, group_commit
+from metadata_store import configured_store, current_store
+from search import DocumentSearchIndex, DEFAULT_PAGE_SIZE
+from storage_utils import get_next_id, reserve_ids, batched, ITER_BATCH_SIZE, IndexJournal
 
 # Authorship information  -------------------------------------------------------------------------------------------
 __author__ = "Zsolt Bokor Levente"
@@ -29,6 +39,11 @@ __status__ = "Development"
 VALID_DOCUMENT_STATES = ['new', 'pending', 'accepted', 'rejected']
 AFTER_NEW_STATE = ['pending']
 AFTER_PENDING_STATE = ['accepted', 'rejected']
+DOCUMENT_METADATA_FILE_NAME_FORMAT = '{}_document_metadata.edd'
+DOCUMENT_INDEX_FILE_NAME = 'document_index.jsonl'
+DOCUMENT_INDEX_COMPACTION_THRESHOLD = 1000
+BULK_MOVE_WORKERS = 4
+PARSE_CHUNKS_PER_PROCESS = 4
 module_logger = logging.getLogger('repository.documents')
 
 
@@ -38,6 +53,54 @@ class DocumentDoesntExistsError(Exception):
     pass
 
 
+class BulkAddError(Exception):
+    """This exception is raised after a bulk addition of documents if some of the documents couldn't be added.
+
+    The :py:attr:document_ids attribute contains the IDs of the added documents in the order of the input (None for the
+    failed documents), the :py:attr:errors attribute maps the position of the failed documents in the input to the
+    raised exception.
+    """
+
+    def __init__(self, message, document_ids, errors):
+        super(BulkAddError, self).__init__(message)
+        self.document_ids = document_ids
+        self.errors = errors
+
+
+class BulkLoadError(Exception):
+    """
+    This exception is raised when some :py:class:Document objects of a concurrent load couldn't be loaded. The
+    :py:attr:documents attribute contains the loaded documents keyed by ID, the :py:attr:errors attribute maps the IDs
+    of the failed documents to the raised exception.
+    """
+
+    def __init__(self, message, documents, errors):
+        super(BulkLoadError, self).__init__(message)
+        self.documents = documents
+        self.errors = errors
+
+
+def _build_document_chunk(chunk):
+    """
+    Builds the :py:class:Document objects of a chunk of metadata in a worker process of
+    :py:meth:DocumentManager.load_all_documents. The legacy documents need the :py:class:UserManager, they are sent back
+    unparsed.
+
+    :param chunk: List of (document ID, document section of the metadata) tuples.
+    :return: List of (document ID, :py:class:Document object or exception or None for the legacy documents) tuples.
+    """
+    results = []
+    for document_id, properties in chunk:
+        if 'author' not in properties:
+            results.append((document_id, None))
+            continue
+        try:
+            results.append((document_id, DocumentManager.build_document(properties)))
+        except Exception as e:
+            results.append((document_id, e))
+    return results
+
+
 class Document(object):
     """Document of the repository.
 
@@ -46,6 +109,9 @@ class Document(object):
     accepted, rejected; public/private.
     """
 
+    __slots__ = ['_title', '_description', '_author', '_files', '_doc_format', '_creation_date', '_modification_date',
+                 '_state', '_is_public']
+
     def __init__(self, title, description, author, files, doc_format):
         """
         Initialisation of a new :py:class:Document object.
@@ -307,6 +373,892 @@ class Document(object):
         return document_string
 
 
+class LazyDocument(Document):
+    """:py:class:Document loaded from the metadata file of the :py:class:Repository, it's fields are parsed only when
+    they are read.
+
+    The :py:class:LazyDocument keeps the document section of the metadata, the slots of the :py:class:Document are
+    filled in by :py:meth:__getattr__ the first time they are accessed. A field set before it's read is never parsed.
+    """
+
+    __slots__ = ['_document_id', '_properties', '_user_manager']
+    DATE_FORMAT = '%Y/%m/%d %H:%M:%S %f'
+
+    def __init__(self, document_id, properties, user_manager = None):
+        """
+        Initialisation of a new :py:class:LazyDocument object.
+
+        :param document_id: The ID of the :py:class:Document.
+        :param properties: The document section of the metadata of the :py:class:Document, it's not modified.
+        :param user_manager: The :py:class:UserManager of the :py:class:Repository, it's needed to resolve the author
+        names of the legacy documents.
+        """
+        self._document_id = document_id
+        self._properties = properties
+        self._user_manager = user_manager
+
+    @property
+    def document_id(self):
+        """
+        The property of the :py:attr:_document_id attribute.
+
+        :return: The ID of the :py:class:Document.
+        """
+        return self._document_id
+
+    @classmethod
+    def parse_files(cls, properties):
+        """
+        Parses the list of the files of a :py:class:Document.
+
+        :param properties: The document section of the metadata.
+        :return: The list of the file names.
+        """
+        return [str(file_name.strip("'")) for file_name in properties['files'][1:-1].split(', ')]
+
+    @classmethod
+    def parse_authors(cls, properties, user_manager = None):
+        """
+        Parses the author(s) of a :py:class:Document. The legacy documents store the names of the authors, they are
+        resolved to :py:class:User IDs by the ``user_manager``.
+
+        :param properties: The document section of the metadata.
+        :param user_manager: The :py:class:UserManager of the :py:class:Repository.
+        :exception ValueError is raised if the document is a legacy document and no ``user_manager`` is given.
+        :return: A list of :py:class:User IDs, or the author string of a document with a single author.
+        """
+        if 'author' in properties:
+            if '[' in properties['author'] and ']' in properties['author']:
+                return [int(author_id.strip("'")) for author_id in properties['author'][1:-1].split(', ')]
+            return properties['author']
+        if user_manager is None:
+            raise ValueError("The author names of a legacy document can't be resolved without a user manager!")
+        if '[' in properties['author_name'] and ']' in properties['author_name']:
+            author_names = [author_name.strip("'") for author_name in properties['author_name'][1:-1].split(', ')]
+        else:
+            author_names = [properties['author_name']]
+        authors = set()
+        for author_name in author_names:
+            for user_id in user_manager.find_users_by_name(author_name):
+                authors.add(int(user_id))
+        return list(authors)
+
+    @classmethod
+    def parse_date(cls, value):
+        """
+        Parses a date of the metadata.
+
+        :param value: The date string in the :py:const:DATE_FORMAT format.
+        :return: :py:mod:datetime object.
+        """
+        return datetime.strptime(value, LazyDocument.DATE_FORMAT)
+
+    def __getattr__(self, name):
+        """
+        Parses a field of the :py:class:Document when it's slot is read for the first time.
+
+        :param name: The name of the slot.
+        :exception AttributeError is raised if the ``name`` is not a field of the :py:class:Document.
+        :return: The value of the field.
+        """
+        properties = self._properties
+        is_legacy = 'author' not in properties
+        if name == '_title':
+            value = properties['title']
+        elif name == '_description':
+            value = properties['description']
+        elif name == '_author':
+            value = LazyDocument.parse_authors(properties, self._user_manager)
+            if not isinstance(value, list):
+                value = [value]
+        elif name == '_files':
+            value = LazyDocument.parse_files(properties)
+        elif name == '_doc_format':
+            value = properties['doc_format']
+        elif name == '_creation_date':
+            value = LazyDocument.parse_date(properties['creation_date'])
+        elif name == '_modification_date':
+            value = LazyDocument.parse_date(properties['modification_date'])
+        elif name == '_state':
+            value = 'new' if is_legacy else properties['state']
+            if value not in VALID_DOCUMENT_STATES:
+                raise ValueError('The "{}" is an invalid document state!'.format(value))
+        elif name == '_is_public':
+            value = not is_legacy and properties['is_public'] == 'True'
+        else:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        setattr(self, name, value)
+        return value
+
+
+class DocumentCatalog(object):
+    """In-memory catalog of the document metadata files of a :py:class:DocumentManager.
+
+    The catalog keeps the parsed [ID]_document_metadata.edd file of every :py:class:Document keyed by the ID of the
+    document, so a lookup by ID costs a dictionary access instead of a scan of the whole repository. The metadata files
+    are parsed only once, on the first lookup. Before every access the modification time of the documents directory
+    and of the requested metadata file is checked, so documents added, removed or modified by another process are
+    picked up.
+    """
+
+    def __init__(self, location):
+        """
+        Initialisation of a new :py:class:DocumentCatalog object.
+
+        :param location: The path of the documents directory of the :py:class:Repository.
+        """
+        self._location = location
+        self._directory_stamp = None
+        self._generation = 0
+        self._entries = dict()
+        self._lock = RLock()
+
+    @property
+    def generation(self):
+        """
+        The property of the :py:attr:_generation attribute, it is increased every time a rescan of the documents
+        directory finds new or deleted documents.
+
+        :return: The generation of the :py:class:DocumentCatalog object :py:attr:_generation.
+        """
+        return self._generation
+
+    @classmethod
+    def file_stamp(cls, file_path):
+        """
+        Determines the stamp of a file or directory which changes when the file or directory is modified.
+
+        :param file_path: The path of the file or directory.
+        :return: A tuple of the modification time and the size, or None if the ``file_path`` doesn't exists.
+        """
+        try:
+            file_stat = stat(file_path)
+        except OSError:
+            return None
+        return file_stat.st_mtime, file_stat.st_size
+
+    def metadata_file(self, document_id):
+        """
+        Determines the path of the metadata file of a :py:class:Document.
+
+        :param document_id: The ID of the :py:class:Document.
+        :return: The path of the [ID]_document_metadata.edd file.
+        """
+        return path.join(self._location, str(document_id), DOCUMENT_METADATA_FILE_NAME_FORMAT.format(document_id))
+
+    def refresh(self):
+        """
+        Rescans the documents directory if it was modified since the last scan. The IDs of the new documents are
+        registered without parsing their metadata files, the IDs of the deleted documents are dropped.
+
+        :return:
+        """
+        with self._lock:
+            directory_stamp = DocumentCatalog.file_stamp(self._location)
+            if directory_stamp == self._directory_stamp:
+                return
+            available_documents = set()
+            for file_or_folder in listdir(self._location):
+                if path.isdir(path.join(self._location, file_or_folder)):
+                    try:
+                        available_documents.add(int(file_or_folder))
+                    except ValueError:
+                        pass
+            removed_documents = set(self._entries) - available_documents
+            new_documents = available_documents - set(self._entries)
+            for document_id in removed_documents:
+                del self._entries[document_id]
+            for document_id in new_documents:
+                self._entries[document_id] = None
+            if removed_documents or new_documents:
+                self._generation += 1
+            self._directory_stamp = directory_stamp
+            module_logger.debug("The document catalog of {} is refreshed.".format(self._location))
+
+    def ids(self):
+        """
+        Lists the IDs of the available :py:class:Document objects.
+
+        :return: A sorted list of :py:class:Document IDs.
+        """
+        with self._lock:
+            self.refresh()
+            return sorted(self._entries)
+
+    def __contains__(self, document_id):
+        """
+        Determines if a :py:class:Document with ``document_id`` ID is available.
+
+        :param document_id: The ID of the :py:class:Document.
+        :return: Bool, TRUE if the document directory exists.
+        """
+        try:
+            document_id = int(document_id)
+        except (TypeError, ValueError):
+            return False
+        with self._lock:
+            self.refresh()
+            return document_id in self._entries
+
+    def __len__(self):
+        """
+        Counts the available :py:class:Document objects.
+
+        :return: Number of available :py:class:Document objects.
+        """
+        with self._lock:
+            self.refresh()
+            return len(self._entries)
+
+    def metadata(self, document_id):
+        """
+        Returns the parsed metadata file of a :py:class:Document. The file is parsed again only if it was modified
+        since it was last parsed.
+
+        :param document_id: The ID of the :py:class:Document.
+        :exception IOError is raised if the metadata file doesn't exists.
+        :return: The content of the metadata file as a dictionary, it must not be modified by the caller.
+        """
+        document_id = int(document_id)
+        metadata_file = self.metadata_file(document_id)
+        with self._lock:
+            file_stamp = DocumentCatalog.file_stamp(metadata_file)
+            entry = self._entries.get(document_id)
+            if entry is not None and file_stamp is not None and entry[0] == file_stamp:
+                return entry[1]
+        meta_data = read_ini_file(metadata_file)
+        with self._lock:
+            self.refresh()
+            if document_id in self._entries:
+                self._entries[document_id] = (file_stamp, meta_data)
+        return meta_data
+
+    def metadata_batch(self, document_ids):
+        """
+        Returns the parsed metadata files of many :py:class:Document objects, the documents without metadata file are
+        skipped.
+
+        :param document_ids: A list of :py:class:Document IDs.
+        :return: A list of (document ID, metadata) tuples in the order of ``document_ids``.
+        """
+        batch = []
+        for document_id in document_ids:
+            try:
+                batch.append((document_id, self.metadata(document_id)))
+            except IOError:
+                pass
+        return batch
+
+    def register(self, document_id):
+        """
+        Registers the ID of a :py:class:Document which directory was created by this process, so the documents directory
+        doesn't have to be rescanned.
+
+        :param document_id: The ID of the new :py:class:Document.
+        :return:
+        """
+        with self._lock:
+            self._entries.setdefault(int(document_id), None)
+            self._directory_stamp = DocumentCatalog.file_stamp(self._location)
+
+    def save(self, document_id, meta_data):
+        """
+        Writes the metadata file of a :py:class:Document and stores the metadata in the catalog.
+
+        :param document_id: The ID of the :py:class:Document.
+        :param meta_data: The data to write to the metadata file.
+        :return:
+        """
+        write_ini_file(self.metadata_file(document_id), meta_data, atomic = True)
+        self.update(document_id, meta_data)
+
+    def batch(self):
+        """
+        Groups the metadata files written in the block, they are synchronized to the disk once at the end of the block.
+
+        :return: A context manager.
+        """
+        return group_commit()
+
+    def adopt(self, document_id):
+        """
+        Registers a :py:class:Document which directory was copied into the documents directory with it's metadata file.
+
+        :param document_id: The ID of the :py:class:Document.
+        :return:
+        """
+        self.refresh()
+
+    def update(self, document_id, meta_data):
+        """
+        Stores the metadata of a :py:class:Document which metadata file was just written by this process.
+
+        :param document_id: The ID of the :py:class:Document.
+        :param meta_data: The data written to the metadata file.
+        :return:
+        """
+        stored_data = dict()
+        for section_key, properties_value in meta_data.iteritems():
+            stored_data[section_key] = dict(
+                (str(key).strip(), str(value).strip()) for key, value in properties_value.iteritems())
+        with self._lock:
+            self._entries[int(document_id)] = (
+                DocumentCatalog.file_stamp(self.metadata_file(document_id)), stored_data)
+
+    def discard(self, document_id):
+        """
+        Drops a :py:class:Document which directory was deleted by this process from the catalog.
+
+        :param document_id: The ID of the removed :py:class:Document.
+        :return:
+        """
+        with self._lock:
+            self._entries.pop(int(document_id), None)
+            self._directory_stamp = DocumentCatalog.file_stamp(self._location)
+
+
+class DocumentIndex(object):
+    """Secondary indexes of the :py:class:Document objects of a :py:class:DocumentManager.
+
+    The index maps the lower case title, the author IDs and the document format of the documents to the set of the
+    matching document IDs. The index is persisted in the :py:const:DOCUMENT_INDEX_FILE_NAME file of the documents
+    directory as a journal: every saved or removed document appends one JSON line to it, later lines override the
+    earlier ones. When the journal grows past twice the number of indexed documents (and the
+    :py:const:DOCUMENT_INDEX_COMPACTION_THRESHOLD) it is compacted to one line per document. Lines appended by another
+    process are read from the tail of the journal, the index can be rebuilt from the metadata files at any time.
+
+    Legacy documents which store the name of the author instead of the ID can't be indexed by author, their IDs are
+    kept in the :py:attr:unresolved_authors set.
+    """
+
+    def __init__(self, location, catalog):
+        """
+        Initialisation of a new :py:class:DocumentIndex object.
+
+        :param location: The path of the documents directory of the :py:class:Repository.
+        :param catalog: The :py:class:DocumentCatalog of the documents directory.
+        """
+        self._index_file = path.join(location, DOCUMENT_INDEX_FILE_NAME)
+        self._journal = IndexJournal(self._index_file, DOCUMENT_INDEX_COMPACTION_THRESHOLD)
+        self._catalog = catalog
+        self._lock = RLock()
+        self._loaded = False
+        self._catalog_generation = None
+        self._clear()
+
+    def _clear(self):
+        """
+        Empties the in-memory indexes.
+
+        :return:
+        """
+        self._entries = dict()
+        self._titles = dict()
+        self._authors = dict()
+        self._formats = dict()
+        self._unresolved_authors = set()
+
+    @classmethod
+    def title_key(cls, title):
+        """
+        Determines the key of a title in the title index.
+
+        :param title: The :py:attr:title of a :py:class:Document.
+        :return: The lower case unicode title.
+        """
+        if isinstance(title, str):
+            title = title.decode('utf-8')
+        return title.lower()
+
+    @classmethod
+    def index_entry(cls, properties):
+        """
+        Determines the indexed values of a :py:class:Document from the document section of it's metadata file.
+
+        :param properties: The document section of a metadata file.
+        :return: A dictionary with the title, the list of author IDs (None for legacy documents) and the document
+        format.
+        """
+        if 'author' in properties:
+            author = properties['author']
+            if '[' in author and ']' in author:
+                authors = [int(author_id.strip("'")) for author_id in author[1:-1].split(', ') if author_id]
+            else:
+                authors = [int(author)]
+        else:
+            authors = None
+        return {'title': properties['title'], 'author': authors, 'doc_format': properties['doc_format']}
+
+    def _insert(self, document_id, entry):
+        """
+        Adds a :py:class:Document to the in-memory indexes, the previous entry of the document is replaced.
+
+        :param document_id: The ID of the :py:class:Document.
+        :param entry: The indexed values returned by :py:meth:index_entry.
+        :return:
+        """
+        self._delete(document_id)
+        self._entries[document_id] = entry
+        self._titles.setdefault(DocumentIndex.title_key(entry['title']), set()).add(document_id)
+        self._formats.setdefault(entry['doc_format'], set()).add(document_id)
+        if entry['author'] is None:
+            self._unresolved_authors.add(document_id)
+        else:
+            for author_id in entry['author']:
+                self._authors.setdefault(author_id, set()).add(document_id)
+
+    def _delete(self, document_id):
+        """
+        Removes a :py:class:Document from the in-memory indexes.
+
+        :param document_id: The ID of the :py:class:Document.
+        :return:
+        """
+        entry = self._entries.pop(document_id, None)
+        if entry is None:
+            return
+        DocumentIndex._discard_from(self._titles, DocumentIndex.title_key(entry['title']), document_id)
+        DocumentIndex._discard_from(self._formats, entry['doc_format'], document_id)
+        self._unresolved_authors.discard(document_id)
+        for author_id in entry['author'] or []:
+            DocumentIndex._discard_from(self._authors, author_id, document_id)
+
+    @classmethod
+    def _discard_from(cls, index, key, document_id):
+        """
+        Removes a document ID from the set of an index key, the key is dropped when the set becomes empty.
+
+        :param index: One of the in-memory indexes.
+        :param key: The indexed value.
+        :param document_id: The ID of the :py:class:Document.
+        :return:
+        """
+        document_ids = index.get(key)
+        if document_ids is not None:
+            document_ids.discard(document_id)
+            if not document_ids:
+                del index[key]
+
+    def _replay(self, record):
+        """
+        Applies one record of the journal to the in-memory indexes.
+
+        :param record: A record of the journal.
+        :return:
+        """
+        if record.get('removed'):
+            self._delete(record['id'])
+        else:
+            self._insert(record['id'], {'title': record['title'], 'author': record['author'],
+                                        'doc_format': record['doc_format']})
+
+    def _read_journal(self):
+        """
+        Reads the journal lines which were not read yet. If the journal was replaced by a compaction of another process
+        the whole journal is read again.
+
+        :return: Bool, FALSE if there is no journal file.
+        """
+        return self._journal.read(self._replay, self._clear)
+
+    def _append(self, records):
+        """
+        Appends records to the journal and compacts it if it's too long.
+
+        :param records: List of dictionaries to write as JSON lines.
+        :return:
+        """
+        self._journal.append(records, self._replay, self._clear)
+        if self._journal.needs_compaction(len(self._entries)):
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrites the journal with one line per indexed :py:class:Document. The new journal is written to a temporary
+        file which is renamed to the journal file, so readers never see a partial journal. The lines appended by other
+        processes are read under the lock of the journal before it's rewritten, so they are not lost.
+
+        :return:
+        """
+        with self._lock, self._journal.locked():
+            self._read_journal()
+            self._rewrite()
+            module_logger.debug("The document index journal {} is compacted.".format(self._index_file))
+
+    def _rewrite(self):
+        """
+        Rewrites the journal from the in-memory indexes, the caller holds the lock of the journal.
+
+        :return:
+        """
+        records = []
+        for document_id, entry in sorted(self._entries.iteritems()):
+            record = {'id': document_id}
+            record.update(entry)
+            records.append(record)
+        self._journal.rewrite(records, self._replay, self._clear)
+
+    def rebuild(self):
+        """
+        Rebuilds the indexes from the metadata files of the documents and rewrites the journal.
+
+        :return:
+        """
+        with self._lock, self._journal.locked():
+            self._clear()
+            for document_id in self._catalog.ids():
+                self._index_document(document_id)
+            self._catalog_generation = self._catalog.generation
+            self._loaded = True
+            self._rewrite()
+            module_logger.info("The document index {} is rebuilt.".format(self._index_file))
+
+    def _index_document(self, document_id):
+        """
+        Reads the metadata file of a :py:class:Document and adds it to the in-memory indexes.
+
+        :param document_id: The ID of the :py:class:Document.
+        :return: The indexed values or None if the metadata file is missing.
+        """
+        try:
+            properties = self._catalog.metadata(document_id)['document']
+        except (IOError, KeyError):
+            return None
+        entry = DocumentIndex.index_entry(properties)
+        self._insert(document_id, entry)
+        return entry
+
+    def synchronize(self):
+        """
+        Brings the in-memory indexes up to date: reads the new lines of the journal, the first time it builds the
+        journal if it's missing and indexes the documents which were created or removed without updating the journal.
+
+        :return:
+        """
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                if not self._read_journal():
+                    self.rebuild()
+                    return
+            else:
+                self._read_journal()
+            self._catalog.refresh()
+            if self._catalog_generation == self._catalog.generation:
+                return
+            available_documents = set(self._catalog.ids())
+            records = []
+            for document_id in set(self._entries) - available_documents:
+                self._delete(document_id)
+                records.append({'id': document_id, 'removed': True})
+            for document_id in available_documents - set(self._entries):
+                entry = self._index_document(document_id)
+                if entry is not None:
+                    record = {'id': document_id}
+                    record.update(entry)
+                    records.append(record)
+            self._catalog_generation = self._catalog.generation
+            self._append(records)
+
+    def add(self, document_id, properties):
+        """
+        Indexes a saved :py:class:Document.
+
+        :param document_id: The ID of the :py:class:Document.
+        :param properties: The document section of the metadata file of the :py:class:Document.
+        :return:
+        """
+        self.add_many([(document_id, properties)])
+
+    def add_many(self, documents):
+        """
+        Indexes many saved :py:class:Document objects with a single append to the journal.
+
+        :param documents: List of (document ID, document section of the metadata file) tuples.
+        :return:
+        """
+        with self._lock:
+            self.synchronize()
+            records = []
+            for document_id, properties in documents:
+                record = {'id': int(document_id)}
+                record.update(DocumentIndex.index_entry(properties))
+                records.append(record)
+            self._append(records)
+
+    def discard(self, document_id):
+        """
+        Removes a :py:class:Document from the index.
+
+        :param document_id: The ID of the removed :py:class:Document.
+        :return:
+        """
+        with self._lock:
+            self.synchronize()
+            if int(document_id) in self._entries:
+                self._append([{'id': int(document_id), 'removed': True}])
+
+    def find_by_title(self, title):
+        """
+        Searches for the :py:class:Document objects with a title, the comparison is case insensitive.
+
+        :param title: The :py:attr:title to search for.
+        :return: A set of :py:class:Document IDs.
+        """
+        with self._lock:
+            self.synchronize()
+            return set(self._titles.get(DocumentIndex.title_key(title), ()))
+
+    def find_by_author(self, author):
+        """
+        Searches for the :py:class:Document objects of an author. The legacy documents are not included, see
+        :py:attr:unresolved_authors.
+
+        :param author: The :py:class:User ID of the author.
+        :return: A set of :py:class:Document IDs.
+        """
+        with self._lock:
+            self.synchronize()
+            return set(self._authors.get(int(author), ()))
+
+    def find_by_format(self, doc_format):
+        """
+        Searches for the :py:class:Document objects with a document format.
+
+        :param doc_format: The :py:attr:doc_format to search for.
+        :return: A set of :py:class:Document IDs.
+        """
+        with self._lock:
+            self.synchronize()
+            return set(self._formats.get(doc_format, ()))
+
+    @property
+    def unresolved_authors(self):
+        """
+        The IDs of the legacy :py:class:Document objects which metadata file contains the name of the author instead
+        of the :py:class:User ID.
+
+        :return: A set of :py:class:Document IDs.
+        """
+        with self._lock:
+            self.synchronize()
+            return set(self._unresolved_authors)
+
+
+class SQLiteDocumentCatalog(object):
+    """Catalog and secondary indexes of the :py:class:Document objects stored in an :py:class:SQLiteMetadataStore.
+
+    It provides the interface of both the :py:class:DocumentCatalog and the :py:class:DocumentIndex, the lookups are
+    answered by the indexes of the database, so the methods which maintain the in-memory state are no-ops.
+    """
+
+    def __init__(self, location, metadata_store):
+        """
+        Initialisation of a new :py:class:SQLiteDocumentCatalog object.
+
+        :param location: The path of the documents directory of the :py:class:Repository.
+        :param metadata_store: The :py:class:SQLiteMetadataStore of the :py:class:Repository, the catalog keeps only the
+        path of it's database (see :py:attr:metadata_store).
+        """
+        self._location = location
+        self._database_path = metadata_store.database_path
+
+    @property
+    def metadata_store(self):
+        """
+        The :py:class:SQLiteMetadataStore of the :py:attr:_database_path, it's looked up for every operation (see
+        :py:func:metadata_store.current_store).
+
+        :return: The :py:class:SQLiteMetadataStore of the :py:class:Repository.
+        """
+        return current_store(self._database_path)
+
+    def metadata_file(self, document_id):
+        """
+        Determines the path of the metadata file of a :py:class:Document, it exists only until it's adopted.
+
+        :param document_id: The ID of the :py:class:Document.
+        :return: The path of the [ID]_document_metadata.edd file.
+        """
+        return path.join(self._location, str(document_id), DOCUMENT_METADATA_FILE_NAME_FORMAT.format(document_id))
+
+    def refresh(self):
+        """
+        The database is always up to date, there is nothing to rescan.
+
+        :return:
+        """
+        pass
+
+    def register(self, document_id):
+        """
+        A :py:class:Document is stored by :py:meth:save, the creation of it's directory is not tracked.
+
+        :param document_id: The ID of the new :py:class:Document.
+        :return:
+        """
+        pass
+
+    def add(self, document_id, properties):
+        """
+        The indexes of the database are updated by :py:meth:save.
+
+        :param document_id: The ID of the :py:class:Document.
+        :param properties: The document section of the metadata.
+        :return:
+        """
+        pass
+
+    def add_many(self, documents):
+        """
+        The indexes of the database are updated by :py:meth:save.
+
+        :param documents: List of (document ID, document section of the metadata) tuples.
+        :return:
+        """
+        pass
+
+    def rebuild(self):
+        """
+        The indexes of the database are maintained by SQLite, there is nothing to rebuild.
+
+        :return:
+        """
+        pass
+
+    def ids(self):
+        """
+        Lists the IDs of the stored :py:class:Document objects.
+
+        :return: A sorted list of :py:class:Document IDs.
+        """
+        return self.metadata_store.document_ids()
+
+    def __contains__(self, document_id):
+        """
+        Determines if a :py:class:Document with ``document_id`` ID is stored.
+
+        :param document_id: The ID of the :py:class:Document.
+        :return: Bool, TRUE if the metadata of the document is stored.
+        """
+        try:
+            document_id = int(document_id)
+        except (TypeError, ValueError):
+            return False
+        return self.metadata_store.has_document(document_id)
+
+    def __len__(self):
+        """
+        Counts the stored :py:class:Document objects.
+
+        :return: Number of stored :py:class:Document objects.
+        """
+        return self.metadata_store.count_documents()
+
+    def metadata(self, document_id):
+        """
+        Returns the metadata of a :py:class:Document in the format of the metadata file.
+
+        :param document_id: The ID of the :py:class:Document.
+        :exception IOError is raised if the document is not stored.
+        :return: The metadata as a dictionary with a document section.
+        """
+        properties = self.metadata_store.load_document(int(document_id))
+        if properties is None:
+            raise IOError("The metadata of the document with {} ID is not stored!".format(document_id))
+        return {'document': properties}
+
+    def metadata_batch(self, document_ids):
+        """
+        Returns the metadata of many :py:class:Document objects with one query, the documents which are not stored are
+        skipped.
+
+        :param document_ids: A list of :py:class:Document IDs.
+        :return: A list of (document ID, metadata) tuples ordered by ID.
+        """
+        return [(document_id, {'document': properties}) for document_id, properties in
+                self.metadata_store.load_documents(document_ids)]
+
+    def save(self, document_id, meta_data):
+        """
+        Stores the metadata of a :py:class:Document.
+
+        :param document_id: The ID of the :py:class:Document.
+        :param meta_data: The metadata as a dictionary with a document section.
+        :return:
+        """
+        properties = dict((str(key).strip(), str(value).strip()) for key, value in meta_data['document'].iteritems())
+        entry = DocumentIndex.index_entry(properties)
+        self.metadata_store.save_document(int(document_id), properties, DocumentIndex.title_key(entry['title']),
+                                           entry['author'], entry['doc_format'])
+
+    def batch(self):
+        """
+        Groups the documents stored in the block into one transaction.
+
+        :return: A context manager.
+        """
+        return self.metadata_store.transaction()
+
+    def adopt(self, document_id):
+        """
+        Moves the metadata file of a :py:class:Document which directory was copied into the documents directory into
+        the database.
+
+        :param document_id: The ID of the :py:class:Document.
+        :return:
+        """
+        metadata_file = self.metadata_file(document_id)
+        self.save(document_id, read_ini_file(metadata_file))
+        remove(metadata_file)
+
+    def discard(self, document_id):
+        """
+        Removes a :py:class:Document from the database.
+
+        :param document_id: The ID of the removed :py:class:Document.
+        :return:
+        """
+        self.metadata_store.remove_document(int(document_id))
+
+    def find_by_title(self, title):
+        """
+        Searches for the :py:class:Document objects with a title, the comparison is case insensitive.
+
+        :param title: The :py:attr:title to search for.
+        :return: A set of :py:class:Document IDs.
+        """
+        return set(self.metadata_store.find_documents_by_title_key(DocumentIndex.title_key(title)))
+
+    def find_by_author(self, author):
+        """
+        Searches for the :py:class:Document objects of an author, the legacy documents are not included.
+
+        :param author: The :py:class:User ID of the author.
+        :return: A set of :py:class:Document IDs.
+        """
+        return set(self.metadata_store.find_documents_by_author(int(author)))
+
+    def find_by_format(self, doc_format):
+        """
+        Searches for the :py:class:Document objects with a document format.
+
+        :param doc_format: The :py:attr:doc_format to search for.
+        :return: A set of :py:class:Document IDs.
+        """
+        return set(self.metadata_store.find_documents_by_format(doc_format))
+
+    @property
+    def unresolved_authors(self):
+        """
+        The IDs of the legacy :py:class:Document objects which metadata contains the name of the author instead of the
+        :py:class:User ID.
+
+        :return: A set of :py:class:Document IDs.
+        """
+        return set(self.metadata_store.find_documents_with_legacy_author())
+
+
 class DocumentManager(object):
     """Manage documents in a repository.
 
@@ -314,18 +1266,28 @@ class DocumentManager(object):
     load, add documents to reposritory, update, remove, create backup and load backup etc.
     """
 
-    def __init__(self, repository_location, paths_file = None):
+    def __init__(self, repository_location, paths_file = None, metadata_store = None):
         """
         Initialisation of a new :py:class:DocumentManager object.
 
         :param repository_location: The path of the repository for which is working.
         :param paths_file: The path where the repositorie's paths_file is, this is a metadata file of the repository.
+        :param metadata_store: The :py:class:SQLiteMetadataStore to store the metadata in, by default the store
+        configured in the ``paths_file`` is used. If there is no store the metadata files are used.
         """
         if not paths_file:
             self._location = repository_location
         else:
-            metadata_data = read_ini_file(paths_file)
+            metadata_data = cached_read_ini_file(paths_file)
             self._location = path.join(repository_location, metadata_data['directories']['documents'])
+            if not metadata_store:
+                metadata_store = configured_store(repository_location, paths_file)
+        if metadata_store:
+            self._catalog = self._index = SQLiteDocumentCatalog(self._location, metadata_store)
+        else:
+            self._catalog = DocumentCatalog(self._location)
+            self._index = DocumentIndex(self._location, self._catalog)
+        self._search_index = DocumentSearchIndex(self._location, self._catalog)
 
     def save_document(self, new_document_folder, new_document_id, document):
         """
@@ -343,6 +1305,24 @@ class DocumentManager(object):
         for path_file in document.files:
             basename_files_list.append(path.basename(path_file))
             move(path_file, new_document_folder)
+        data = DocumentManager.document_metadata(document, basename_files_list)
+        if path.abspath(new_document_folder) == path.abspath(path.join(self._location, str(new_document_id))):
+            self._catalog.save(new_document_id, data)
+            self._index.add(new_document_id, data['document'])
+            self._search_index.add(new_document_id, data['document'])
+        else:
+            write_ini_file(path.join(new_document_folder, DOCUMENT_METADATA_FILE_NAME_FORMAT.format(new_document_id)),
+                           data, atomic = True)
+
+    @classmethod
+    def document_metadata(cls, document, basename_files_list):
+        """
+        Creates the content of the metadata file of a :py:class:Document.
+
+        :param document: :py:class:Document object.
+        :param basename_files_list: The names of the files of the document within the document directory.
+        :return: A dictionary with a document section, all the values are strings.
+        """
         data = {
             'document': {
                 'title': document.title,
@@ -358,60 +1338,53 @@ class DocumentManager(object):
 
         for key, value in data['document'].iteritems():
             data['document'][key] = str(value)
+        return data
 
-        write_ini_file(path.join(new_document_folder, '{}_document_metadata.edd'.format(new_document_id)), data)
-
-    def load_document(self, document_id, user_manager = None):
+    def load_document(self, document_id, user_manager = None, lazy = False):
         """
         Loads a document to the memory.
 
         :param document_id: The ID of the :py:class:Document.
         :param user_manager: The :py:class:UserManager of the :py:class:Repository.
+        :param lazy: Bool, if it's True a :py:class:LazyDocument is returned, which fields are parsed on the first
+        access.
         :exception DocumentDoesntExistsError is raised when the document is missing from the filesystem,
         :return: :py:class:Document object.
         """
         document_path = path.join(self._location, str(document_id))
-        if not path.exists(document_path):
+        if document_id not in self._catalog:
             raise DocumentDoesntExistsError("The {} path doesn't exists, so the document with {} id can't be loaded!".
                                             format(document_path, document_id))
         else:
-            metadata_file = reduce(path.join,
-                                   [self._location, str(document_id), '{}_document_metadata.edd'.format(document_id)])
-            meta_data = read_ini_file(metadata_file)
-            list_of_files = (
-                [str(file_name.strip("'")) for file_name in meta_data['document']['files'][1:-1].split(', ')])
-            if 'author' in meta_data['document']:
-                if '[' in meta_data['document']['author'] and ']' in meta_data['document']['author']:
-                    list_of_authors = [int(file_name.strip("'")) for file_name in
-                                       meta_data['document']['author'][1:-1].split(', ')]
-                else:
-                    list_of_authors = meta_data['document']['author']
-            else:
-                if '[' in meta_data['document']['author_name'] and ']' in meta_data['document']['author_name']:
-                    list_of_authors_by_name = [file_name.strip("'") for file_name in
-                                               meta_data['document']['author_name'][1:-1].split(', ')]
-                else:
-                    list_of_authors_by_name = meta_data['document']['author_name']
-                if not isinstance(list_of_authors_by_name, list):
-                    list_of_authors_by_name = [list_of_authors_by_name]
-                list_of_authors = set()
-                for author_name in list_of_authors_by_name:
-                    for user_id in user_manager.find_users_by_name(author_name):
-                        list_of_authors.add(int(user_id))
-                list_of_authors = list(list_of_authors)
-            document = Document(meta_data['document']['title'], meta_data['document']['description'], list_of_authors,
-                                list_of_files, meta_data['document']['doc_format'])
-            document.creation_date = datetime.strptime(meta_data['document']['creation_date'], '%Y/%m/%d %H:%M:%S %f')
-            document.modification_date = datetime.strptime(meta_data['document']['modification_date'],
-                                                           '%Y/%m/%d %H:%M:%S %f')
-            if 'author' in meta_data['document']:
-                document.state = meta_data['document']['state']
-                if meta_data['document']['is_public'] == 'True':
-                    document.make_public()
-            else:
-                document.state = 'new'
-                document.make_private()
-            return document
+            meta_data = self._catalog.metadata(document_id)
+            if lazy:
+                return LazyDocument(document_id, meta_data['document'], user_manager)
+            return DocumentManager.build_document(meta_data['document'], user_manager)
+
+    @classmethod
+    def build_document(cls, properties, user_manager = None):
+        """
+        Builds a :py:class:Document object from the document section of it's metadata.
+
+        :param properties: The document section of the metadata.
+        :param user_manager: The :py:class:UserManager of the :py:class:Repository, it's needed to resolve the author
+        names of the legacy documents.
+        :return: :py:class:Document object.
+        """
+        list_of_files = LazyDocument.parse_files(properties)
+        list_of_authors = LazyDocument.parse_authors(properties, user_manager)
+        document = Document(properties['title'], properties['description'], list_of_authors, list_of_files,
+                            properties['doc_format'])
+        document.creation_date = LazyDocument.parse_date(properties['creation_date'])
+        document.modification_date = LazyDocument.parse_date(properties['modification_date'])
+        if 'author' in properties:
+            document.state = properties['state']
+            if properties['is_public'] == 'True':
+                document.make_public()
+        else:
+            document.state = 'new'
+            document.make_private()
+        return document
 
     def add_document(self, document, new_document_folder = None):
         """
@@ -428,6 +1401,95 @@ class DocumentManager(object):
         self.save_document(new_document_folder, new_document_id, document)
         return new_document_id
 
+    def add_documents(self, documents, workers = BULK_MOVE_WORKERS):
+        """
+        Adds many :py:class:Document objects to the :py:class:Repository at once.
+
+        The IDs of the documents are reserved with one update of the ID counter, the directories are created in one
+        batch, the files of the documents are moved by a pool of ``workers`` threads, then all the metadata files are
+        written atomically in one pass, synchronized to the disk once at the end (or stored in one transaction), and the
+        indexes are updated with a single journal append. A failed document doesn't abort the batch: the files already
+        moved are moved back, it's directory is removed, and after the whole batch is processed a :py:exc:BulkAddError
+        is raised.
+
+        :param documents: An iterable of :py:class:Document objects.
+        :param workers: The number of threads moving the files.
+        :exception BulkAddError is raised if some documents couldn't be added, it contains the IDs of the added
+        documents and the errors.
+        :return: The list of the IDs of the new documents in the order of ``documents``.
+        """
+        documents = list(documents)
+        if not documents:
+            return []
+        document_ids = reserve_ids(self._location, len(documents))
+        errors = dict()
+        created_folders = set()
+        self._catalog.refresh()
+        for position, document_id in enumerate(document_ids):
+            try:
+                makedirs(path.join(self._location, str(document_id)))
+                created_folders.add(position)
+                self._catalog.register(document_id)
+            except OSError as e:
+                errors[position] = e
+
+        def move_back(position, moved_files):
+            new_document_folder = path.join(self._location, str(document_ids[position]))
+            for path_file in moved_files:
+                move(path.join(new_document_folder, path.basename(path_file)), path_file)
+
+        def move_files(position):
+            if position in errors:
+                return None
+            new_document_folder = path.join(self._location, str(document_ids[position]))
+            moved_files = []
+            try:
+                for path_file in documents[position].files:
+                    move(path_file, new_document_folder)
+                    moved_files.append(path_file)
+            except Exception as e:
+                move_back(position, moved_files)
+                return e
+            return None
+
+        pool = ThreadPool(max(1, min(workers, len(documents))))
+        try:
+            for position, error in enumerate(pool.map(move_files, range(len(documents)))):
+                if error is not None:
+                    errors[position] = error
+        finally:
+            pool.close()
+            pool.join()
+
+        indexed_documents = []
+        with self._catalog.batch():
+            for position, document in enumerate(documents):
+                if position in errors:
+                    continue
+                document_id = document_ids[position]
+                try:
+                    data = DocumentManager.document_metadata(
+                        document, [path.basename(path_file) for path_file in document.files])
+                    self._catalog.save(document_id, data)
+                except Exception as e:
+                    move_back(position, document.files)
+                    errors[position] = e
+                    continue
+                indexed_documents.append((document_id, data['document']))
+        self._index.add_many(indexed_documents)
+        self._search_index.add_many(indexed_documents)
+
+        for position in errors:
+            if position in created_folders:
+                rmtree(path.join(self._location, str(document_ids[position])))
+                self._catalog.discard(document_ids[position])
+            document_ids[position] = None
+            module_logger.error("The {}. document of the batch couldn't be added: {}".format(position, errors[position]))
+        if errors:
+            raise BulkAddError("{} of {} documents couldn't be added!".format(len(errors), len(documents)),
+                               document_ids, errors)
+        return document_ids
+
     def create_structure_for_document(self, new_document_id):
         """
         Creates the directories necessary directories.
@@ -436,7 +1498,9 @@ class DocumentManager(object):
         :return: The path of the new document directory.
         """
         new_document_folder = path.join(self._location, str(new_document_id))
+        self._catalog.refresh()
         makedirs(new_document_folder)
+        self._catalog.register(new_document_id)
         return new_document_folder
 
     def update_document(self, document_id, document):
@@ -448,12 +1512,49 @@ class DocumentManager(object):
         :exception ValueError is raised if no document is found by the ``document_id``.
         :return:
         """
-        if document_id not in self.find_all_documents():
+        if document_id not in self._catalog:
             raise ValueError("The document with {} can't be updated because doesn't exists!".format(document_id))
         else:
             document_path = path.join(self._location, str(document_id))
             self.save_document(document_path, document_id, document)
 
+    def adopt_document(self, document_id):
+        """
+        Registers a :py:class:Document which directory was copied into the documents directory together with it's
+        metadata file, e.g. by an import.
+
+        :param document_id: The ID of the :py:class:Document.
+        :return:
+        """
+        self._catalog.adopt(document_id)
+
+    def reload_documents(self, document_ids):
+        """
+        Indexes :py:class:Document objects again whose directories were replaced outside of the
+        :py:class:DocumentManager object (e.g. by a restore), the removed documents are dropped from the indexes.
+
+        :param document_ids: The IDs of the replaced :py:class:Document objects.
+        :return:
+        """
+        indexed_documents = []
+        for document_id in document_ids:
+            self._index.discard(document_id)
+            self._search_index.discard(document_id)
+            if document_id in self._catalog:
+                indexed_documents.append((document_id, self._catalog.metadata(document_id)['document']))
+        self._index.add_many(indexed_documents)
+        self._search_index.add_many(indexed_documents)
+
+    def rebuild_indexes(self):
+        """
+        Rebuilds the secondary indexes of the title, author and document format and the full-text index from the
+        metadata files of the :py:class:Document objects.
+
+        :return:
+        """
+        self._index.rebuild()
+        self._search_index.rebuild()
+
     def remove_document(self, document_id):
         """
         Removes a :py:class:Document object from the :py:class:Repository and it deletes the document's directory too.
@@ -464,7 +1565,11 @@ class DocumentManager(object):
         """
         document_path = path.join(self._location, str(document_id))
         if path.exists(document_path):
+            self._catalog.refresh()
             rmtree(document_path)
+            self._catalog.discard(document_id)
+            self._index.discard(document_id)
+            self._search_index.discard(document_id)
         else:
             raise ValueError("The document with the {} ID doesn't exists, it can't be removed!".format(document_id))
 
@@ -475,14 +1580,7 @@ class DocumentManager(object):
         :return: A list of :py:class:Document IDs found in the :py:class:Repository. If no :py:class:Document was
         found an empty list is returned.
         """
-        all_available_documents = []
-        for file_or_folder in listdir(self._location):
-            if path.isdir(path.join(self._location, file_or_folder)):
-                try:
-                    all_available_documents.append(int(file_or_folder))
-                except:
-                    pass
-        return all_available_documents
+        return self._catalog.ids()
 
     def count_documents(self):
         """
@@ -490,20 +1588,135 @@ class DocumentManager(object):
 
         :return: Number of available :py:class:Document objects.
         """
-        return len(self.find_all_documents())
+        return len(self._catalog)
 
-    def load_all_documents(self, user_manager = None):
+    def load_all_documents(self, user_manager = None, lazy = False, workers = None, processes = None):
         """
         Searches for all :py:class:Document object in the :py:class:Repository.
 
+        By default the documents are loaded one after the other. If ``workers`` is given the metadata is read by a pool
+        of threads, so the latency of the reads overlaps (e.g. on a network filesystem), and if ``processes`` is given
+        too the :py:class:Document objects are built by a pool of processes. The result of a concurrent load is the same
+        as the result of the sequential load, but a failed document doesn't abort it: the errors are collected per
+        document and reported by a :py:exc:BulkLoadError at the end.
+
         :param user_manager: The :py:class:UserManager of the :py:class:Repository.
+        :param lazy: Bool, if it's True :py:class:LazyDocument objects are returned, which fields are parsed on the
+        first access.
+        :param workers: The number of threads reading the metadata, None for the sequential load.
+        :param processes: The number of processes building the :py:class:Document objects, it's ignored if ``lazy`` is
+        True.
+        :exception BulkLoadError is raised if some documents of a concurrent load couldn't be loaded, it contains the
+        loaded documents and the errors.
         :return: A list of :py:class:Document objects found in the :py:class:Repository in a dictionary. The key of the
         dictionary is the ID of the :py:class:Document and the value is a :py:class:Document object. If no document was
         found an empty dictionary is returned.
         """
+        if workers or processes:
+            return self._load_documents_concurrently(self.find_all_documents(), user_manager, lazy, workers or 1,
+                                                     processes)
         all_documents = dict()
         for document_id in self.find_all_documents():
-            all_documents[document_id] = self.load_document(document_id, user_manager = user_manager)
+            all_documents[document_id] = self.load_document(document_id, user_manager = user_manager, lazy = lazy)
+        return all_documents
+
+    def iter_documents(self, filter = None, batch_size = ITER_BATCH_SIZE, user_manager = None, lazy = False):
+        """
+        Iterates over the :py:class:Document objects in the order of their IDs, the metadata is read in batches of
+        ``batch_size`` documents, so the memory usage doesn't depend on the size of the :py:class:Repository.
+
+        The ``filter`` predicate is called with a :py:class:LazyDocument, so only the fields read by the predicate are
+        parsed, a rejected document is never built.
+
+        :param filter: A function which gets a :py:class:Document and returns True if the document is needed, None
+        accepts every document.
+        :param batch_size: The number of documents read at once.
+        :param user_manager: The :py:class:UserManager of the :py:class:Repository.
+        :param lazy: Bool, if it's True :py:class:LazyDocument objects are yielded.
+        :return: A generator of (document ID, :py:class:Document object) tuples.
+        """
+        for batch in batched(self.find_all_documents(), batch_size):
+            for document_id, meta_data in self._catalog.metadata_batch(batch):
+                lazy_document = None
+                if filter is not None or lazy:
+                    lazy_document = LazyDocument(document_id, meta_data['document'], user_manager)
+                    if filter is not None and not filter(lazy_document):
+                        continue
+                if lazy:
+                    yield document_id, lazy_document
+                else:
+                    yield document_id, DocumentManager.build_document(meta_data['document'], user_manager)
+
+    def _load_documents_concurrently(self, document_ids, user_manager, lazy, workers, processes):
+        """
+        Loads :py:class:Document objects with a pool of threads reading the metadata and optionally a pool of processes
+        building the objects, see :py:meth:load_all_documents.
+
+        :param document_ids: The IDs of the :py:class:Document objects to load.
+        :param user_manager: The :py:class:UserManager of the :py:class:Repository.
+        :param lazy: Bool, if it's True :py:class:LazyDocument objects are returned.
+        :param workers: The number of threads reading the metadata.
+        :param processes: The number of processes building the :py:class:Document objects, or None.
+        :exception BulkLoadError is raised if some documents couldn't be loaded.
+        :return: A dictionary of the :py:class:Document objects keyed by ID.
+        """
+        all_documents = dict()
+        errors = dict()
+        if not document_ids:
+            return all_documents
+
+        def read_metadata(document_id):
+            try:
+                return document_id, self._catalog.metadata(document_id)['document'], None
+            except Exception as e:
+                return document_id, None, e
+
+        metadata = []
+        pool = ThreadPool(max(1, min(workers, len(document_ids))))
+        try:
+            for document_id, properties, error in pool.imap(read_metadata, document_ids):
+                if error is not None:
+                    errors[document_id] = error
+                else:
+                    metadata.append((document_id, properties))
+        finally:
+            pool.close()
+            pool.join()
+
+        if lazy:
+            for document_id, properties in metadata:
+                all_documents[document_id] = LazyDocument(document_id, properties, user_manager)
+        else:
+            built_documents = []
+            if processes:
+                chunk_size = max(1, len(metadata) // (processes * PARSE_CHUNKS_PER_PROCESS) + 1)
+                chunks = [metadata[i:i + chunk_size] for i in xrange(0, len(metadata), chunk_size)]
+                process_pool = Pool(processes)
+                try:
+                    for results in process_pool.imap(_build_document_chunk, chunks):
+                        built_documents.extend(results)
+                finally:
+                    process_pool.close()
+                    process_pool.join()
+            else:
+                built_documents = [(document_id, None) for document_id, _ in metadata]
+            properties_by_id = dict(metadata)
+            for document_id, document in built_documents:
+                if document is None:
+                    try:
+                        document = DocumentManager.build_document(properties_by_id[document_id], user_manager)
+                    except Exception as e:
+                        document = e
+                if isinstance(document, Exception):
+                    errors[document_id] = document
+                else:
+                    all_documents[document_id] = document
+
+        for document_id, error in sorted(errors.iteritems()):
+            module_logger.error("The document with {} ID couldn't be loaded: {}".format(document_id, error))
+        if errors:
+            raise BulkLoadError("{} of {} documents couldn't be loaded!".format(len(errors), len(document_ids)),
+                                all_documents, errors)
         return all_documents
 
     def find_document_by_id(self, document_id, user_manager = None):
@@ -515,10 +1728,23 @@ class DocumentManager(object):
         :exception ValueError is raised if no :py:class:Document object was found with ``document_id`` ID.
         :return: A :py:class:Document object with ``document_id``.
         """
-        if document_id not in self.find_all_documents():
+        if document_id not in self._catalog:
             raise ValueError("The document with {} ID doesn't exists, it can't be loaded!".format(document_id))
         else:
-            return self.load_all_documents(user_manager = user_manager)[document_id]
+            return self.load_document(document_id, user_manager = user_manager)
+
+    def search_documents(self, query, page = 1, page_size = DEFAULT_PAGE_SIZE):
+        """
+        Searches for :py:class:Document objects by keywords in the :py:attr:title, the :py:attr:description and the
+        text files of the documents.
+
+        :param query: The keywords separated by whitespaces, all of them must match.
+        :param page: The number of the requested page, the first page is 1.
+        :param page_size: The maximal number of hits on a page.
+        :return: :py:class:SearchPage object with the IDs, the BM25 scores and the snippets of the hits, the best hit
+        is the first.
+        """
+        return self._search_index.search(query, page, page_size)
 
     def find_documents_by_title(self, title):
         """
@@ -529,9 +1755,8 @@ class DocumentManager(object):
         :return: A dictionary of :py:class:Document objects with ``title``.
         """
         documents_by_title = dict()
-        for doc_id_key, doc_value in self.load_all_documents().iteritems():
-            if doc_value.title.lower() == title.lower():
-                documents_by_title[doc_id_key] = doc_value
+        for document_id in sorted(self._index.find_by_title(title)):
+            documents_by_title[document_id] = self.load_document(document_id)
         if len(documents_by_title) == 0:
             raise DocumentDoesntExistsError("No document was found with {} title!".format(title))
         else:
@@ -548,13 +1773,20 @@ class DocumentManager(object):
         :return: A dictionary of :py:class:Document objects with ``author`` :py:attr:author.
         """
         documents_by_author = dict()
-        for doc_id_key, doc_value in self.load_all_documents(user_manager = user_manager).iteritems():
+        try:
+            indexed_documents = self._index.find_by_author(author)
+        except (TypeError, ValueError):
+            indexed_documents = set()
+        for document_id in sorted(indexed_documents):
+            documents_by_author[document_id] = self.load_document(document_id, user_manager = user_manager)
+        for document_id in sorted(self._index.unresolved_authors):
+            doc_value = self.load_document(document_id, user_manager = user_manager)
             if isinstance(doc_value.author, list):
                 authors = doc_value.author
             else:
                 authors = [doc_value.author]
             if author in authors:
-                documents_by_author[doc_id_key] = doc_value
+                documents_by_author[document_id] = doc_value
         if len(documents_by_author) == 0:
             raise DocumentDoesntExistsError("No document was found with {} author!".format(author))
         else:
@@ -570,9 +1802,8 @@ class DocumentManager(object):
         :return: A dictionary of :py:class:Document objects with ``format``.
         """
         documents_by_author = dict()
-        for doc_id_key, doc_value in self.load_all_documents().iteritems():
-            if format == doc_value.doc_format:
-                documents_by_author[doc_id_key] = doc_value
+        for document_id in sorted(self._index.find_by_format(format)):
+            documents_by_author[document_id] = self.load_document(document_id)
         if len(documents_by_author) == 0:
             raise DocumentDoesntExistsError("No document was found with {} format!".format(format))
         else:
@@ -591,7 +1822,7 @@ class DocumentManager(object):
         the document the value is True if not it's False.
         """
         existence_of_document_files = dict()
-        if document_id not in self.find_all_documents():
+        if document_id not in self._catalog:
             raise ValueError("The docuement with {} ID doesn't exists!".format(document_id))
         else:
             document_path = path.join(self._location, str(document_id))
@@ -618,13 +1849,13 @@ class DocumentManager(object):
         referenced within the document the value is True if not it's False.
         """
         unreferenced_document_files = dict()
-        if document_id not in self.find_all_documents():
+        if document_id not in self._catalog:
             raise ValueError("The docuement with {} ID doesn't exists!".format(document_id))
         else:
             document_path = path.join(self._location, str(document_id))
             document = self.find_document_by_id(document_id)
             for document_file in listdir(document_path):
-                if document_file != '{}_document_metadata.edd'.format(
+                if document_file != DOCUMENT_METADATA_FILE_NAME_FORMAT.format(
                         document_id) and document_file not in document.files:
                     unreferenced_document_files[document_file] = False
                 else:
@@ -641,7 +1872,7 @@ class DocumentManager(object):
         :exception ValueError is raised if no :py:class:Document object is found.
         :return:
         """
-        if document_id not in self.find_all_documents():
+        if document_id not in self._catalog:
             raise ValueError("The docuement with {} ID doesn't exists!".format(document_id))
         else:
             document_path = path.join(self._location, str(document_id))
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+"""Cache of the parsed ini files.
+
+The cache is opt-in: :py:func:cached_read_ini_file reads the file with :py:func:iniformat.reader.read_ini_file until
+the cache is enabled with :py:func:enable_cache. The cached entries are keyed on the path, the modification time and the
+size of the file, so a modified file is parsed again. The cached contents are returned as read-only
+:py:class:FrozenDict views, so a shared parse can't be modified by the callers. The least recently used entry is
+dropped when the cache is full.
+"""
+
+# Imports -----------------------------------------------------------------------------------------------------------
+import logging
+from collections import Mapping, OrderedDict
+from os import path, stat
+from threading import RLock
+
+from iniformat.reader import read_ini_file
+
+# Authorship information  -------------------------------------------------------------------------------------------
+__author__ = "Zsolt Bokor Levente"
+__copyright__ = "Copyright 2016, Morgan Stanley - Training 360 Project"
+__credits__ = __author__
+__version__ = "1.0.0"
+__maintainer__ = __author__
+__email__ = ["bokor.zsolt5@gmail.com", "bokorzsolt@yahoo.com"]
+__status__ = "Development"
+
+# -------------------------------------------------------------------------------------------------------------------
+
+DEFAULT_CAPACITY = 128
+module_logger = logging.getLogger('repository.cache')
+ini_file_cache = None
+
+
+class FrozenDict(Mapping):
+    """Read-only view of a dictionary, the nested dictionaries are read-only views too.
+    """
+
+    def __init__(self, data):
+        """
+        Initialisation of a new :py:class:FrozenDict object.
+
+        :param data: The dictionary to wrap, it's copied so later changes of ``data`` are not visible.
+        """
+        self._data = dict((key, FrozenDict(value) if isinstance(value, dict) else value)
+                          for key, value in data.iteritems())
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return 'FrozenDict({!r})'.format(self._data)
+
+    def to_dict(self):
+        """
+        Creates a mutable copy of the view.
+
+        :return: A dictionary, the nested views are converted to dictionaries too.
+        """
+        return dict((key, value.to_dict() if isinstance(value, FrozenDict) else value)
+                    for key, value in self._data.iteritems())
+
+
+class IniFileCache(object):
+    """Least recently used cache of the parsed ini files.
+
+    The :py:class:IniFileCache is defined by the :py:attr:capacity, the maximal number of cached files, and it counts
+    the cache :py:attr:hits and :py:attr:misses.
+    """
+
+    def __init__(self, capacity = DEFAULT_CAPACITY):
+        """
+        Initialisation of a new :py:class:IniFileCache object.
+
+        :param capacity: The maximal number of cached files.
+        :exception ValueError is raised if the ``capacity`` is not positive.
+        """
+        self._entries = OrderedDict()
+        self._lock = RLock()
+        self._capacity = None
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def capacity(self):
+        """
+        The property of the :py:attr:_capacity attribute.
+
+        :return: The maximal number of cached files.
+        """
+        return self._capacity
+
+    @capacity.setter
+    def capacity(self, value):
+        """
+        The setter of the :py:attr:_capacity, the least recently used entries are dropped if there are more than
+        ``value`` entries.
+
+        :param value: New capacity.
+        :exception ValueError is raised if the ``value`` is not positive.
+        :return:
+        """
+        if value < 1:
+            raise ValueError("The capacity of the cache must be positive, not {}!".format(value))
+        with self._lock:
+            self._capacity = value
+            while len(self._entries) > self._capacity:
+                self._entries.popitem(last = False)
+
+    def read(self, file_path):
+        """
+        Returns the parsed content of an ini file, the file is parsed only if it's not in the cache or it was
+        modified since it was cached.
+
+        :param file_path: The path of the ini file.
+        :return: :py:class:FrozenDict view of the content of the file.
+        """
+        key = path.abspath(file_path)
+        file_stat = stat(key)
+        file_stamp = (file_stat.st_mtime, file_stat.st_size)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] == file_stamp:
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        content = FrozenDict(read_ini_file(key))
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (file_stamp, content)
+            if len(self._entries) > self._capacity:
+                self._entries.popitem(last = False)
+        return content
+
+    def invalidate(self, file_path):
+        """
+        Drops a file from the cache.
+
+        :param file_path: The path of the ini file.
+        :return:
+        """
+        with self._lock:
+            self._entries.pop(path.abspath(file_path), None)
+
+    def clear(self):
+        """
+        Drops all the entries and resets the counters.
+
+        :return:
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def statistics(self):
+        """
+        Summarizes the usage of the cache.
+
+        :return: A dictionary with the number of hits, misses, cached files and the capacity.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'capacity': self._capacity}
+
+
+def enable_cache(capacity = DEFAULT_CAPACITY):
+    """Enables the module level cache used by :py:func:cached_read_ini_file or changes it's capacity.
+
+    :param capacity: The maximal number of cached files.
+    :return: The :py:class:IniFileCache object.
+    """
+    global ini_file_cache
+    if ini_file_cache is None:
+        ini_file_cache = IniFileCache(capacity)
+    else:
+        ini_file_cache.capacity = capacity
+    module_logger.info("The ini file cache is enabled with {} capacity.".format(capacity))
+    return ini_file_cache
+
+
+def disable_cache():
+    """Disables and drops the module level cache.
+
+    :return:
+    """
+    global ini_file_cache
+    ini_file_cache = None
+
+
+def invalidate(file_path):
+    """Drops a file from the module level cache if it's enabled, it's called when the file is written.
+
+    :param file_path: The path of the ini file.
+    :return:
+    """
+    if ini_file_cache is not None:
+        ini_file_cache.invalidate(file_path)
+
+
+def cached_read_ini_file(file_path):
+    """Reads an ini file through the module level cache if it's enabled.
+
+    :param file_path: The path of the ini file.
+    :return: The content of the file, a :py:class:FrozenDict if the cache is enabled.
+    """
+    if ini_file_cache is None:
+        return read_ini_file(file_path)
+    return ini_file_cache.read(file_path)
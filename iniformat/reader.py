@@ -4,11 +4,16 @@
  - The ini file can contains sections and properties.
  - The section and property names are arbitrary without restrictions.
  - The section denoted by leading [ and trailing ] as the first non-whitespace characters.
+ - The property is split at the first = character, so the value can contain = characters.
  - The duplicated section or property definition causes error.
+
+The whole file is read at once and parsed in a single pass, the :py:func:parse_many function reads many files with
+low level file descriptors to avoid the cost of the file objects.
 """
 
 # Imports -----------------------------------------------------------------------------------------------------------
 import logging
+import os
 
 # Authorship information  -------------------------------------------------------------------------------------------
 __author__ = "Imre Piller"
@@ -25,17 +30,50 @@ module_logger = logging.getLogger('repository.reader')
 
 
 def read_ini_file(path):
-    content = {}
-    section_name = ''
     with open(path) as ini_file:
-        for line in ini_file:
-            line = line.rstrip('\n')
-            if is_section_header(line):
-                section_name = get_section_name(line)
-                content[section_name] = {}
-            elif is_property(line):
-                key, value = get_property(line)
-                content[section_name][key] = value
+        return parse_ini_string(ini_file.read())
+
+
+def parse_many(paths):
+    """Read and parse many ini files.
+
+    :param paths: An iterable of ini file paths.
+    :return: A list of the parsed contents in the order of ``paths``.
+    """
+    contents = []
+    for path in paths:
+        file_descriptor = os.open(path, os.O_RDONLY)
+        try:
+            size = os.fstat(file_descriptor).st_size
+            chunks = []
+            while True:
+                chunk = os.read(file_descriptor, max(size, 4096))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        finally:
+            os.close(file_descriptor)
+        contents.append(parse_ini_string(''.join(chunks)))
+    return contents
+
+
+def parse_ini_string(text):
+    """Parse the content of an ini file.
+
+    :param text: The content of the ini file.
+    :exception KeyError is raised if a property precedes the first section header.
+    :return: A dictionary of the sections, the values are dictionaries of the properties.
+    """
+    content = {}
+    properties = None
+    for line in text.split('\n'):
+        if line[:1] == '[' and line[-1:] == ']' and len(line) >= 2:
+            properties = content[line[1:-1]] = {}
+        elif '=' in line:
+            if properties is None:
+                raise KeyError('The property line precedes the first section header!')
+            key, _, value = line.partition('=')
+            properties[key.strip()] = value.strip()
     return content
 
 
@@ -56,10 +94,8 @@ def is_property(line):
 
 
 def get_property(line):
-    splitted = line.split('=')
-    if len(splitted) == 2:
-        key = splitted[0].strip()
-        value = splitted[1].strip()
-        return (key, value)
+    key, separator, value = line.partition('=')
+    if separator:
+        return (key.strip(), value.strip())
     else:
         raise ValueError('Invalid property line!')
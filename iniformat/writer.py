@@ -1,9 +1,23 @@
 #!/usr/bin/env python
 """Write data to an ini file
+
+The content of the file is built in memory and written at once. In atomic mode the content is written to a temporary
+file in the directory of the target which is renamed to the target, so a crash never leaves a truncated file and the
+readers see either the old or the new content. Every atomic write is synchronized to the disk, except within a
+:py:func:group_commit block: there the synchronization is deferred to the end of the block, where all the written
+files are flushed together.
 """
 
 # Imports -----------------------------------------------------------------------------------------------------------
+import ctypes
+import ctypes.util
 import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from iniformat.cache import invalidate
 
 # Authorship information  -------------------------------------------------------------------------------------------
 __author__ = "Imre Piller"
@@ -17,12 +31,170 @@ __status__ = "Development"
 # -------------------------------------------------------------------------------------------------------------------
 
 module_logger = logging.getLogger('repository.writer')
+_group_commit_state = threading.local()
+ATOMIC_FILE_MODE = 0o644
+_syncfs = []
+
+
+def write_ini_file(filename, data, atomic = False):
+    """Write the data to an ini file.
+
+    :param filename: The path of the ini file.
+    :param data: A dictionary of the sections, the values are dictionaries of the properties.
+    :param atomic: Bool, if it's True the file is replaced atomically and synchronized to the disk.
+    :return:
+    """
+    content = format_ini(data)
+    if atomic:
+        write_atomically(filename, content)
+    else:
+        with open(filename, 'w') as ini_file:
+            ini_file.write(content)
+    invalidate(filename)
+
+
+def format_ini(data):
+    """Build the content of an ini file.
+
+    :param data: A dictionary of the sections, the values are dictionaries of the properties.
+    :return: The content of the ini file as a string.
+    """
+    lines = []
+    for section, properties in data.items():
+        lines.append('[' + section + ']\n')
+        for k, v in properties.items():
+            lines.append(k + '=' + str(v) + "\n")
+        lines.append('\n')
+    return ''.join(lines)
+
+
+def write_atomically(filename, content):
+    """Write the content to a temporary file in the directory of ``filename`` and rename it to ``filename``. The
+    replaced file keeps it's permissions, a new file gets the :py:const:ATOMIC_FILE_MODE permissions.
+
+    :param filename: The path of the target file.
+    :param content: The content of the file.
+    :return:
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    try:
+        file_mode = os.stat(filename).st_mode & 0o7777
+    except OSError:
+        file_mode = ATOMIC_FILE_MODE
+    file_descriptor, temporary_file = tempfile.mkstemp(prefix = '.' + os.path.basename(filename) + '.',
+                                                       suffix = '.tmp', dir = directory)
+    try:
+        with os.fdopen(file_descriptor, 'w') as ini_file:
+            ini_file.write(content)
+            ini_file.flush()
+            os.fchmod(ini_file.fileno(), file_mode)
+            if not in_group_commit():
+                os.fsync(ini_file.fileno())
+        if os.name != 'posix' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(temporary_file, filename)
+    except Exception:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+        raise
+    if in_group_commit():
+        _group_commit_state.files.append(os.path.abspath(filename))
+    else:
+        fsync_directory(directory)
+
+
+def in_group_commit():
+    """Determine if the current thread is within a :py:func:group_commit block.
+
+    :return: Bool.
+    """
+    return getattr(_group_commit_state, 'depth', 0) > 0
+
+
+@contextmanager
+def group_commit():
+    """Defer the synchronization of the atomic writes of the current thread to the end of the block.
+
+    The blocks can be nested, the files are synchronized at the end of the outermost block. On Linux each written
+    filesystem is synchronized with a single syncfs call, elsewhere the files and their directories are synchronized
+    one by one.
+
+    :return:
+    """
+    if not in_group_commit():
+        _group_commit_state.depth = 0
+        _group_commit_state.files = []
+    _group_commit_state.depth += 1
+    try:
+        yield
+    finally:
+        _group_commit_state.depth -= 1
+        if _group_commit_state.depth == 0:
+            written_files = _group_commit_state.files
+            _group_commit_state.files = []
+            synchronize_files(written_files)
+
+
+def synchronize_files(written_files):
+    """Flush written files to the disk.
+
+    :param written_files: List of file paths.
+    :return:
+    """
+    if not written_files:
+        return
+    directories = set(os.path.dirname(written_file) for written_file in written_files)
+    syncfs = _libc_syncfs()
+    if syncfs is not None:
+        synchronized_devices = set()
+        for directory in directories:
+            device = os.stat(directory).st_dev
+            if device not in synchronized_devices:
+                file_descriptor = os.open(directory, os.O_RDONLY)
+                try:
+                    if syncfs(file_descriptor) == 0:
+                        synchronized_devices.add(device)
+                finally:
+                    os.close(file_descriptor)
+        if len(synchronized_devices) == len(set(os.stat(directory).st_dev for directory in directories)):
+            module_logger.debug("{} files are synchronized with syncfs.".format(len(written_files)))
+            return
+    for written_file in written_files:
+        if os.path.exists(written_file):
+            file_descriptor = os.open(written_file, os.O_RDONLY)
+            try:
+                os.fsync(file_descriptor)
+            finally:
+                os.close(file_descriptor)
+    for directory in directories:
+        fsync_directory(directory)
+    module_logger.debug("{} files are synchronized one by one.".format(len(written_files)))
+
+
+def fsync_directory(directory):
+    """Flush the entries of a directory to the disk, so a rename in the directory is durable.
+
+    :param directory: The path of the directory.
+    :return:
+    """
+    if os.name != 'posix':
+        return
+    file_descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(file_descriptor)
+    finally:
+        os.close(file_descriptor)
+
 
+def _libc_syncfs():
+    """Look up the syncfs function of the C library.
 
-def write_ini_file(filename, data):
-    with open(filename, 'w') as ini_file:
-        for section, properties in data.items():
-            ini_file.write('[' + section + ']\n')
-            for k, v in properties.items():
-                ini_file.write(k + '=' + str(v) + "\n")
-            ini_file.write('\n')
+    :return: The syncfs function or None if it's not available.
+    """
+    if not _syncfs:
+        library_name = ctypes.util.find_library('c')
+        try:
+            _syncfs.append(getattr(ctypes.CDLL(library_name, use_errno = True), 'syncfs') if library_name else None)
+        except (OSError, AttributeError):
+            _syncfs.append(None)
+    return _syncfs[0]
@@ -0,0 +1,665 @@
+#!/usr/bin/env python
+"""SQLite storage backend of the metadata of a :py:class:Repository.
+
+By default the metadata of the documents, users, roles and projects is stored in small text files (flat files). The
+repository can be configured to store the metadata in an SQLite database instead, the payload files of the documents
+stay in the document directories. The backend is selected by the storage section of the paths.ini file:
+
+    [storage]
+    backend=sqlite
+    database=metadata.db
+
+The database path is relative to the repository directory. The database runs in WAL mode, so the readers are not
+blocked by the writer. A repository can be migrated between the two backends with:
+
+    python -m metadata_store REPOSITORY_PATH sqlite|flat
+"""
+
+# Imports -----------------------------------------------------------------------------------------------------------
+import logging
+import sqlite3
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from json import dumps, loads
+from os import path, listdir, remove, stat
+from shutil import rmtree
+from threading import RLock
+
+from iniformat.cache import cached_read_ini_file
+from iniformat.reader import read_ini_file
+from iniformat.writer import write_ini_file
+from storage_utils import reserve_ids
+
+# Authorship information  -------------------------------------------------------------------------------------------
+__author__ = "Zsolt Bokor Levente"
+__copyright__ = "Copyright 2016, Morgan Stanley - Training 360 Project"
+__credits__ = __author__
+__version__ = "1.0.0"
+__maintainer__ = __author__
+__email__ = ["bokor.zsolt5@gmail.com", "bokorzsolt@yahoo.com"]
+__status__ = "Development"
+
+# -------------------------------------------------------------------------------------------------------------------
+
+FLAT_FILE_BACKEND = 'flat'
+SQLITE_BACKEND = 'sqlite'
+DEFAULT_DATABASE_NAME = 'metadata.db'
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    title_key TEXT NOT NULL,
+    doc_format TEXT NOT NULL,
+    legacy_author INTEGER NOT NULL DEFAULT 0,
+    properties TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_title_key ON documents (title_key);
+CREATE INDEX IF NOT EXISTS documents_doc_format ON documents (doc_format);
+CREATE INDEX IF NOT EXISTS documents_legacy_author ON documents (legacy_author) WHERE legacy_author = 1;
+CREATE TABLE IF NOT EXISTS document_authors (
+    author_id INTEGER NOT NULL,
+    document_id INTEGER NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+    PRIMARY KEY (author_id, document_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS document_authors_document_id ON document_authors (document_id);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    first_name TEXT NOT NULL,
+    family_name TEXT NOT NULL,
+    birth TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_email ON users (lower(email));
+CREATE TABLE IF NOT EXISTS user_roles (
+    user_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    PRIMARY KEY (user_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS user_roles_role ON user_roles (role);
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    members TEXT NOT NULL,
+    documents TEXT NOT NULL
+);
+"""
+module_logger = logging.getLogger('repository.metadata_store')
+_open_stores = dict()
+_open_stores_lock = RLock()
+
+
+class SQLiteMetadataStore(object):
+    """Metadata of the documents, users, roles and projects of a :py:class:Repository in an SQLite database.
+
+    The :py:class:SQLiteMetadataStore is defined by the path of the database file. One connection is shared by the
+    threads of the process, the access is serialized by a lock. Every statement is parameterized, so the compiled
+    statements are reused from the statement cache of the connection.
+    """
+
+    def __init__(self, database_path):
+        """
+        Initialisation of a new :py:class:SQLiteMetadataStore object, the tables are created if they don't exist.
+
+        :param database_path: The path of the database file.
+        """
+        self._database_path = database_path
+        self._lock = RLock()
+        self._transaction_depth = 0
+        self._connection = sqlite3.connect(database_path, check_same_thread = False, isolation_level = None,
+                                           cached_statements = 256)
+        self._connection.text_factory = str
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('PRAGMA foreign_keys=ON')
+        self._connection.executescript(SCHEMA)
+        self._file_identity = SQLiteMetadataStore.identify_file(database_path)
+        module_logger.info("The {} metadata database is opened.".format(database_path))
+
+    @property
+    def database_path(self):
+        """
+        The property of the :py:attr:_database_path attribute.
+
+        :return: The path of the database file.
+        """
+        return self._database_path
+
+    @property
+    def file_identity(self):
+        """
+        The property of the :py:attr:_file_identity attribute.
+
+        :return: The identity of the database file when it was opened, see :py:meth:identify_file.
+        """
+        return self._file_identity
+
+    @classmethod
+    def identify_file(cls, database_path):
+        """
+        Determines the identity of a database file, which changes if the file is deleted or replaced.
+
+        :param database_path: The path of the database file.
+        :return: A tuple of the device and the inode number, or None if the file doesn't exists.
+        """
+        try:
+            file_stat = stat(database_path)
+        except OSError:
+            return None
+        return file_stat.st_dev, file_stat.st_ino
+
+    def close(self):
+        """
+        Closes the connection of the database.
+
+        :return:
+        """
+        with self._lock:
+            self._connection.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups the statements of the block into one transaction, the blocks can be nested. The transaction is rolled
+        back if an exception is raised.
+
+        :return:
+        """
+        with self._lock:
+            if self._transaction_depth == 0:
+                self._connection.execute('BEGIN IMMEDIATE')
+            self._transaction_depth += 1
+            try:
+                yield self._connection
+            except Exception:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    self._connection.execute('ROLLBACK')
+                raise
+            else:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    self._connection.execute('COMMIT')
+
+    def _query(self, statement, parameters = ()):
+        """
+        Executes a query.
+
+        :param statement: The SQL statement.
+        :param parameters: The parameters of the statement.
+        :return: A list of the rows.
+        """
+        with self._lock:
+            return self._connection.execute(statement, parameters).fetchall()
+
+    def _column(self, statement, parameters = ()):
+        """
+        Executes a query and returns the first column of the rows.
+
+        :param statement: The SQL statement.
+        :param parameters: The parameters of the statement.
+        :return: A list of values.
+        """
+        return [row[0] for row in self._query(statement, parameters)]
+
+    # Documents -----------------------------------------------------------------------------------------------------
+
+    def document_ids(self):
+        """
+        :return: The sorted list of the document IDs.
+        """
+        return self._column('SELECT id FROM documents ORDER BY id')
+
+    def has_document(self, document_id):
+        """
+        :param document_id: The ID of a document.
+        :return: Bool, TRUE if the document is stored.
+        """
+        return bool(self._query('SELECT 1 FROM documents WHERE id = ?', (document_id,)))
+
+    def count_documents(self):
+        """
+        :return: The number of the stored documents.
+        """
+        return self._query('SELECT count(*) FROM documents')[0][0]
+
+    def load_document(self, document_id):
+        """
+        :param document_id: The ID of a document.
+        :return: The properties of the document section of the metadata, or None if the document is not stored.
+        """
+        rows = self._query('SELECT properties FROM documents WHERE id = ?', (document_id,))
+        if not rows:
+            return None
+        return dict((str(key), value.encode('utf-8')) for key, value in loads(rows[0][0]).iteritems())
+
+    def load_documents(self, document_ids):
+        """
+        :param document_ids: A list of document IDs.
+        :return: A list of (document ID, properties of the document section of the metadata) tuples of the stored
+        documents ordered by ID.
+        """
+        if not document_ids:
+            return []
+        rows = self._query('SELECT id, properties FROM documents WHERE id IN ({}) ORDER BY id'.format(
+            ', '.join('?' * len(document_ids))), [int(document_id) for document_id in document_ids])
+        return [(document_id, dict((str(key), value.encode('utf-8')) for key, value in loads(properties).iteritems()))
+                for document_id, properties in rows]
+
+    def save_document(self, document_id, properties, title_key, authors, doc_format):
+        """
+        Inserts or replaces a document.
+
+        :param document_id: The ID of the document.
+        :param properties: The properties of the document section of the metadata.
+        :param title_key: The indexed title of the document.
+        :param authors: The list of the author IDs, or None if the metadata contains the author names.
+        :param doc_format: The document format.
+        :return:
+        """
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM document_authors WHERE document_id = ?', (document_id,))
+            connection.execute('INSERT OR REPLACE INTO documents (id, title_key, doc_format, legacy_author, '
+                               'properties) VALUES (?, ?, ?, ?, ?)',
+                               (document_id, title_key, doc_format, int(authors is None), dumps(properties)))
+            connection.executemany('INSERT OR IGNORE INTO document_authors (author_id, document_id) VALUES (?, ?)',
+                                   [(author_id, document_id) for author_id in authors or []])
+
+    def remove_document(self, document_id):
+        """
+        :param document_id: The ID of the document to remove.
+        :return:
+        """
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM documents WHERE id = ?', (document_id,))
+
+    def find_documents_by_title_key(self, title_key):
+        """
+        :param title_key: The indexed title.
+        :return: A list of document IDs.
+        """
+        return self._column('SELECT id FROM documents WHERE title_key = ? ORDER BY id', (title_key,))
+
+    def find_documents_by_author(self, author_id):
+        """
+        :param author_id: The ID of the author.
+        :return: A list of document IDs.
+        """
+        return self._column('SELECT document_id FROM document_authors WHERE author_id = ? ORDER BY document_id',
+                            (author_id,))
+
+    def find_documents_by_format(self, doc_format):
+        """
+        :param doc_format: The document format.
+        :return: A list of document IDs.
+        """
+        return self._column('SELECT id FROM documents WHERE doc_format = ? ORDER BY id', (doc_format,))
+
+    def find_documents_with_legacy_author(self):
+        """
+        :return: A list of the IDs of the documents which metadata contains the author names instead of the IDs.
+        """
+        return self._column('SELECT id FROM documents WHERE legacy_author = 1 ORDER BY id')
+
+    # Users ---------------------------------------------------------------------------------------------------------
+
+    def user_ids(self):
+        """
+        :return: The sorted list of the user IDs.
+        """
+        return self._column('SELECT id FROM users ORDER BY id')
+
+    def has_user(self, user_id):
+        """
+        :param user_id: The ID of a user.
+        :return: Bool, TRUE if the user is stored.
+        """
+        return bool(self._query('SELECT 1 FROM users WHERE id = ?', (user_id,)))
+
+    def load_user(self, user_id):
+        """
+        :param user_id: The ID of a user.
+        :return: The first name, family name, birth date, email address and password of the user in a tuple, or None
+        if the user is not stored.
+        """
+        rows = self._query('SELECT first_name, family_name, birth, email, password FROM users WHERE id = ?',
+                           (user_id,))
+        return rows[0] if rows else None
+
+    def load_users(self, user_ids):
+        """
+        :param user_ids: A list of user IDs.
+        :return: A list of (user ID, first name, family name, birth date, email address, password) tuples of the stored
+        users ordered by ID.
+        """
+        if not user_ids:
+            return []
+        return self._query('SELECT id, first_name, family_name, birth, email, password FROM users WHERE id IN ({}) '
+                           'ORDER BY id'.format(', '.join('?' * len(user_ids))), [int(user_id) for user_id in user_ids])
+
+    def save_user(self, user_id, first_name, family_name, birth, email, password):
+        """
+        Inserts or replaces a user.
+
+        :return:
+        """
+        with self.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO users (id, first_name, family_name, birth, email, password) '
+                               'VALUES (?, ?, ?, ?, ?, ?)', (user_id, first_name, family_name, birth, email, password))
+
+    def remove_user(self, user_id):
+        """
+        :param user_id: The ID of the user to remove.
+        :return:
+        """
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM users WHERE id = ?', (user_id,))
+
+    def find_users_by_name(self, name):
+        """
+        :param name: A part of the full name of the user, the search is case insensitive.
+        :return: A list of user IDs.
+        """
+        return self._column("SELECT id FROM users WHERE instr(lower(first_name || ' ' || family_name), ?) > 0 "
+                            "ORDER BY id", (name.lower(),))
+
+    def find_users_by_email(self, email):
+        """
+        :param email: A part of the email address of the user, the search is case insensitive.
+        :return: A list of user IDs.
+        """
+        return self._column('SELECT id FROM users WHERE instr(lower(email), ?) > 0 ORDER BY id', (email.lower(),))
+
+    def find_users_by_exact_email(self, email):
+        """
+        :param email: The email address of the user, the comparison is case insensitive.
+        :return: A list of user IDs.
+        """
+        return self._column('SELECT id FROM users WHERE lower(email) = ? ORDER BY id', (email.strip().lower(),))
+
+    # Roles ---------------------------------------------------------------------------------------------------------
+
+    def read_roles(self):
+        """
+        :return: A dictionary, the key is a user ID and the value is the list of the role names of the user.
+        """
+        users_roles = dict()
+        for user_id, role in self._query('SELECT user_id, role FROM user_roles ORDER BY user_id, position'):
+            users_roles.setdefault(user_id, []).append(role)
+        return users_roles
+
+    def read_user_roles(self, user_id):
+        """
+        :param user_id: The ID of the user.
+        :return: The list of the role names of the user, or None if the user has no roles stored.
+        """
+        roles = self._column('SELECT role FROM user_roles WHERE user_id = ? ORDER BY position', (user_id,))
+        return roles or None
+
+    def find_users_by_role(self, role):
+        """
+        :param role: The name of the role.
+        :return: A list of user IDs.
+        """
+        return self._column('SELECT DISTINCT user_id FROM user_roles WHERE role = ? ORDER BY user_id', (role,))
+
+    def write_roles(self, users_roles):
+        """
+        Replaces the roles of all the users. A user without roles is stored with an empty role name, like in the roles
+        file.
+
+        :param users_roles: A dictionary, the key is a user ID and the value is the list of the role names of the user.
+        :return:
+        """
+        rows = []
+        for user_id, roles in users_roles.iteritems():
+            for position, role in enumerate(roles or ['']):
+                rows.append((int(user_id), position, role))
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM user_roles')
+            connection.executemany('INSERT INTO user_roles (user_id, position, role) VALUES (?, ?, ?)', rows)
+
+    # Projects ------------------------------------------------------------------------------------------------------
+
+    def project_ids(self):
+        """
+        :return: The sorted list of the project IDs.
+        """
+        return self._column('SELECT id FROM projects ORDER BY id')
+
+    def load_project(self, project_id):
+        """
+        :param project_id: The ID of a project.
+        :return: The properties of the project section of the metadata, or None if the project is not stored.
+        """
+        rows = self._query('SELECT name, description, members, documents FROM projects WHERE id = ?', (project_id,))
+        if not rows:
+            return None
+        return dict(zip(['name', 'description', 'members', 'documents'], rows[0]))
+
+    def load_projects(self, project_ids):
+        """
+        :param project_ids: A list of project IDs.
+        :return: A list of (project ID, properties of the project section of the metadata) tuples of the stored
+        projects ordered by ID.
+        """
+        if not project_ids:
+            return []
+        rows = self._query('SELECT id, name, description, members, documents FROM projects WHERE id IN ({}) '
+                           'ORDER BY id'.format(', '.join('?' * len(project_ids))),
+                           [int(project_id) for project_id in project_ids])
+        return [(row[0], dict(zip(['name', 'description', 'members', 'documents'], row[1:]))) for row in rows]
+
+    def save_project(self, project_id, properties):
+        """
+        Inserts or replaces a project.
+
+        :param project_id: The ID of the project.
+        :param properties: The properties of the project section of the metadata.
+        :return:
+        """
+        with self.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO projects (id, name, description, members, documents) '
+                               'VALUES (?, ?, ?, ?, ?)', (project_id, properties['name'], properties['description'],
+                                                          properties['members'], properties['documents']))
+
+    def remove_project(self, project_id):
+        """
+        :param project_id: The ID of the project to remove.
+        :return:
+        """
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM projects WHERE id = ?', (project_id,))
+
+
+def open_store(database_path):
+    """Opens the :py:class:SQLiteMetadataStore of a database file, the managers of a process share one store per file.
+    The store is reopened if the database file was replaced or deleted since it was opened (e.g. by a restore).
+
+    :param database_path: The path of the database file.
+    :return: :py:class:SQLiteMetadataStore object.
+    """
+    database_path = path.abspath(database_path)
+    with _open_stores_lock:
+        store = _open_stores.get(database_path)
+        if store is not None and store.file_identity != SQLiteMetadataStore.identify_file(database_path):
+            store.close()
+            store = None
+        if store is None:
+            store = _open_stores[database_path] = SQLiteMetadataStore(database_path)
+        return store
+
+
+def current_store(database_path):
+    """Returns the shared :py:class:SQLiteMetadataStore of a database file for one operation of a manager. The managers
+    keep the path of the database instead of the store, so they use the reopened store once the database file was
+    replaced (e.g. by a restore) instead of writing to the unlinked file.
+
+    :param database_path: The path of the database file, or None if the flat files are used.
+    :return: :py:class:SQLiteMetadataStore object, or None if the ``database_path`` is None.
+    """
+    return open_store(database_path) if database_path else None
+
+
+def close_store(database_path):
+    """Closes the shared :py:class:SQLiteMetadataStore of a database file.
+
+    :param database_path: The path of the database file.
+    :return:
+    """
+    with _open_stores_lock:
+        store = _open_stores.pop(path.abspath(database_path), None)
+    if store is not None:
+        store.close()
+
+
+def configured_store(repository_location, paths_file):
+    """Opens the metadata store configured in the storage section of the paths file of a :py:class:Repository.
+
+    :param repository_location: The path of the repository.
+    :param paths_file: The path of the paths file.
+    :exception ValueError is raised if the configured backend is unknown.
+    :return: :py:class:SQLiteMetadataStore object, or None if the flat files are used.
+    """
+    storage = cached_read_ini_file(paths_file).get('storage', {})
+    backend = storage.get('backend', FLAT_FILE_BACKEND)
+    if backend == FLAT_FILE_BACKEND:
+        return None
+    elif backend == SQLITE_BACKEND:
+        return open_store(path.join(repository_location, storage.get('database', DEFAULT_DATABASE_NAME)))
+    else:
+        raise ValueError("The {} storage backend is unknown, it should be {} or {}!".format(
+            backend, FLAT_FILE_BACKEND, SQLITE_BACKEND))
+
+
+def integer_entries(directory, directories = True):
+    """Lists the entries of a directory which name is an integer ID.
+
+    :param directory: The path of the directory.
+    :param directories: Bool, if it's True the subdirectories are listed, else the files.
+    :return: A sorted list of the IDs.
+    """
+    entries = []
+    for name in listdir(directory):
+        if path.isdir(path.join(directory, name)) == directories:
+            try:
+                entries.append(int(name))
+            except ValueError:
+                pass
+    return sorted(entries)
+
+
+def migrate(repository_location, backend, database_name = DEFAULT_DATABASE_NAME):
+    """Converts the metadata of a :py:class:Repository to the flat file or the SQLite backend.
+
+    The metadata is moved: after the conversion the metadata files of the old backend are removed (the roles file is
+    kept empty, it determines the type of the roles file for the migration back) or the database file is deleted.
+
+    :param repository_location: The path of the repository.
+    :param backend: :py:const:SQLITE_BACKEND or :py:const:FLAT_FILE_BACKEND.
+    :param database_name: The name of the database file within the repository directory.
+    :exception ValueError is raised if the ``backend`` is unknown or the repository already uses it.
+    :return:
+    """
+    from documents import DocumentIndex, DOCUMENT_METADATA_FILE_NAME_FORMAT, DOCUMENT_INDEX_FILE_NAME
+    from projects import PROJECT_METADATA_FILE_NAME_FORMAT
+    from users import Role, RoleManager, UserManager, USER_INDEX_FILE_NAME, ROLES_JOURNAL_FILE_NAME, USER_SHARDS_STORAGE
+    from user_shards import ShardedUserStore, SHARDS_DIRECTORY_NAME
+
+    paths_file = path.join(repository_location, 'paths.ini')
+    paths = read_ini_file(paths_file)
+    current_backend = paths.get('storage', {}).get('backend', FLAT_FILE_BACKEND)
+    if backend not in [FLAT_FILE_BACKEND, SQLITE_BACKEND]:
+        raise ValueError("The {} storage backend is unknown, it should be {} or {}!".format(
+            backend, FLAT_FILE_BACKEND, SQLITE_BACKEND))
+    if backend == current_backend:
+        raise ValueError("The {} repository already uses the {} backend!".format(repository_location, backend))
+    documents_path = path.join(repository_location, paths['directories']['documents'])
+    users_path = path.join(repository_location, paths['directories']['users'])
+    projects_path = path.join(repository_location, paths['directories']['projects'])
+    roles_file = path.join(users_path, RoleManager.get_roles_file(users_path))
+
+    if backend == SQLITE_BACKEND:
+        database_path = path.join(repository_location, database_name)
+        store = open_store(database_path)
+        with store.transaction():
+            for document_id in integer_entries(documents_path):
+                metadata_file = path.join(documents_path, str(document_id),
+                                          DOCUMENT_METADATA_FILE_NAME_FORMAT.format(document_id))
+                if path.exists(metadata_file):
+                    properties = read_ini_file(metadata_file)['document']
+                    entry = DocumentIndex.index_entry(properties)
+                    store.save_document(document_id, properties, DocumentIndex.title_key(entry['title']),
+                                        entry['author'], entry['doc_format'])
+            user_manager = UserManager(repository_location, paths_file)
+            for user_id in sorted(user_manager.find_all_users()):
+                store.save_user(user_id, *user_manager.read_user_record(user_id))
+            store.write_roles(dict((user_id, [role.role for role in roles]) for user_id, roles in
+                                   RoleManager(repository_location, paths_file).read_roles().iteritems()))
+            for project_id in integer_entries(projects_path):
+                metadata_file = path.join(projects_path, str(project_id),
+                                          PROJECT_METADATA_FILE_NAME_FORMAT.format(project_id))
+                if path.exists(metadata_file):
+                    store.save_project(project_id, read_ini_file(metadata_file)['project'])
+        # The ID counter is initialized while the user files still exist, it can't be bootstrapped later.
+        reserve_ids(users_path, 0)
+        paths['storage'] = {'backend': SQLITE_BACKEND, 'database': database_name}
+        write_ini_file(paths_file, paths, atomic = True)
+        for document_id in store.document_ids():
+            remove(path.join(documents_path, str(document_id), DOCUMENT_METADATA_FILE_NAME_FORMAT.format(document_id)))
+        if path.exists(path.join(documents_path, DOCUMENT_INDEX_FILE_NAME)):
+            remove(path.join(documents_path, DOCUMENT_INDEX_FILE_NAME))
+        for user_id in store.user_ids():
+            if path.exists(path.join(users_path, str(user_id))):
+                remove(path.join(users_path, str(user_id)))
+        if path.exists(path.join(users_path, SHARDS_DIRECTORY_NAME)):
+            rmtree(path.join(users_path, SHARDS_DIRECTORY_NAME))
+        if path.exists(path.join(users_path, USER_INDEX_FILE_NAME)):
+            remove(path.join(users_path, USER_INDEX_FILE_NAME))
+        open(roles_file, 'w').close()
+        if path.exists(path.join(users_path, ROLES_JOURNAL_FILE_NAME)):
+            remove(path.join(users_path, ROLES_JOURNAL_FILE_NAME))
+        for project_id in store.project_ids():
+            remove(path.join(projects_path, str(project_id), PROJECT_METADATA_FILE_NAME_FORMAT.format(project_id)))
+
+    else:
+        database_path = path.join(repository_location, paths['storage'].get('database', DEFAULT_DATABASE_NAME))
+        store = open_store(database_path)
+        for document_id in store.document_ids():
+            write_ini_file(path.join(documents_path, str(document_id),
+                                     DOCUMENT_METADATA_FILE_NAME_FORMAT.format(document_id)),
+                           {'document': store.load_document(document_id)}, atomic = True)
+        if UserManager.configured_storage(paths_file) == USER_SHARDS_STORAGE:
+            shards = ShardedUserStore(path.join(users_path, SHARDS_DIRECTORY_NAME))
+            for user_id in store.user_ids():
+                shards.write(user_id, store.load_user(user_id))
+        else:
+            for user_id in store.user_ids():
+                with open(path.join(users_path, str(user_id)), 'w') as user_file:
+                    user_file.write(''.join(field + '\n' for field in store.load_user(user_id)))
+        for project_id in store.project_ids():
+            write_ini_file(path.join(projects_path, str(project_id), PROJECT_METADATA_FILE_NAME_FORMAT.format(
+                project_id)), {'project': store.load_project(project_id)}, atomic = True)
+        users_roles = store.read_roles()
+        del paths['storage']
+        write_ini_file(paths_file, paths, atomic = True)
+        close_store(database_path)
+        for suffix in ['', '-wal', '-shm']:
+            if path.exists(database_path + suffix):
+                remove(database_path + suffix)
+        RoleManager(repository_location, paths_file).write_roles(
+            dict((user_id, [Role(role) for role in roles]) for user_id, roles in users_roles.iteritems()))
+    module_logger.info("The metadata of the {} repository is migrated to the {} backend.".format(
+        repository_location, backend))
+
+
+if __name__ == '__main__':
+    argument_parser = ArgumentParser(description = 'Migrate the metadata of a repository between the flat file and '
+                                                   'the SQLite storage backend.')
+    argument_parser.add_argument('repository', help = 'the path of the repository')
+    argument_parser.add_argument('backend', choices = [SQLITE_BACKEND, FLAT_FILE_BACKEND], help = 'the new backend')
+    argument_parser.add_argument('--database', default = DEFAULT_DATABASE_NAME,
+                                 help = 'the name of the database file within the repository')
+    arguments = argument_parser.parse_args()
+    migrate(arguments.repository, arguments.backend, arguments.database)
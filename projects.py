@@ -11,7 +11,8 @@ from shutil import rmtree
 
 from iniformat.reader import read_ini_file
 from iniformat.writer import write_ini_file
-from storage_utils import get_next_id
+from metadata_store import current_store
+from storage_utils import get_next_id, batched, ITER_BATCH_SIZE
 
 # Authorship information  -------------------------------------------------------------------------------------------
 __author__ = "Zsolt Bokor Levente"
@@ -221,6 +222,52 @@ class Project(object):
         return is_adminstrator and is_manager
 
 
+class LazyProject(Project):
+    """:py:class:Project view of the project section of the metadata, it's fields are copied from the metadata only when
+    they are read.
+
+    The filter of :py:meth:ProjectManager.iter_projects gets a :py:class:LazyProject, so a :py:class:Project is built
+    only for the accepted projects. The fields are filled in by :py:meth:__getattr__ the first time they are accessed.
+    """
+
+    FIELDS = {'_name': 'name', '_description': 'description', '_members': 'members', '_documents': 'documents'}
+
+    def __init__(self, project_id, properties):
+        """
+        Initialisation of a new :py:class:LazyProject object.
+
+        :param project_id: The ID of the :py:class:Project.
+        :param properties: The project section of the metadata of the :py:class:Project, it's not modified.
+        """
+        self._project_id = project_id
+        self._properties = properties
+
+    @property
+    def project_id(self):
+        """
+        The property of the :py:attr:_project_id attribute.
+
+        :return: The ID of the :py:class:Project.
+        """
+        return self._project_id
+
+    def __getattr__(self, name):
+        """
+        Copies a field of the :py:class:Project from the metadata when it's read for the first time.
+
+        :param name: The name of the attribute.
+        :exception AttributeError is raised if the ``name`` is not a field of the :py:class:Project.
+        :return: The value of the field.
+        """
+        if name not in LazyProject.FIELDS:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        value = self._properties[LazyProject.FIELDS[name]]
+        if name in ['_members', '_documents'] and not value:
+            value = []
+        setattr(self, name, value)
+        return value
+
+
 class ProjectManager(object):
     """
     The :py:class:ProjectManager class of the :py:class:Repository. This class manages the :py:class:Projects.
@@ -228,18 +275,32 @@ class ProjectManager(object):
     The :py:class:ProjectManager is represented by location, :py:class:UserManager and list of :py:class:Project.
     """
 
-    def __init__(self, project_path, user_manager):
+    def __init__(self, project_path, user_manager, metadata_store = None):
         """
         Initialisation of a new :py:class:ProjectManager object.
 
         :param project_path: The path of the :py:class:Project object.
         :param user_manager: The :py:class:UserManager of the :py:class:Repository.
+        :param metadata_store: The :py:class:SQLiteMetadataStore of the :py:class:Repository, by default the store of
+        the ``user_manager`` is used. If there is no store the projects are stored in the flat files.
         """
         self._location = project_path
         self._user_manager = user_manager
+        metadata_store = metadata_store or getattr(user_manager, 'metadata_store', None)
+        self._database_path = metadata_store.database_path if metadata_store else None
         self._projects = []
         self.load()
 
+    @property
+    def metadata_store(self):
+        """
+        The :py:class:SQLiteMetadataStore of the :py:attr:_database_path, it's looked up for every operation (see
+        :py:func:metadata_store.current_store).
+
+        :return: The :py:class:SQLiteMetadataStore of the :py:class:Repository, or None if the flat files are used.
+        """
+        return current_store(self._database_path)
+
     @property
     def location(self):
         """
@@ -311,9 +372,11 @@ class ProjectManager(object):
 
         :return: The list of the available :py:class:Project IDs.
         """
+        if self.metadata_store:
+            return self.metadata_store.project_ids()
         projects = []
         for file_or_folder in listdir(self.location):
-            if path.isdir(file_or_folder):
+            if path.isdir(path.join(self.location, file_or_folder)):
                 try:
                     projects.append(int(file_or_folder))
                 except:
@@ -348,7 +411,10 @@ class ProjectManager(object):
         project_metadata_path = path.join(project_path, PROJECT_METADATA_FILE_NAME_FORMAT.format(next_id))
         if not path.exists(project_path):
             makedirs(project_path)
-        write_ini_file(project_metadata_path, data)
+        if self.metadata_store:
+            self.metadata_store.save_project(next_id, data['project'])
+        else:
+            write_ini_file(project_metadata_path, data, atomic = True)
         return next_id
 
     def add_project(self, project):
@@ -373,14 +439,53 @@ class ProjectManager(object):
         :return: :py:class:Project object loaded from the filesystem.
         """
         project_path = path.join(self.location, str(project_id))
+        if self.metadata_store:
+            project_data = self.metadata_store.load_project(int(project_id))
+            if project_data is None:
+                raise ValueError("The {} path doesn't exists!".format(project_path))
+            return ProjectManager.build_project(project_data)
         if path.exists(project_path):
             project_metadata_path = path.join(project_path, PROJECT_METADATA_FILE_NAME_FORMAT.format(project_id))
-            project_data = read_ini_file(project_metadata_path)['project']
-            return Project(project_data['name'], project_data['description'], project_data['members'],
-                           project_data['documents'])
+            return ProjectManager.build_project(read_ini_file(project_metadata_path)['project'])
         else:
             raise ValueError("The {} path doesn't exists!".format(project_path))
 
+    @classmethod
+    def build_project(cls, project_data):
+        """
+        Builds a :py:class:Project from the project section of it's metadata.
+
+        :param project_data: The project section of the metadata.
+        :return: :py:class:Project object.
+        """
+        return Project(project_data['name'], project_data['description'], project_data['members'],
+                       project_data['documents'])
+
+    def iter_projects(self, filter = None, batch_size = ITER_BATCH_SIZE):
+        """
+        Iterates over the :py:class:Project objects in the order of their IDs, the projects are read in batches of
+        ``batch_size`` projects. The ``filter`` predicate is called with a :py:class:LazyProject, so a
+        :py:class:Project is built only for the accepted projects.
+
+        :param filter: A function which gets a :py:class:Project and returns True if the project is needed, None
+        accepts every project.
+        :param batch_size: The number of projects read at once.
+        :return: A generator of (project ID, :py:class:Project object) tuples.
+        """
+        for batch in batched(sorted(self.load_projects_ids()), batch_size):
+            if self.metadata_store:
+                records = self.metadata_store.load_projects(batch)
+            else:
+                records = []
+                for project_id in batch:
+                    project_metadata_path = path.join(self.location, str(project_id),
+                                                      PROJECT_METADATA_FILE_NAME_FORMAT.format(project_id))
+                    if path.exists(project_metadata_path):
+                        records.append((project_id, read_ini_file(project_metadata_path)['project']))
+            for project_id, project_data in records:
+                if filter is None or filter(LazyProject(project_id, project_data)):
+                    yield project_id, ProjectManager.build_project(project_data)
+
     def find_project_by_id(self, project_id):
         """
         Finds a :py:class:Project by ID if it's available in the filesystem.
@@ -429,6 +534,8 @@ class ProjectManager(object):
         :param project_id: The ID of the :py:class:Project object to delete.
         :return:
         """
+        if self.metadata_store:
+            self.metadata_store.remove_project(int(project_id))
         rmtree(path.join(self.location, str(project_id)))
 
     def remove_project(self, project_id):
@@ -24,17 +24,25 @@ import logging
 import webbrowser
 from datetime import datetime
 from os import makedirs, path, utime, listdir, remove, environ
-from shutil import copytree, rmtree, copy2, make_archive
+from shutil import copytree, copy2
 from warnings import filterwarnings
 from zipfile import ZipFile
 
 import schedule
 from jinja2 import Environment, FileSystemLoader
 
+from archiving import COMPRESSION_LEVEL
+from backup_views import ArchiveReader, SnapshotReader, ArchivedUserManager, ArchivedDocumentManager
+from backups import BackupManifest, clear_restored, create_backup_archive, find_backup_at, restore_backup_archive, \
+    select_paths
 from documents import DocumentManager
-from iniformat.reader import read_ini_file
+from iniformat.cache import cached_read_ini_file
+from iniformat.reader import parse_ini_string
 from iniformat.writer import write_ini_file
-from users import UserManager
+from metadata_store import FLAT_FILE_BACKEND
+from snapshots import SnapshotStore
+from users import UserManager, RoleManager, ROLES_FILE_STORAGE, ROLES_JOURNAL_FILE_NAME, ROLES_JOURNAL_STORAGE, \
+    USER_FILES_STORAGE, USER_SHARDS_STORAGE
 
 # Authorship information  -------------------------------------------------------------------------------------------
 __author__ = "Zsolt Bokor Levente"
@@ -69,13 +77,18 @@ class Repository(object):
     roles file type, :py:class:UserManager object and :py:class:DocumentManagement object.
     """
 
-    def __init__(self, name = 'Repository', location = path.join('Repositories', 'repo_1'), roles_file_type = 'txt'):
+    def __init__(self, name = 'Repository', location = path.join('Repositories', 'repo_1'), roles_file_type = 'txt',
+                 roles_storage = ROLES_FILE_STORAGE, users_storage = USER_FILES_STORAGE):
         """
         Initialisation of a new :py:class:Repository object.
 
         :param name: The name of the :py:class:Repository object, the default value is 'Repository'.
         :param location: The path of the :py:class:Repository object, the default value is 'Repositories/repo_1'.
         :param roles_file_type: The type of roles metadata file, it can be: TXT, XML, JSON.
+        :param roles_storage: The storage of the roles of a new repository, it can be: 'file' (the roles file is
+        rewritten on every change) or 'journal' (the changes are appended to a journal, see :py:class:RoleManager).
+        :param users_storage: The layout of the user files of a new repository, it can be: 'files' (one file per user)
+        or 'sharded' (the users are packed into sharded record files, see :py:mod:user_shards).
         """
         self._name = name
         self._location = location
@@ -85,10 +98,20 @@ class Repository(object):
             self._roles_file_type = roles_file_type.lower()
         else:
             raise ValueError("The roles_file_type must be txt, xml or json, not {}!".format(roles_file_type))
+        if roles_storage in [ROLES_FILE_STORAGE, ROLES_JOURNAL_STORAGE]:
+            self._roles_storage = roles_storage
+        else:
+            raise ValueError("The roles_storage must be {} or {}, not {}!".format(ROLES_FILE_STORAGE,
+                                                                                 ROLES_JOURNAL_STORAGE, roles_storage))
+        if users_storage in [USER_FILES_STORAGE, USER_SHARDS_STORAGE]:
+            self._users_storage = users_storage
+        else:
+            raise ValueError("The users_storage must be {} or {}, not {}!".format(USER_FILES_STORAGE,
+                                                                                 USER_SHARDS_STORAGE, users_storage))
         self.load()
         self._user_manager = UserManager(self._location, self._paths_file)
         self._document_manager = DocumentManager(self._location, self._paths_file)
-        schedule.every(BACKUP_FREQUENCY).days.at('4:00').do(self.create_backup)
+        schedule.every(BACKUP_FREQUENCY).days.at('4:00').do(self.create_backup, incremental = True)
         self.initialize_logger(self.location)
         logger.info("The repository is initialized.")
 
@@ -240,9 +263,9 @@ class Repository(object):
                 if self.is_backup_needed():
                     self._last_backup_date = datetime.utcnow().date()
                     self.create_repo_metadata_file(self._creation_date, self._last_backup_date)
-                    self.create_backup(backup_file_name = self._name)
+                    self.create_backup(backup_file_name = self._name, incremental = True)
 
-                self._name = read_ini_file(self._paths_file)['repository']['name']
+                self._name = cached_read_ini_file(self._paths_file)['repository']['name']
             else:
                 raise ValueError('The repository should be a directory!')
         else:
@@ -286,9 +309,11 @@ class Repository(object):
             'files': {'repo_main_folder': path.basename(self._location),
                       'paths': self._paths_file,
                       'metadata': self._metadata_file},
-            'repository': {'name': self._name}
+            'repository': {'name': self._name},
+            'roles': {'storage': self._roles_storage},
+            'users': {'storage': self._users_storage}
         }
-        write_ini_file(self._paths_file, data)
+        write_ini_file(self._paths_file, data, atomic = True)
         logger.info("The path file is created and the data is written intto it.")
 
     def create_repo_metadata_file(self, date_obj, backup_date_obj):
@@ -314,7 +339,7 @@ class Repository(object):
                 'month': backup_date_obj.month,
                 'day': backup_date_obj.day}
         }
-        write_ini_file(self._metadata_file, data)
+        write_ini_file(self._metadata_file, data, atomic = True)
         logger.info("The repository's metadata file is created and the data is written into it.")
 
     def read_date(self, type_of_date):
@@ -324,9 +349,19 @@ class Repository(object):
         :param type_of_date: 'creation_date' or 'last_backup_date'.
         :return: A datetime.datetime object or a datetime.date object in function of the ``type_of_date``.
         """
-        metadata_data = read_ini_file(self._metadata_file)
+        logger.info("The {} is read form the repository's metadata file.".format(type_of_date.replace('_', ' ')))
+        return Repository.parse_date(cached_read_ini_file(self._metadata_file), type_of_date)
+
+    @classmethod
+    def parse_date(cls, metadata_data, type_of_date):
+        """
+        Parses the creation date or the last backup date of the metadata of a :py:class:Repository.
+
+        :param metadata_data: The content of the metadata file as a dictionary.
+        :param type_of_date: 'creation_date' or 'last_backup_date'.
+        :return: A datetime.datetime object or a datetime.date object in function of the ``type_of_date``.
+        """
         if type_of_date == 'creation_date':
-            logger.info("The creation date is read form the repository's metadata file.")
             return datetime.strptime('{} {} {} {} {} {} {}'.format(
                 metadata_data[type_of_date]['year'],
                 metadata_data[type_of_date]['month'],
@@ -336,7 +371,6 @@ class Repository(object):
                 metadata_data[type_of_date]['second'],
                 metadata_data[type_of_date]['microsecond']), '%Y %m %d %H %M %S %f')
         elif type_of_date == 'last_backup_date':
-            logger.info("The last backup date is read form the repository's metadata file.")
             return datetime.strptime('{:0>4} {} {}'.format(
                 metadata_data[type_of_date]['year'],
                 metadata_data[type_of_date]['month'],
@@ -374,7 +408,7 @@ class Repository(object):
         if path.exists(from_path):
             all_documents = Repository.find_all_documents_in_path(from_path)
             logger.debug("All documents are loaded form the {} path.".format(from_path))
-            metadata_data = read_ini_file(self._paths_file)
+            metadata_data = cached_read_ini_file(self._paths_file)
             logger.debug("The content repositories metadata file is loaded.")
             to_path = path.join(self._location, metadata_data['directories']['documents'])
             if len(all_documents) > 0:
@@ -384,6 +418,7 @@ class Repository(object):
                     copytree(old_path, new_path)
                     logger.info("The {} directory's content is copied to {} path.".format(old_path, new_path))
                     try:
+                        self._document_manager.adopt_document(document_id)
                         document_files_existence = self._document_manager.document_files_exist(document_id,
                                                                                                user_manager = self._user_manager)
                         for file_name_key, exists_value in document_files_existence.iteritems():
@@ -403,7 +438,7 @@ class Repository(object):
                             logger.exception("No author related to document!")
                             raise ValueError("No author related to document!")
                     except Exception as e:
-                        rmtree(new_path)
+                        self._document_manager.remove_document(document_id)
                         logger.exception("An {} exception is raised when importing the document with {} ID.".format(
                             e.__class__.__name__, document_id))
                         raise e
@@ -427,9 +462,14 @@ class Repository(object):
         if not path.exists(path_to):
             makedirs(path_to)
             logger.info("The {} path is created.".format(path_to))
+        documents = []
         for document_id in list_of_documents_id:
-            document = self._document_manager.load_document(document_id)
+            documents.append((document_id, self._document_manager.load_document(document_id)))
             logger.debug("The document with {} ID is loaded into the memory.".format(document_id))
+        authors = self._user_manager.load_users(set(document.author for _, document in documents if
+                                                    document.state == 'accepted' and document.is_public()))
+        logger.debug("The authors of the exported documents are loaded.")
+        for document_id, document in documents:
             if document.state == 'accepted' and document.is_public():
                 logger.debug("The document with {} id is in accepted state and is public.".format(document_id))
                 exported_document_path = path.join(self._document_manager._location, str(document_id))
@@ -439,11 +479,11 @@ class Repository(object):
                         logger.info("The {} ID document's {} file is copied to {}.".format(
                             document_id, path.join(exported_document_path, file_name), path_to))
                 existing_metadata_file = '{}_document_metadata.edd'.format(document_id)
-                remove(path.join(exported_document_path, existing_metadata_file))
-                logger.debug("The {} metadata file is deleted.".format(
-                    path.join(exported_document_path, existing_metadata_file)))
-                user = self._user_manager.find_user_by_id(document.author)
-                logger.debug("The {} ID user (author of the document) is loaded.".format(document.author))
+                if path.exists(path.join(exported_document_path, existing_metadata_file)):
+                    remove(path.join(exported_document_path, existing_metadata_file))
+                    logger.debug("The {} metadata file is deleted.".format(
+                        path.join(exported_document_path, existing_metadata_file)))
+                user = authors[document.author]
                 data = {
                     'document': {
                         'title': document.title,
@@ -466,10 +506,19 @@ class Repository(object):
 
     def create_backup(self, backup_file_name = 'backup', backup_path = './Backups', verbose = False,
                       date_format = '%Y/%m/%d %H:%M:%S', backup_documents = True, backup_logs = True,
-                      backup_projects = True, backup_reports = True, backup_users = True):
+                      backup_projects = True, backup_reports = True, backup_users = True, incremental = False,
+                      include = None, exclude = None, compression_level = COMPRESSION_LEVEL, workers = None,
+                      deduplicated = False):
         """
         Creates a backup of the :py:class:Repository object to the ``backup_path`` with ``backup_file_name``.
 
+        A deduplicated backup is a snapshot in the :py:class:SnapshotStore of the ``backup_path`` instead of an archive,
+        the content which is stored by an earlier snapshot is not stored again.
+
+        The files are written straight from the repository into the archive (see :py:mod:backups), the left out
+        directories are archived as empty directories. An incremental backup archives only the files which are new or
+        changed since the previous backup in the ``backup_path``.
+
         :param backup_file_name: The backup files name of the :py:class:Repository object, the default value is 'backup'.
         :param backup_path: The backup path where the ``backup_file_name`` is saved, the default value is './Backups'
         :param verbose: Bool, if it's True it will print out some information about the backup process, default value
@@ -485,8 +534,26 @@ class Repository(object):
         :py:class:Repository.
         :param backup_users: Bool, determines if to back up the :py:class:User objects of the
         :py:class:Repository.
+        :param incremental: Bool, if it's True only the changes since the previous backup are archived.
+        :param include: A list of patterns of the relative paths of the backed up files (e.g. 'documents/*.pdf'), None
+        backs up every file.
+        :param exclude: A list of patterns of the relative paths of the files and directories which are not backed up.
+        :param compression_level: The zlib compression level from 0 to 9, the files of compressed formats (e.g. JPG,
+        DOCX) are stored without compression anyway.
+        :param workers: The number of the processes compressing the files, None uses a process per CPU.
+        :param deduplicated: Bool, if it's True the backup is a snapshot in the deduplicated store of the
+        ``backup_path``.
+        :exception ValueError is raised if an incremental backup would leave out a part of the repository or if it's
+        deduplicated.
         :return:
         """
+        include = list(include or [])
+        exclude = list(exclude or [])
+        partial = not (backup_documents and backup_logs and backup_projects and backup_reports and backup_users)
+        if incremental and (partial or include or exclude):
+            raise ValueError("An incremental backup must contain the whole repository!")
+        if incremental and deduplicated:
+            raise ValueError("A deduplicated backup can't be incremental, it stores only the new content anyway!")
         start_time = datetime.utcnow()
         logger.info("The backup of the {} repository has started on UTC {}.".format(self._name, start_time.strftime(
             date_format)))
@@ -502,45 +569,27 @@ class Repository(object):
             logger.info("The {} backup path exists.".format(backup_path))
             if verbose:
                 print("The {} backup path exists.".format(backup_path))
-        backup_file_name = self.determine_export_file_name(backup_file_name, backup_path)
-        logger.info("The name of the backup file is: {}.zip.".format(backup_file_name))
-        if verbose:
-            print("The name of the backup file is: {}.zip.".format(backup_file_name))
-        new_location = self._location
-        if not (backup_documents and backup_logs and backup_projects and backup_reports and backup_users):
-            pats_file = read_ini_file(self._paths_file)
-            copytree(new_location, './{}'.format(backup_file_name))
-            logger.debug("The backup file is copied from to {} with {} name.".format(new_location,
-                                                                                     './{}'.format(backup_file_name)))
-            new_location = './{}'.format(backup_file_name)
-            if not backup_documents:
-                rmtree(path.join(self._location, pats_file['directories']['documents']))
-                makedirs(path.join(self._location, pats_file['directories']['documents']))
-                logger.debug("The {} directory is removed.".format(
-                    path.join(self._location, pats_file['directories']['documents'])))
-            if not backup_logs:
-                rmtree(path.join(self._location, pats_file['directories']['logs']))
-                makedirs(path.join(self._location, pats_file['directories']['logs']))
-                logger.debug(
-                    "The {} directory is removed.".format(path.join(self._location, pats_file['directories']['logs'])))
-            if not backup_projects:
-                rmtree(path.join(self._location, pats_file['directories']['projects']))
-                makedirs(path.join(self._location, pats_file['directories']['projects']))
-                logger.debug("The {} directory is removed.".format(
-                    path.join(self._location, pats_file['directories']['projects'])))
-            if not backup_reports:
-                rmtree(path.join(self._location, pats_file['directories']['reports']))
-                makedirs(path.join(self._location, pats_file['directories']['reports']))
-                logger.debug("The {} directory is removed.".format(
-                    path.join(self._location, pats_file['directories']['reports'])))
-            if not backup_users:
-                rmtree(path.join(self._location, pats_file['directories']['users']))
-                makedirs(path.join(self._location, pats_file['directories']['users']))
-                logger.debug(
-                    "The {} directory is removed.".format(path.join(self._location, pats_file['directories']['users'])))
-        make_archive(path.join(backup_path, backup_file_name), 'zip', new_location, verbose = verbose, logger = logger)
-        if new_location == './{}'.format(backup_file_name) and path.exists(new_location):
-            rmtree(new_location)
+        exclude += self.excluded_directories(backup_documents, backup_logs, backup_projects, backup_reports,
+                                             backup_users)
+        if deduplicated:
+            snapshot_store = SnapshotStore(backup_path, compression_level)
+            backup_file_name = snapshot_store.unique_name(backup_file_name)
+            logger.info("The name of the snapshot is: {}.".format(backup_file_name))
+            snapshot = snapshot_store.create_snapshot(self._location, backup_file_name, include, exclude,
+                                                      path.abspath(backup_path))
+            if verbose:
+                print("The {} snapshot contains {} files.".format(backup_file_name, len(snapshot.files)))
+        else:
+            backup_file_name = self.determine_export_file_name(backup_file_name, backup_path)
+            logger.info("The name of the backup file is: {}.zip.".format(backup_file_name))
+            if verbose:
+                print("The name of the backup file is: {}.zip.".format(backup_file_name))
+            manifest = create_backup_archive(self._location, backup_path, backup_file_name, incremental, include,
+                                             exclude, compression_level, workers)
+            if verbose:
+                print("The {} backup archived {} of {} files.".format(manifest.kind, len(manifest.archived),
+                                                                      len(manifest.files)))
+                print("The throughput of the backup was {:.1f} MB/s.".format(manifest.throughput))
         end_time = datetime.utcnow()
         if verbose:
             print("The backup is completed on UTC {}, please check the {} file".format(
@@ -550,6 +599,18 @@ class Repository(object):
             end_time.strftime(date_format), path.join(backup_path, backup_file_name)))
         logger.info("The process lasted {} seconds.".format((end_time - start_time).total_seconds()))
 
+    def excluded_directories(self, backup_documents = True, backup_logs = True, backup_projects = True,
+                             backup_reports = True, backup_users = True):
+        """
+        Determines the directories left out of a backup by the ``backup_*`` flags of :py:meth:create_backup.
+
+        :return: The list of the relative paths of the excluded directories.
+        """
+        directories = cached_read_ini_file(self._paths_file)['directories']
+        flags = [('documents', backup_documents), ('logs', backup_logs), ('projects', backup_projects),
+                 ('reports', backup_reports), ('users', backup_users)]
+        return [directories[name] for name, flag in flags if not flag]
+
     def determine_export_file_name(self, backup_file_name, backup_path):
         """
         Determines based on the :py:meth:create_backup methods ``backup_file_name`` parameter the backup files name.
@@ -582,10 +643,17 @@ class Repository(object):
 
     def restore(self, backup_file_name = 'backup', backup_path = './Backups', verbose = False,
                 date_format = '%Y/%m/%d %H:%M:%S', backup_documents = True, backup_logs = True,
-                backup_projects = True, backup_reports = True, backup_users = True):
+                backup_projects = True, backup_reports = True, backup_users = True, point_in_time = None,
+                document_ids = None, user_ids = None, restore_roles = False):
         """
         Restores a :py:class:Repository object from the filesystem and deletes the old :py:class:Repository object.
 
+        A backup with a manifest is restored from the full backup and the incremental backups of it's chain (see
+        :py:mod:backups), a deduplicated backup is restored from it's snapshot (see :py:mod:snapshots).
+
+        A selective restore (see :py:meth:restored_paths) extracts only the selected parts of the backup and replaces
+        only them, the rest of the repository is kept as it is.
+
         :param backup_file_name: The backup files name of the :py:class:Repository object, the default value is 'backup'.
         :param backup_path: The backup path from where the ``backup_file_name`` will be restored, the default value
         is './Backups'
@@ -600,57 +668,65 @@ class Repository(object):
         :py:class:Repository.
         :param backup_reports: Bool, determines if to restore the :py:class:Report objects of the :py:class:Repository.
         :param backup_users: Bool, determines if to restore the :py:class:User objects of the :py:class:Repository.
-        """
+        :param point_in_time: UTC datetime, if it's given the last backup of the repository created before it is
+        restored instead of the ``backup_file_name``.
+        :param document_ids: A list of the IDs of the :py:class:Document objects to restore.
+        :param user_ids: A list of the IDs of the :py:class:User objects to restore.
+        :param restore_roles: Bool, if it's True the roles file is restored.
+        :exception ValueError is raised if a selected part is not in the backup.
+        """
+        paths = self.restored_paths(backup_documents, backup_logs, backup_projects, backup_reports, backup_users,
+                                    document_ids, user_ids, restore_roles)
+        snapshot_store = SnapshotStore(backup_path)
+        if point_in_time is not None:
+            snapshot = snapshot_store.find_snapshot_at(self.absolute_path(), point_in_time)
+            try:
+                manifest = find_backup_at(backup_path, self.absolute_path(), point_in_time)
+            except ValueError:
+                if snapshot is None:
+                    raise
+                manifest = None
+            if manifest is not None and (snapshot is None or manifest.created >= snapshot.created):
+                snapshot = None
+            else:
+                manifest = None
+            backup_file_name = manifest.name if manifest is not None else snapshot.name
+        else:
+            manifest = BackupManifest.read(backup_path, backup_file_name)
+            snapshot = snapshot_store.read_snapshot(backup_file_name) if manifest is None else None
         start_time = datetime.utcnow()
         logger.info("The restore of the {} repository has started on UTC {}.".format(self._name, start_time.strftime(
             date_format)))
         if verbose:
             print("The restore of the {} repository has started on UTC {}.".format(self._name, start_time.strftime(
                 date_format)))
-        rmtree(self._location)
-        logger.info("The old repository is deleted on {} path.".format(self._location))
-        if verbose:
-            print("The old repository is deleted on {} path.".format(self._location))
-
-        with ZipFile(path.join(backup_path, backup_file_name + '.zip'), "r") as z:
-            z.extractall(self._location)
-
-        if not (backup_documents and backup_logs and backup_projects and backup_reports and backup_users):
-            pats_file = read_ini_file(self._paths_file)
-            unimported = []
-            if not backup_documents:
-                rmtree(path.join(self._location, pats_file['directories']['documents']))
-                makedirs(path.join(self._location, pats_file['directories']['documents']))
-                logger.debug("The {} directory is removed.".format(
-                    path.join(self._location, pats_file['directories']['documents'])))
-                unimported.append('documents')
-            if not backup_logs:
-                rmtree(path.join(self._location, pats_file['directories']['logs']))
-                makedirs(path.join(self._location, pats_file['directories']['logs']))
-                logger.debug("The {} directory is removed.".format(
-                    (path.join(self._location, pats_file['directories']['logs']))))
-                unimported.append('logs')
-            if not backup_projects:
-                rmtree(path.join(self._location, pats_file['directories']['projects']))
-                makedirs(path.join(self._location, pats_file['directories']['projects']))
-                logger.debug("The {} directory is removed.".format(
-                    (path.join(self._location, pats_file['directories']['projects']))))
-                unimported.append('projects')
-            if not backup_reports:
-                rmtree(path.join(self._location, pats_file['directories']['reports']))
-                makedirs(path.join(self._location, pats_file['directories']['reports']))
-                logger.debug("The {} directory is removed.".format(
-                    (path.join(self._location, pats_file['directories']['reports']))))
-                unimported.append('reports')
-            if not backup_users:
-                rmtree(path.join(self._location, pats_file['directories']['users']))
-                makedirs(path.join(self._location, pats_file['directories']['users']))
-                logger.debug("The {} directory is removed.".format(
-                    (path.join(self._location, pats_file['directories']['users']))))
-                unimported.append('users')
-            if len(unimported) > 0:
-                print("The {} were not imported.".format(', '.join(unimported)))
-                logger.debug("The {} were not imported.".format(', '.join(unimported)))
+        if paths is not None:
+            logger.info("The restored parts of the repository: {}.".format(', '.join(paths)))
+            if verbose:
+                print("The restored parts of the repository: {}.".format(', '.join(paths)))
+        if manifest is not None:
+            restore_backup_archive(self._location, backup_path, manifest, paths)
+            logger.info("The {} backup is restored on {} path.".format(backup_file_name, self._location))
+        elif snapshot is not None:
+            snapshot_store.restore_snapshot(snapshot, self._location, paths)
+            logger.info("The {} snapshot is restored on {} path.".format(backup_file_name, self._location))
+        else:
+            with ZipFile(path.join(backup_path, backup_file_name + '.zip'), "r") as z:
+                names = z.namelist()
+                files, directories = select_paths([n for n in names if not n.endswith('/')],
+                                                  [n.rstrip('/') for n in names if n.endswith('/')], paths)
+                clear_restored(self._location, paths)
+                logger.info("The restored parts of the old repository are deleted on {} path.".format(self._location))
+                if verbose:
+                    print("The restored parts of the old repository are deleted on {} path.".format(self._location))
+                z.extractall(self._location, [d + '/' for d in directories] + files)
+
+        if document_ids:
+            self._document_manager.reload_documents(document_ids)
+        if user_ids:
+            self._user_manager.reload_users(user_ids)
+        if restore_roles:
+            self._user_manager.reload_roles()
 
         end_time = datetime.utcnow()
         if verbose:
@@ -661,6 +737,48 @@ class Repository(object):
             end_time.strftime(date_format), self._location))
         logger.info("The process lasted {} seconds.".format((end_time - start_time).total_seconds()))
 
+    def restored_paths(self, backup_documents = True, backup_logs = True, backup_projects = True,
+                       backup_reports = True, backup_users = True, document_ids = None, user_ids = None,
+                       restore_roles = False):
+        """
+        Determines the parts of the repository restored by the parameters of :py:meth:restore. If some of the
+        ``backup_*`` flags are False only the directories of the other flags are restored, the :py:class:Document
+        objects, :py:class:User objects and the roles file are restored in addition to them. If there are no
+        directories left out and no single objects selected, the whole repository is restored.
+
+        :exception ValueError is raised if single :py:class:User objects or the roles file are selected from a
+        repository which stores them in a database or in sharded record files, or if single :py:class:Document objects
+        are selected from a repository which stores their metadata in a database.
+        :return: The list of the relative paths of the restored files and directories, or None if the whole repository
+        is restored.
+        """
+        directories = dict((name, directory.replace(path.sep, '/')) for name, directory in
+                           cached_read_ini_file(self._paths_file)['directories'].iteritems())
+        paths = []
+        if document_ids or user_ids or restore_roles:
+            if self._user_manager.metadata_store:
+                raise ValueError("The metadata of the {} repository is stored in a database, it can be restored only "
+                                 "as a whole!".format(self._name))
+            paths.extend('{}/{}'.format(directories['documents'], document_id) for document_id in document_ids or [])
+            if user_ids and UserManager.configured_storage(self._paths_file) == USER_SHARDS_STORAGE:
+                raise ValueError("The users of the {} repository are stored in sharded record files, the users "
+                                 "directory can be restored only as a whole!".format(self._name))
+            paths.extend('{}/{}'.format(directories['users'], user_id) for user_id in user_ids or [])
+            if restore_roles:
+                users_location = path.join(self._location, directories['users'])
+                roles_file = RoleManager.get_roles_file(users_location) or '{}.{}'.format(ROLES_FILE,
+                                                                                         self._roles_file_type)
+                paths.append('{}/{}'.format(directories['users'], roles_file))
+                if RoleManager.configured_storage(self._paths_file) == ROLES_JOURNAL_STORAGE:
+                    paths.append('{}/{}'.format(directories['users'], ROLES_JOURNAL_FILE_NAME))
+        flags = [('documents', backup_documents), ('logs', backup_logs), ('projects', backup_projects),
+                 ('reports', backup_reports), ('users', backup_users)]
+        if not all(flag for _, flag in flags):
+            paths.extend(directories[name] for name, flag in flags if flag)
+        elif not paths:
+            return None
+        return paths
+
     def show_repository_info(self, name = ''):
         """
         Shows some information about the :py:class:Repository object in an index.html file.
@@ -674,58 +792,72 @@ class Repository(object):
         :py:class:Repository too, and for those this parameter is the name of the backup file.
         :return:
         """
-        paths = read_ini_file(self._paths_file)
-        users = dict()
-        documents = dict()
+        Repository.render_info(self._name, self._creation_date, self._last_backup_date,
+                               cached_read_ini_file(self._paths_file), self._user_manager, self._document_manager, name)
+
+    @classmethod
+    def render_info(cls, repository_name, creation_date, backup_date, paths, user_manager, document_manager,
+                    name = ''):
+        """
+        Renders the information of a :py:class:Repository object or of an :py:class:ArchivedRepository object into an
+        index.html file and opens it in the browser.
+
+        :param repository_name: The name of the repository.
+        :param creation_date: The creation date of the repository.
+        :param backup_date: The last backup date of the repository.
+        :param paths: The content of the paths file of the repository.
+        :param user_manager: The :py:class:UserManager or :py:class:ArchivedUserManager of the repository.
+        :param document_manager: The :py:class:DocumentManager or :py:class:ArchivedDocumentManager of the repository.
+        :param name: The name of the backup file, the HTML file is index_[name].html.
+        :return:
+        """
         roles = dict()
 
-        for user_id in self._user_manager.find_all_users():
-            users[user_id] = self._user_manager.load_user(user_id)
-        for document_id in self._document_manager.find_all_documents():
-            documents[document_id] = self._document_manager.load_document(document_id, self._user_manager)
-        for role_key, user_ids_value in self._user_manager.list_users_by_role().iteritems():
+        for role_key, user_ids_value in user_manager.list_users_by_role().iteritems():
             roles[role_key] = ', '.join([str(i) for i in user_ids_value])
         abs_path = path.dirname(path.abspath(__file__))
-        logger.info("All data is collected to show in HTML.")
         env = Environment(loader = FileSystemLoader(path.join(abs_path, 'templates')))
         template = env.get_template('rep_info.html')
-        output_from_parsed_template = template.render(repository_name = self._name, creation_date = self._creation_date,
-                                                      backup_date = self._last_backup_date, paths = paths,
-                                                      users = users, roles = roles, documents = documents)
-        logger.info("The template is rendered.")
+        output_stream = template.stream(repository_name = repository_name, creation_date = creation_date,
+                                        backup_date = backup_date, paths = paths,
+                                        user_count = user_manager.count_users(),
+                                        users = user_manager.iter_users(), roles = roles,
+                                        document_count = document_manager.count_documents(),
+                                        documents = document_manager.iter_documents(user_manager = user_manager))
         with open(path.join(abs_path, "index{}.html".format('_' + name)), "wb") as fh:
-            fh.write(output_from_parsed_template)
-        logger.info("The template is written to {} file.".format("index{}.html".format('_' + name)))
+            output_stream.dump(fh, encoding = 'utf-8')
+        logger.info("The template is rendered and written to {} file.".format("index{}.html".format('_' + name)))
         webbrowser.open(path.join(abs_path, "index{}.html".format('_' + name)))
         logger.info("The {} file is opened in the browser.".format("index{}.html".format('_' + name)))
 
     def show_backup_info(self, backup_file):
         """
         It will print into an HTML file the information of a backed up :py:class:Repository object with the help of the
-        :py:meth:show_repository_info method.
+        :py:meth:render_info method.
 
         The HTML file will be like: index_[name_of_the_backup_file].HTML.
 
-        :param backup_file: The backed up :py:class:Repository file, path and file name.
+        The information is read from the backup by an :py:class:ArchivedRepository, nothing is extracted.
+
+        :param backup_file: The backed up :py:class:Repository file, path and file name, or the path of a snapshot (the
+        path of the deduplicated store and the name of the snapshot).
+        :exception TypeError is raised if the backup doesn't exists.
         :return:
         """
         if '.zip' not in backup_file:
             full_backup_file = backup_file + '.zip'
         else:
             full_backup_file = backup_file
-        if path.exists(full_backup_file):
-            abs_path = path.dirname(path.abspath(__file__))
-            tmp_location = abs_path + '/tmp/tmp_repository'
-            with ZipFile(full_backup_file, "r") as z:
-                z.extractall(tmp_location)
-            logger.debug("The temporary repository is extracted.")
-            tmp_repo = Repository(location = tmp_location)
-            tmp_repo.show_repository_info(name = path.basename(backup_file))
-            rmtree(tmp_location)
-            logger.debug("The temporary repository is deleted.")
-        else:
+        backup_path, name = path.dirname(full_backup_file), path.basename(full_backup_file)[:-len('.zip')]
+        if not path.exists(full_backup_file) and not SnapshotStore(backup_path).has_snapshot(name):
             logger.exception("The {} backup doesn't exists!".format(full_backup_file))
             raise TypeError("The {} backup doesn't exists!".format(full_backup_file))
+        with ArchivedRepository(backup_path, name) as archived_repository:
+            logger.debug("The {} backup is opened.".format(full_backup_file))
+            Repository.render_info(archived_repository.name, archived_repository.creation_date,
+                                   archived_repository.last_backup_date, archived_repository.paths,
+                                   archived_repository.user_manager, archived_repository.document_manager,
+                                   path.basename(backup_file))
 
     def is_backup_needed(self):
         """
@@ -760,3 +892,101 @@ class Repository(object):
         logger.addHandler(debug_file_logger)
         logger.addHandler(info_file_logger)
         logger.addHandler(console_logger)
+
+
+class ArchivedRepository(object):
+    """Read-only view of a backed up :py:class:Repository.
+
+    The :py:class:ArchivedRepository is defined by the backup directory and the name of a backup archive or of a
+    snapshot of the deduplicated store. The paths file, the metadata file, the users, the roles and the metadata of the
+    documents are read straight from the backup (see :py:mod:backup_views), nothing is extracted and the backed up
+    repository is not loaded, so no backup is triggered.
+    """
+
+    def __init__(self, backup_path, name):
+        """
+        Initialisation of a new :py:class:ArchivedRepository object.
+
+        :param backup_path: The directory of the backup.
+        :param name: The name of the backup archive without the .zip extension, or the name of a snapshot.
+        :exception ValueError is raised if there is no such backup, or if the metadata of the backed up repository is
+        stored in a database.
+        """
+        snapshot_store = SnapshotStore(backup_path)
+        if path.exists(path.join(backup_path, name + '.zip')):
+            self._reader = ArchiveReader(backup_path, name)
+        elif snapshot_store.has_snapshot(name):
+            self._reader = SnapshotReader(snapshot_store, snapshot_store.read_snapshot(name))
+        else:
+            raise ValueError("The {} backup doesn't exists in {}!".format(name, backup_path))
+        try:
+            self._paths = parse_ini_string(self._reader.read(PATHS_FILE))
+            if self._paths.get('storage', {}).get('backend', FLAT_FILE_BACKEND) != FLAT_FILE_BACKEND:
+                raise ValueError("The metadata of the {} backup is stored in a database!".format(name))
+            metadata_data = parse_ini_string(self._reader.read(path.basename(self._paths['files']['metadata'])))
+            directories = dict((key, directory.replace(path.sep, '/')) for key, directory in
+                               self._paths['directories'].iteritems())
+            self._user_manager = ArchivedUserManager(self._reader, directories['users'])
+            self._document_manager = ArchivedDocumentManager(self._reader, directories['documents'])
+        except Exception:
+            self._reader.close()
+            raise
+        self._name = self._paths['repository']['name']
+        self._creation_date = Repository.parse_date(metadata_data, 'creation_date')
+        self._last_backup_date = Repository.parse_date(metadata_data, 'last_backup_date')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def name(self):
+        """
+        :return: The name of the backed up :py:class:Repository.
+        """
+        return self._name
+
+    @property
+    def creation_date(self):
+        """
+        :return: The creation date of the backed up :py:class:Repository.
+        """
+        return self._creation_date
+
+    @property
+    def last_backup_date(self):
+        """
+        :return: The last backup date of the backed up :py:class:Repository.
+        """
+        return self._last_backup_date
+
+    @property
+    def paths(self):
+        """
+        :return: The content of the paths file of the backed up :py:class:Repository.
+        """
+        return self._paths
+
+    @property
+    def user_manager(self):
+        """
+        :return: The :py:class:ArchivedUserManager of the backup.
+        """
+        return self._user_manager
+
+    @property
+    def document_manager(self):
+        """
+        :return: The :py:class:ArchivedDocumentManager of the backup.
+        """
+        return self._document_manager
+
+    def close(self):
+        """
+        Closes the archives of the backup.
+
+        :return:
+        """
+        self._reader.close()
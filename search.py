@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+"""Full-text search of the :py:class:Document objects of a :py:class:Repository.
+
+The title, the description and the content of the text files of the documents are indexed in an SQLite FTS5 inverted
+index, stored in the :py:const:SEARCH_INDEX_FILE_NAME file of the :py:const:SEARCH_INDEX_DIRECTORY_NAME directory
+of the documents directory. The database (and it's WAL files) is kept out of the documents directory itself, so writing
+it doesn't change the modification time which the catalog of the documents is refreshed by. The index is updated by the
+:py:class:DocumentManager every time a document is saved or removed, the documents added by other processes are indexed
+before the next search. The hits are ranked with BM25, the matches in the title weigh more than the matches in the
+description, and those weigh more than the matches in the files.
+"""
+
+# Imports -----------------------------------------------------------------------------------------------------------
+import logging
+import re
+import sqlite3
+from collections import namedtuple
+from os import path, listdir, makedirs
+from threading import RLock
+
+# Authorship information  -------------------------------------------------------------------------------------------
+__author__ = "Zsolt Bokor Levente"
+__copyright__ = "Copyright 2016, Morgan Stanley - Training 360 Project"
+__credits__ = __author__
+__version__ = "1.0.0"
+__maintainer__ = __author__
+__email__ = ["bokor.zsolt5@gmail.com", "bokorzsolt@yahoo.com"]
+__status__ = "Development"
+
+# -------------------------------------------------------------------------------------------------------------------
+
+SEARCH_INDEX_DIRECTORY_NAME = '.search'
+SEARCH_INDEX_FILE_NAME = 'search_index.db'
+TEXT_FILE_EXTENSIONS = ['txt', 'text', 'md', 'rst', 'csv', 'html', 'htm', 'xml', 'json', 'ini', 'log', 'tex']
+MARKUP_FILE_EXTENSIONS = ['html', 'htm', 'xml']
+MAX_INDEXED_FILE_SIZE = 1024 * 1024
+DEFAULT_PAGE_SIZE = 10
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 5.0
+CONTENT_WEIGHT = 1.0
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS document_text USING fts5 (
+    title, description, content, tokenize = 'unicode61 remove_diacritics 1'
+);
+"""
+module_logger = logging.getLogger('repository.search')
+
+SearchHit = namedtuple('SearchHit', ['document_id', 'score', 'snippet'])
+
+
+class SearchPage(object):
+    """One page of the hits of a full-text search.
+
+    The :py:class:SearchPage is defined by the list of :py:class:SearchHit tuples on the page, the number of the page,
+    the size of the pages and the total number of hits.
+    """
+
+    def __init__(self, hits, page, page_size, total):
+        """
+        Initialisation of a new :py:class:SearchPage object.
+
+        :param hits: The list of :py:class:SearchHit tuples of the page, the best hit is the first.
+        :param page: The number of the page, the first page is 1.
+        :param page_size: The maximal number of hits on a page.
+        :param total: The total number of hits of the search.
+        """
+        self._hits = hits
+        self._page = page
+        self._page_size = page_size
+        self._total = total
+
+    @property
+    def hits(self):
+        """
+        The property of the :py:attr:_hits attribute.
+
+        :return: The list of :py:class:SearchHit tuples of the page.
+        """
+        return self._hits
+
+    @property
+    def document_ids(self):
+        """
+        The IDs of the :py:class:Document objects on the page.
+
+        :return: A list of :py:class:Document IDs, the best hit is the first.
+        """
+        return [hit.document_id for hit in self._hits]
+
+    @property
+    def page(self):
+        """
+        The property of the :py:attr:_page attribute.
+
+        :return: The number of the page.
+        """
+        return self._page
+
+    @property
+    def page_size(self):
+        """
+        The property of the :py:attr:_page_size attribute.
+
+        :return: The maximal number of hits on a page.
+        """
+        return self._page_size
+
+    @property
+    def total(self):
+        """
+        The property of the :py:attr:_total attribute.
+
+        :return: The total number of hits.
+        """
+        return self._total
+
+    @property
+    def pages(self):
+        """
+        The number of pages of the search.
+
+        :return: Integer.
+        """
+        return (self._total + self._page_size - 1) // self._page_size
+
+    def has_next(self):
+        """
+        Determines if there is a page after this page.
+
+        :return: Bool, TRUE if there are more hits.
+        """
+        return self._page < self.pages
+
+
+class DocumentSearchIndex(object):
+    """Full-text index of the :py:class:Document objects of a :py:class:DocumentManager.
+
+    The :py:class:DocumentSearchIndex is defined by the documents directory and the catalog of the documents. The
+    database is opened on the first use.
+    """
+
+    def __init__(self, location, catalog):
+        """
+        Initialisation of a new :py:class:DocumentSearchIndex object.
+
+        :param location: The path of the documents directory of the :py:class:Repository.
+        :param catalog: The catalog of the :py:class:DocumentManager, it provides the IDs and the metadata of the
+        documents.
+        """
+        self._location = location
+        self._catalog = catalog
+        self._lock = RLock()
+        self._connection = None
+        self._indexed_ids = None
+
+    @classmethod
+    def to_unicode(cls, text):
+        """
+        Converts a text to unicode, the invalid UTF-8 sequences are replaced.
+
+        :param text: A str or unicode.
+        :return: Unicode.
+        """
+        if isinstance(text, str):
+            return text.decode('utf-8', 'replace')
+        return unicode(text)
+
+    @classmethod
+    def match_expression(cls, query):
+        """
+        Converts a keyword query to an FTS5 match expression, every keyword must match. The keywords are quoted, so
+        the characters of the FTS5 query syntax are searched for literally.
+
+        :param query: The keywords separated by whitespaces.
+        :return: The match expression, or None if the ``query`` contains no keyword.
+        """
+        keywords = re.findall(r'\w+', DocumentSearchIndex.to_unicode(query), re.UNICODE)
+        if not keywords:
+            return None
+        return u' '.join(u'"{}"'.format(keyword) for keyword in keywords)
+
+    @classmethod
+    def file_text(cls, file_path):
+        """
+        Reads the indexed text of a file. Only the text files are indexed (see :py:const:TEXT_FILE_EXTENSIONS) up to
+        :py:const:MAX_INDEXED_FILE_SIZE bytes, the tags of the markup files are dropped.
+
+        :param file_path: The path of the file.
+        :return: Unicode text, empty if the file is not a text file or it can't be read.
+        """
+        extension = file_path.rsplit('.', 1)[-1].lower() if '.' in path.basename(file_path) else ''
+        if extension not in TEXT_FILE_EXTENSIONS:
+            return u''
+        try:
+            with open(file_path, 'rb') as file_obj:
+                text = DocumentSearchIndex.to_unicode(file_obj.read(MAX_INDEXED_FILE_SIZE))
+        except IOError as e:
+            module_logger.warning("The {} file can't be indexed: {}".format(file_path, e))
+            return u''
+        if extension in MARKUP_FILE_EXTENSIONS:
+            text = re.sub(r'<[^>]*>', u' ', text)
+        return text
+
+    def _connect(self):
+        """
+        Opens the database of the index if it's not opened yet, and loads the IDs of the indexed documents.
+
+        :return: The connection of the database.
+        """
+        if self._connection is None:
+            database_directory = path.join(self._location, SEARCH_INDEX_DIRECTORY_NAME)
+            if not path.isdir(database_directory):
+                try:
+                    makedirs(database_directory)
+                except OSError:
+                    # The directory may be created by another process in between.
+                    if not path.isdir(database_directory):
+                        raise
+            connection = sqlite3.connect(path.join(database_directory, SEARCH_INDEX_FILE_NAME),
+                                         check_same_thread = False, isolation_level = None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._indexed_ids = set(row[0] for row in connection.execute('SELECT rowid FROM document_text'))
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        """
+        Closes the database of the index.
+
+        :return:
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _document_row(self, document_id, properties, document_folder):
+        """
+        Collects the indexed text of a :py:class:Document.
+
+        :param document_id: The ID of the :py:class:Document.
+        :param properties: The document section of the metadata of the :py:class:Document.
+        :param document_folder: The directory of the :py:class:Document.
+        :return: A tuple of the ID, the title, the description and the content of the files.
+        """
+        contents = []
+        if path.isdir(document_folder):
+            for file_name in sorted(listdir(document_folder)):
+                if file_name.endswith('.edd'):
+                    continue
+                text = DocumentSearchIndex.file_text(path.join(document_folder, file_name))
+                if text:
+                    contents.append(text)
+        return (int(document_id), DocumentSearchIndex.to_unicode(properties.get('title', '')),
+                DocumentSearchIndex.to_unicode(properties.get('description', '')), u'\n'.join(contents))
+
+    def add(self, document_id, properties, document_folder = None):
+        """
+        Indexes a saved :py:class:Document, the previous entry of the document is replaced.
+
+        :param document_id: The ID of the :py:class:Document.
+        :param properties: The document section of the metadata of the :py:class:Document.
+        :param document_folder: The directory of the :py:class:Document, by default the directory in the documents
+        directory.
+        :return:
+        """
+        self.add_many([(document_id, properties)], {document_id: document_folder} if document_folder else None)
+
+    def add_many(self, documents, document_folders = None):
+        """
+        Indexes many saved :py:class:Document objects in one transaction.
+
+        :param documents: List of (document ID, document section of the metadata) tuples.
+        :param document_folders: A dictionary of the directories of the documents which are not in the documents
+        directory.
+        :return:
+        """
+        document_folders = document_folders or dict()
+        rows = [self._document_row(document_id, properties, document_folders.get(
+            document_id, path.join(self._location, str(document_id)))) for document_id, properties in documents]
+        if not rows:
+            return
+        with self._lock:
+            connection = self._connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.executemany('DELETE FROM document_text WHERE rowid = ?', [(row[0],) for row in rows])
+                connection.executemany('INSERT INTO document_text (rowid, title, description, content) '
+                                       'VALUES (?, ?, ?, ?)', rows)
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+            self._indexed_ids.update(row[0] for row in rows)
+
+    def discard(self, document_id):
+        """
+        Removes a :py:class:Document from the index.
+
+        :param document_id: The ID of the removed :py:class:Document.
+        :return:
+        """
+        with self._lock:
+            self._connect().execute('DELETE FROM document_text WHERE rowid = ?', (int(document_id),))
+            self._indexed_ids.discard(int(document_id))
+
+    def synchronize(self):
+        """
+        Indexes the :py:class:Document objects of the catalog which are not indexed yet, and removes the documents
+        which are not in the catalog any more.
+
+        :return:
+        """
+        with self._lock:
+            self._connect()
+            available_ids = set(self._catalog.ids())
+            for document_id in self._indexed_ids - available_ids:
+                self.discard(document_id)
+            documents = []
+            for document_id in sorted(available_ids - self._indexed_ids):
+                try:
+                    documents.append((document_id, self._catalog.metadata(document_id)['document']))
+                except (IOError, KeyError):
+                    pass
+            self.add_many(documents)
+
+    def rebuild(self):
+        """
+        Rebuilds the index from the metadata and the files of all the :py:class:Document objects.
+
+        :return:
+        """
+        with self._lock:
+            self._connect().execute('DELETE FROM document_text')
+            self._indexed_ids = set()
+            self.synchronize()
+            module_logger.info("The search index of {} is rebuilt.".format(self._location))
+
+    def search(self, query, page = 1, page_size = DEFAULT_PAGE_SIZE):
+        """
+        Searches for the :py:class:Document objects which contain all the keywords of the ``query`` in the title, the
+        description or the text files. The keywords are case and accent insensitive.
+
+        :param query: The keywords separated by whitespaces.
+        :param page: The number of the requested page, the first page is 1.
+        :param page_size: The maximal number of hits on a page.
+        :exception ValueError is raised if the ``page`` or the ``page_size`` is not positive.
+        :return: :py:class:SearchPage object, the hits are ordered by the BM25 rank.
+        """
+        if page < 1 or page_size < 1:
+            raise ValueError("The page and the page size must be positive, not {} and {}!".format(page, page_size))
+        expression = DocumentSearchIndex.match_expression(query)
+        if expression is None:
+            return SearchPage([], page, page_size, 0)
+        with self._lock:
+            self.synchronize()
+            connection = self._connect()
+            total = connection.execute('SELECT count(*) FROM document_text WHERE document_text MATCH ?',
+                                       (expression,)).fetchone()[0]
+            rows = connection.execute(
+                "SELECT rowid, bm25(document_text, ?, ?, ?) AS rank, snippet(document_text, -1, '[', ']', '...', 12) "
+                "FROM document_text WHERE document_text MATCH ? ORDER BY rank, rowid LIMIT ? OFFSET ?",
+                (TITLE_WEIGHT, DESCRIPTION_WEIGHT, CONTENT_WEIGHT, expression, page_size,
+                 (page - 1) * page_size)).fetchall()
+        return SearchPage([SearchHit(document_id, -rank, snippet) for document_id, rank, snippet in rows], page,
+                          page_size, total)
@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+"""Deduplicated backup store
+
+A :py:class:SnapshotStore keeps the backups of repositories as snapshots of content-addressed chunks, so the content
+which is the same in many backups (or in many files) is stored once. The store is a directory:
+
+    chunks/<xx>/<digest>   - the chunks of the files, named by the SHA-1 digest of their content, the first two
+                             characters of the digest are the name of the subdirectory
+    snapshots/<name>.json  - the snapshot manifests: the size, modification time and chunk digests of every file and
+                             the list of the directories of the repository at the time of the backup
+    .lock                  - the lock file of the writers
+
+The files are cut into fixed size chunks of :py:const:CHUNK_SIZE bytes. A chunk file starts with a byte which tells if
+the content is compressed by zlib ('Z') or stored ('S', the chunks of already compressed formats). The chunks of a
+file whose size and modification time are the same as in the previous snapshot of the repository are not read again.
+A snapshot manifest is written after it's chunks, the chunks which are not referenced by any snapshot (e.g. after an
+interrupted backup or after a snapshot is removed) are deleted by :py:meth:SnapshotStore.collect_garbage.
+"""
+
+# Imports -----------------------------------------------------------------------------------------------------------
+import hashlib
+import logging
+import os
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from json import dumps, loads
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from archiving import is_compressed, COMPRESSION_LEVEL
+from backups import clear_restored, is_unchanged, select_paths, walk_repository, DATE_FORMAT
+from iniformat.writer import write_atomically
+
+# Authorship information  -------------------------------------------------------------------------------------------
+__author__ = "Zsolt Bokor Levente"
+__copyright__ = "Copyright 2016, Morgan Stanley - Training 360 Project"
+__credits__ = __author__
+__version__ = "1.0.0"
+__maintainer__ = __author__
+__email__ = ["bokor.zsolt5@gmail.com", "bokorzsolt@yahoo.com"]
+__status__ = "Development"
+
+# -------------------------------------------------------------------------------------------------------------------
+
+CHUNK_SIZE = 4 * 1024 * 1024
+CHUNKS_DIRECTORY_NAME = 'chunks'
+SNAPSHOTS_DIRECTORY_NAME = 'snapshots'
+SNAPSHOT_SUFFIX = '.json'
+LOCK_FILE_NAME = '.lock'
+COMPRESSED_CHUNK = 'Z'
+STORED_CHUNK = 'S'
+module_logger = logging.getLogger('repository.snapshots')
+
+
+class CorruptSnapshotError(Exception):
+    """
+    This exception is raised when a chunk of a snapshot is missing or it's content doesn't match it's digest.
+    """
+    pass
+
+
+class Snapshot(object):
+    """The manifest of a backup in a :py:class:SnapshotStore.
+
+    The :py:class:Snapshot is defined by it's name, the creation time, the location of the backed up repository, the
+    (size, modification time, chunk digests) tuples of the files keyed by relative path and the list of the relative
+    paths of the directories.
+    """
+
+    def __init__(self, name, created, repository, files, directories):
+        """
+        Initialisation of a new :py:class:Snapshot object.
+
+        :param name: The name of the snapshot.
+        :param created: The UTC datetime of the backup.
+        :param repository: The absolute path of the backed up repository.
+        :param files: A dictionary of (size, modification time, list of chunk digests) tuples keyed by relative path.
+        :param directories: The list of the relative paths of the directories.
+        """
+        self.name = name
+        self.created = created
+        self.repository = repository
+        self.files = files
+        self.directories = directories
+
+    def to_json(self):
+        """
+        :return: The JSON representation of the snapshot.
+        """
+        return dumps({'name': self.name, 'created': self.created.strftime(DATE_FORMAT), 'repository': self.repository,
+                      'files': dict((p, list(entry)) for p, entry in self.files.iteritems()),
+                      'directories': self.directories}, sort_keys = True)
+
+    @classmethod
+    def from_json(cls, content):
+        """
+        Parses a snapshot manifest.
+
+        :param content: The JSON representation of the snapshot.
+        :return: :py:class:Snapshot object.
+        """
+        data = loads(content)
+        return cls(data['name'], datetime.strptime(data['created'], DATE_FORMAT), data['repository'],
+                   dict((p, tuple(entry)) for p, entry in data['files'].iteritems()), data['directories'])
+
+    def chunks(self):
+        """
+        :return: The set of the digests of the chunks referenced by the snapshot.
+        """
+        return set(digest for entry in self.files.itervalues() for digest in entry[2])
+
+
+class SnapshotStore(object):
+    """Content-addressed store of the backup snapshots of repositories.
+
+    The :py:class:SnapshotStore is defined by the :py:attr:location of the store directory, see :py:mod:snapshots.
+    """
+
+    def __init__(self, location, compression_level = COMPRESSION_LEVEL):
+        """
+        Initialisation of a new :py:class:SnapshotStore object, the directories are created by the first backup.
+
+        :param location: The path of the store directory.
+        :param compression_level: The zlib compression level of the new chunks.
+        """
+        self._location = location
+        self._compression_level = compression_level
+
+    @property
+    def location(self):
+        """
+        The property of the :py:attr:_location attribute.
+
+        :return: The path of the store directory.
+        """
+        return self._location
+
+    @contextmanager
+    def _locked(self):
+        """
+        Holds the lock of the writers of the store, so the garbage collection doesn't delete the chunks of a snapshot
+        which is being written.
+
+        :return:
+        """
+        if not os.path.isdir(self._location):
+            os.makedirs(self._location)
+        with open(os.path.join(self._location, LOCK_FILE_NAME), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def chunk_file(self, digest):
+        """
+        :param digest: The SHA-1 digest of a chunk.
+        :return: The path of the chunk file.
+        """
+        return os.path.join(self._location, CHUNKS_DIRECTORY_NAME, digest[:2], digest)
+
+    def snapshot_file(self, name):
+        """
+        :param name: The name of a snapshot.
+        :return: The path of the snapshot manifest.
+        """
+        return os.path.join(self._location, SNAPSHOTS_DIRECTORY_NAME, name + SNAPSHOT_SUFFIX)
+
+    def has_snapshot(self, name):
+        """
+        :param name: The name of a snapshot.
+        :return: Bool, TRUE if the snapshot exists.
+        """
+        return os.path.exists(self.snapshot_file(name))
+
+    def read_snapshot(self, name):
+        """
+        Reads a snapshot manifest.
+
+        :param name: The name of the snapshot.
+        :return: :py:class:Snapshot object, or None if there is no such snapshot.
+        """
+        try:
+            with open(self.snapshot_file(name)) as json_file:
+                return Snapshot.from_json(json_file.read())
+        except IOError:
+            return None
+
+    def list_snapshots(self, repository = None):
+        """
+        Reads the snapshots of the store.
+
+        :param repository: The absolute path of a repository, only it's snapshots are listed, None lists every snapshot.
+        :return: The list of the :py:class:Snapshot objects ordered by creation time.
+        """
+        snapshots = []
+        directory = os.path.join(self._location, SNAPSHOTS_DIRECTORY_NAME)
+        if os.path.isdir(directory):
+            for file_name in os.listdir(directory):
+                if file_name.endswith(SNAPSHOT_SUFFIX):
+                    snapshot = self.read_snapshot(file_name[:-len(SNAPSHOT_SUFFIX)])
+                    if snapshot is not None and (repository is None or snapshot.repository == repository):
+                        snapshots.append(snapshot)
+        return sorted(snapshots, key = lambda s: s.created)
+
+    def find_snapshot_at(self, repository, point_in_time):
+        """
+        Finds the last snapshot of a repository which was created before a point in time.
+
+        :param repository: The absolute path of the repository.
+        :param point_in_time: UTC datetime.
+        :return: :py:class:Snapshot object, or None if there is no snapshot before the ``point_in_time``.
+        """
+        snapshots = [s for s in self.list_snapshots(repository) if s.created <= point_in_time]
+        return snapshots[-1] if snapshots else None
+
+    def unique_name(self, name):
+        """
+        :param name: The requested name of a snapshot.
+        :return: The ``name`` if there is no such snapshot, otherwise the ``name`` with the first free '_<number>'
+        suffix.
+        """
+        unique_name = name
+        number = 1
+        while self.has_snapshot(unique_name):
+            unique_name = '{}_{}'.format(name, number)
+            number += 1
+        return unique_name
+
+    def _write_chunk(self, data, stored):
+        """
+        Stores a chunk if it's not stored yet.
+
+        :param data: The content of the chunk.
+        :param stored: Bool, TRUE stores the content without compression.
+        :return: A tuple of the digest of the chunk and the number of the written bytes (0 if it was stored already).
+        """
+        digest = hashlib.sha1(data).hexdigest()
+        chunk_file = self.chunk_file(digest)
+        if os.path.exists(chunk_file):
+            return digest, 0
+        if stored or self._compression_level == 0:
+            content = STORED_CHUNK + data
+        else:
+            content = COMPRESSED_CHUNK + zlib.compress(data, self._compression_level)
+        if not os.path.isdir(os.path.dirname(chunk_file)):
+            os.makedirs(os.path.dirname(chunk_file))
+        temporary_file = chunk_file + '.tmp'
+        with open(temporary_file, 'wb') as new_chunk_file:
+            new_chunk_file.write(content)
+        os.rename(temporary_file, chunk_file)
+        return digest, len(content)
+
+    def read_chunk(self, digest):
+        """
+        Reads a chunk and checks it's digest.
+
+        :param digest: The SHA-1 digest of the chunk.
+        :exception CorruptSnapshotError is raised if the chunk is missing or it's content doesn't match the digest.
+        :return: The content of the chunk.
+        """
+        try:
+            with open(self.chunk_file(digest), 'rb') as chunk_file:
+                content = chunk_file.read()
+        except IOError:
+            raise CorruptSnapshotError("The {} chunk is missing!".format(digest))
+        try:
+            data = zlib.decompress(content[1:]) if content[:1] == COMPRESSED_CHUNK else content[1:]
+        except zlib.error:
+            raise CorruptSnapshotError("The {} chunk is corrupt!".format(digest))
+        if content[:1] not in [COMPRESSED_CHUNK, STORED_CHUNK] or hashlib.sha1(data).hexdigest() != digest:
+            raise CorruptSnapshotError("The {} chunk is corrupt!".format(digest))
+        return data
+
+    def _store_file(self, file_path, relative_path):
+        """
+        Cuts a file into chunks and stores the new chunks.
+
+        :param file_path: The path of the file.
+        :param relative_path: The path of the file relative to the repository.
+        :return: A tuple of the list of the chunk digests and the number of the written bytes.
+        """
+        digests = []
+        written = 0
+        with open(file_path, 'rb') as data_file:
+            for data in iter(lambda: data_file.read(CHUNK_SIZE), ''):
+                digest, size = self._write_chunk(data, is_compressed(relative_path))
+                digests.append(digest)
+                written += size
+        return digests, written
+
+    def create_snapshot(self, location, name, include = None, exclude = None, excluded = None):
+        """
+        Backs up a repository to a new snapshot. Only the new chunks are written, the files whose size and
+        modification time are the same as in the previous snapshot of the repository are not read.
+
+        :param location: The path of the repository.
+        :param name: The name of the snapshot, it must be unique in the store (see :py:meth:unique_name).
+        :param include: A list of patterns of the backed up files, see :py:func:backups.is_excluded.
+        :param exclude: A list of patterns of the files and directories which are not backed up.
+        :param excluded: The absolute path of a directory which is not scanned (e.g. the store), or None.
+        :exception ValueError is raised if the snapshot exists.
+        :return: :py:class:Snapshot object.
+        """
+        repository = os.path.abspath(location)
+        with self._locked():
+            if self.has_snapshot(name):
+                raise ValueError("The {} snapshot already exists!".format(name))
+            previous_snapshots = self.list_snapshots(repository)
+            previous_files = previous_snapshots[-1].files if previous_snapshots else dict()
+            files = dict()
+            directories = []
+            read_bytes = 0
+            written_bytes = 0
+            for file_path, relative_path in walk_repository(location, directories, excluded, include, exclude):
+                try:
+                    stat = os.stat(file_path)
+                    entry = previous_files.get(relative_path)
+                    if not is_unchanged(entry, stat):
+                        digests, written = self._store_file(file_path, relative_path)
+                        entry = (stat.st_size, stat.st_mtime, digests)
+                        read_bytes += stat.st_size
+                        written_bytes += written
+                except (IOError, OSError):
+                    module_logger.warning("The {} file is deleted during the backup.".format(relative_path))
+                    continue
+                files[relative_path] = entry
+            snapshot = Snapshot(name, datetime.utcnow(), repository, files, sorted(directories))
+            snapshot_file = self.snapshot_file(name)
+            if not os.path.isdir(os.path.dirname(snapshot_file)):
+                os.makedirs(os.path.dirname(snapshot_file))
+            write_atomically(snapshot_file, snapshot.to_json())
+        module_logger.info("The {} snapshot of {} is created: {} files, {} bytes read, {} bytes written.".format(
+            name, repository, len(files), read_bytes, written_bytes))
+        return snapshot
+
+    def restore_snapshot(self, snapshot, location, paths = None):
+        """
+        Restores a repository from a snapshot, the modification times of the files are restored too. A selective
+        restore reads only the chunks of the files under the selected ``paths`` and it replaces only the selected files
+        and directories of the repository.
+
+        :param snapshot: :py:class:Snapshot object.
+        :param location: The path of the restored repository, an existing repository is deleted once every chunk of the
+        restored files is read and checked, so a missing or corrupt chunk doesn't destroy the live repository.
+        :param paths: A list of the relative paths of the restored files and directories, None restores the whole
+        repository.
+        :exception CorruptSnapshotError is raised if a chunk is missing or corrupt.
+        :exception ValueError is raised if one of the ``paths`` is not in the snapshot.
+        :return:
+        """
+        files, directories = select_paths(snapshot.files, snapshot.directories, paths)
+        # The chunks can't be deleted by a garbage collection while they are checked and restored.
+        with self._locked():
+            checked_digests = set()
+            for relative_path in files:
+                for digest in snapshot.files[relative_path][2]:
+                    if digest not in checked_digests:
+                        self.read_chunk(digest)
+                        checked_digests.add(digest)
+            clear_restored(location, paths)
+            for relative_path in directories:
+                directory = os.path.join(location, *relative_path.split('/'))
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+            for relative_path in files:
+                size, mtime, digests = snapshot.files[relative_path]
+                file_path = os.path.join(location, *relative_path.split('/'))
+                if not os.path.isdir(os.path.dirname(file_path)):
+                    os.makedirs(os.path.dirname(file_path))
+                with open(file_path, 'wb') as data_file:
+                    for digest in digests:
+                        data_file.write(self.read_chunk(digest))
+                os.utime(file_path, (mtime, mtime))
+        module_logger.info("{} files of the {} repository are restored from the {} snapshot.".format(
+            len(files), location, snapshot.name))
+
+    def remove_snapshot(self, name):
+        """
+        Removes a snapshot, it's chunks are deleted by the next :py:meth:collect_garbage.
+
+        :param name: The name of the snapshot.
+        :return: Bool, FALSE if there was no such snapshot.
+        """
+        with self._locked():
+            if not self.has_snapshot(name):
+                return False
+            os.remove(self.snapshot_file(name))
+            return True
+
+    def collect_garbage(self, keep = None):
+        """
+        Deletes the chunks which are not referenced by any snapshot.
+
+        :param keep: The number of the newest snapshots of each repository to retain, the older snapshots are removed
+        first, None retains every snapshot.
+        :return: A tuple of the number of the deleted chunks and their size in bytes.
+        """
+        with self._locked():
+            snapshots = self.list_snapshots()
+            if keep is not None:
+                snapshots_by_repository = dict()
+                for snapshot in snapshots:
+                    snapshots_by_repository.setdefault(snapshot.repository, []).append(snapshot)
+                snapshots = []
+                for repository_snapshots in snapshots_by_repository.itervalues():
+                    removed = max(0, len(repository_snapshots) - keep)
+                    for snapshot in repository_snapshots[:removed]:
+                        os.remove(self.snapshot_file(snapshot.name))
+                    snapshots.extend(repository_snapshots[removed:])
+            referenced = set()
+            for snapshot in snapshots:
+                referenced.update(snapshot.chunks())
+            deleted_chunks = 0
+            deleted_bytes = 0
+            chunks_directory = os.path.join(self._location, CHUNKS_DIRECTORY_NAME)
+            if os.path.isdir(chunks_directory):
+                for directory_path, _, file_names in os.walk(chunks_directory):
+                    for file_name in file_names:
+                        if file_name not in referenced:
+                            chunk_file = os.path.join(directory_path, file_name)
+                            deleted_bytes += os.path.getsize(chunk_file)
+                            os.remove(chunk_file)
+                            deleted_chunks += 1
+        module_logger.info("The garbage collection of {} deleted {} chunks, {} bytes.".format(
+            self._location, deleted_chunks, deleted_bytes))
+        return deleted_chunks, deleted_bytes
@@ -1,10 +1,25 @@
 #!/usr/bin/env python
 """Various utils for making file-based data management easier.
+
+The identifiers of a storage directory are allocated from a counter file (:py:const:NEXT_ID_FILE_NAME) stored in the
+directory. The counter file contains the next free identifier, it is guarded by a file lock, so concurrent writers
+never get the same identifier. When the counter file is missing (e.g. in an existing repository) it is bootstrapped
+from the content of the directory.
 """
 
 # Imports -----------------------------------------------------------------------------------------------------------
 import logging
 import os
+from contextlib import contextmanager
+from json import dumps, loads
+from threading import RLock
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from iniformat.writer import write_atomically
 
 # Authorship information  -------------------------------------------------------------------------------------------
 __author__ = "Imre Piller"
@@ -17,11 +32,258 @@ __status__ = "Development"
 
 # -------------------------------------------------------------------------------------------------------------------
 
+NEXT_ID_FILE_NAME = '.next_id'
+JOURNAL_LOCK_SUFFIX = '.lock'
+ITER_BATCH_SIZE = 256
+INDEX_COMPACTION_THRESHOLD = 1000
 module_logger = logging.getLogger('repository.storage_utils')
 
 
 def get_next_id(storage_path):
-    """Calculate the next available identifier.
+    """Allocate the next available identifier.
+
+    :param storage_path: The path where to search for the next ID.
+    :return: Integer, next ID.
+    """
+    return reserve_ids(storage_path, 1)[0]
+
+
+def reserve_ids(storage_path, count):
+    """Allocate a block of identifiers with a single update of the counter file.
+
+    The identifiers are increasing and never handed out twice, an identifier which already exists in the directory
+    (e.g. because it was copied there) is skipped.
+
+    :param storage_path: The path of the storage directory.
+    :param count: The number of identifiers to allocate.
+    :return: A list of integers, the allocated IDs.
+    """
+    reserved_ids = []
+    with locked_counter_file(storage_path) as counter_file:
+        content = counter_file.read().strip()
+        try:
+            next_id = int(content)
+        except ValueError:
+            next_id = calculate_next_id(storage_path)
+            module_logger.info("The ID counter of {} is bootstrapped from the directory.".format(storage_path))
+        while len(reserved_ids) < count:
+            if not os.path.exists(os.path.join(storage_path, str(next_id))):
+                reserved_ids.append(next_id)
+            next_id += 1
+        counter_file.seek(0)
+        counter_file.truncate()
+        counter_file.write('{}\n'.format(next_id))
+        counter_file.flush()
+        os.fsync(counter_file.fileno())
+    return reserved_ids
+
+
+def ensure_next_id(storage_path, minimum_id):
+    """Raise the counter of a storage directory to at least ``minimum_id``, it's used when the stored identifiers are
+    not the names of the entries of the directory, so the counter can't be bootstrapped from the directory.
+
+    :param storage_path: The path of the storage directory.
+    :param minimum_id: The lowest identifier which may be allocated.
+    :return:
+    """
+    with locked_counter_file(storage_path) as counter_file:
+        content = counter_file.read().strip()
+        try:
+            next_id = int(content)
+        except ValueError:
+            next_id = calculate_next_id(storage_path)
+        counter_file.seek(0)
+        counter_file.truncate()
+        counter_file.write('{}\n'.format(max(next_id, minimum_id)))
+        counter_file.flush()
+        os.fsync(counter_file.fileno())
+
+
+@contextmanager
+def locked_counter_file(storage_path):
+    """Open the counter file of a storage directory and hold an exclusive lock on it.
+
+    :param storage_path: The path of the storage directory.
+    :return: The opened counter file, positioned to the beginning.
+    """
+    with open(os.path.join(storage_path, NEXT_ID_FILE_NAME), 'a+') as counter_file:
+        if fcntl:
+            fcntl.flock(counter_file.fileno(), fcntl.LOCK_EX)
+        try:
+            counter_file.seek(0)
+            yield counter_file
+        finally:
+            if fcntl:
+                fcntl.flock(counter_file.fileno(), fcntl.LOCK_UN)
+
+
+def batched(identifiers, batch_size = ITER_BATCH_SIZE):
+    """Split a sequence of identifiers into batches, the iterators of the managers read one batch at a time.
+
+    :param identifiers: A list of identifiers.
+    :param batch_size: The maximal number of identifiers in a batch.
+    :exception ValueError is raised if the ``batch_size`` is not positive.
+    :return: A generator of lists.
+    """
+    if batch_size < 1:
+        raise ValueError("The batch size must be positive, not {}!".format(batch_size))
+    for start in xrange(0, len(identifiers), batch_size):
+        yield identifiers[start:start + batch_size]
+
+
+class IndexJournal(object):
+    """Append-only journal which persists an in-memory index.
+
+    Every change of the index is appended to the journal as a JSON line, later lines override the earlier ones. The
+    lines appended by other processes are read from the tail of the journal. A compaction rewrites the journal into a
+    temporary file which is renamed to the journal file, so readers never see a partial journal; a reader notices the
+    replaced journal by it's inode and reads it again from the beginning.
+
+    The appends and the compactions of the processes are serialized by a lock file next to the journal (the journal
+    itself is replaced by a compaction, so it can't be locked). A compaction must read the tail of the journal and
+    build it's records while it holds the lock (see :py:meth:locked), otherwise the lines appended in between are lost.
+    """
+
+    def __init__(self, journal_file, compaction_threshold = INDEX_COMPACTION_THRESHOLD):
+        """
+        Initialisation of a new :py:class:IndexJournal object.
+
+        :param journal_file: The path of the journal file.
+        :param compaction_threshold: The journal isn't compacted while it's shorter than this number of lines.
+        """
+        self._journal_file = journal_file
+        self._compaction_threshold = compaction_threshold
+        self._inode = None
+        self._offset = 0
+        self._lines = 0
+        self._lock = RLock()
+        self._lock_depth = 0
+
+    @property
+    def journal_file(self):
+        """
+        The property of the :py:attr:_journal_file attribute.
+
+        :return: The path of the journal file.
+        """
+        return self._journal_file
+
+    @contextmanager
+    def locked(self):
+        """
+        Holds the lock of the writers of the journal, the lock file is locked only by the outermost holder (a second
+        flock on a new descriptor of the same file would block).
+
+        :return:
+        """
+        with self._lock:
+            if self._lock_depth > 0:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(self._journal_file + JOURNAL_LOCK_SUFFIX, 'a') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+                    if fcntl:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def read(self, replay, reset):
+        """
+        Reads the lines of the journal which were not read yet.
+
+        :param replay: A function which applies a record of the journal to the index.
+        :param reset: A function which empties the index, it's called before the journal is read again from the
+        beginning.
+        :return: Bool, FALSE if there is no journal file.
+        """
+        try:
+            journal_stat = os.stat(self._journal_file)
+        except OSError:
+            return False
+        if self._inode is None or journal_stat.st_ino != self._inode or journal_stat.st_size < self._offset:
+            reset()
+            self._offset = 0
+            self._lines = 0
+        if journal_stat.st_size == self._offset:
+            self._inode = journal_stat.st_ino
+            return True
+        with open(self._journal_file) as journal:
+            journal.seek(self._offset)
+            tail = journal.read()
+        complete_tail = tail[:tail.rfind('\n') + 1]
+        for line in complete_tail.splitlines():
+            if line:
+                replay(loads(line))
+                self._lines += 1
+        self._offset += len(complete_tail)
+        self._inode = journal_stat.st_ino
+        return True
+
+    def rewind(self):
+        """
+        Makes the next read replay the journal from the beginning without resetting the index, it's used when the
+        index was reloaded from a snapshot which the journal is applied to.
+
+        :return:
+        """
+        try:
+            self._inode = os.stat(self._journal_file).st_ino
+        except OSError:
+            self._inode = None
+        self._offset = 0
+        self._lines = 0
+
+    def append(self, records, replay, reset):
+        """
+        Appends records to the journal and reads them back with the lines appended by other processes.
+
+        :param records: List of dictionaries to write as JSON lines.
+        :param replay: A function which applies a record of the journal to the index.
+        :param reset: A function which empties the index.
+        :return:
+        """
+        if not records:
+            return
+        with self.locked():
+            with open(self._journal_file, 'a') as journal:
+                journal.write(''.join(dumps(record) + '\n' for record in records))
+            self.read(replay, reset)
+
+    def needs_compaction(self, entry_count):
+        """
+        Determines if the journal is too long for the number of the indexed entries.
+
+        :param entry_count: The number of the indexed entries.
+        :return: Bool, TRUE if the journal should be compacted.
+        """
+        return self._lines > max(self._compaction_threshold, 2 * entry_count)
+
+    def rewrite(self, records, replay, reset):
+        """
+        Replaces the journal with the given records and reads it back. The caller must hold the lock (see
+        :py:meth:locked) since it has read the tail of the journal which the ``records`` are built from.
+
+        :param records: List of dictionaries, one record per indexed entry.
+        :param replay: A function which applies a record of the journal to the index.
+        :param reset: A function which empties the index.
+        :return:
+        """
+        with self.locked():
+            write_atomically(self._journal_file, ''.join(dumps(record) + '\n' for record in records))
+            self._inode = None
+            self.read(replay, reset)
+
+
+def calculate_next_id(storage_path):
+    """Calculate the next available identifier from the content of the storage directory.
 
     :param storage_path: The path where to search for the next ID.
     :return: Integer, next ID.
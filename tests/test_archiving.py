@@ -0,0 +1,92 @@
+import os
+import random
+import shutil
+import unittest
+import zlib
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+import archiving
+from archiving import ParallelZipWriter, crc32_combine
+
+
+class TestParallelZipWriter(unittest.TestCase):
+    """Test the parallel compression of the zip archives"""
+
+
+    def setUp(self):
+        os.makedirs('/tmp/edms')
+        self._text = ''.join(random.choice('abcdefgh\n') for _ in xrange(10500))
+        with open('/tmp/edms/text.txt', 'wb') as text_file:
+            text_file.write(self._text)
+        with open('/tmp/edms/image.png', 'wb') as image_file:
+            image_file.write(os.urandom(3000))
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def test_crc32_combine(self):
+        first = os.urandom(1000)
+        second = 'abc' * 2000
+        self.assertEqual(crc32_combine(zlib.crc32(first) & 0xffffffff, zlib.crc32(second) & 0xffffffff, len(second)),
+                         zlib.crc32(first + second) & 0xffffffff)
+        self.assertEqual(crc32_combine(12345, 0, 0), 12345)
+        self.assertEqual(crc32_combine(0, zlib.crc32(second) & 0xffffffff, len(second)),
+                         zlib.crc32(second) & 0xffffffff)
+        self.assertLessEqual(len(archiving._crc32_powers), len(second).bit_length())
+
+
+    def test_compress_in_window(self):
+        submitted = []
+
+        class Result(object):
+            def __init__(self, task):
+                self._task = task
+
+            def get(self):
+                return archiving.compress_chunk(self._task)
+
+        class Pool(object):
+            def apply_async(self, function, arguments):
+                submitted.append(arguments[0])
+                return Result(arguments[0])
+
+        tasks = [('/tmp/edms/text.txt', offset, 1000, 6, offset == 10000) for offset in xrange(0, 10500, 1000)]
+        results = ParallelZipWriter.compress_in_window(Pool(), tasks, 3)
+        self.assertEqual(len(submitted), 0)
+        next(results)
+        self.assertEqual(len(submitted), 4)
+        remaining = list(results)
+        self.assertEqual(len(remaining), 10)
+        self.assertEqual(submitted, tasks)
+        self.assertEqual(''.join(zlib.decompress(c, -15) for c, _, _ in remaining[-1:]), self._text[10000:])
+
+
+    def test_chunked_compression(self):
+        chunk_size = archiving.CHUNK_SIZE
+        archiving.CHUNK_SIZE = 1000
+        try:
+            with ParallelZipWriter('/tmp/edms/archive.zip', workers = 2) as archive:
+                skipped = archive.write_files([('/tmp/edms/text.txt', 'text.txt'), ('/tmp/edms/missing', 'missing'),
+                                               ('/tmp/edms/image.png', 'image.png')])
+        finally:
+            archiving.CHUNK_SIZE = chunk_size
+        self.assertEqual(skipped, ['missing'])
+        self.assertEqual(archive.input_bytes, 13500)
+        self.assertGreater(archive.throughput, 0)
+        with ZipFile('/tmp/edms/archive.zip') as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(zip_file.read('text.txt'), self._text)
+            self.assertEqual([(i.filename, i.compress_type) for i in zip_file.infolist()],
+                             [('text.txt', ZIP_DEFLATED), ('image.png', ZIP_STORED)])
+
+
+    def test_compression_level(self):
+        with ParallelZipWriter('/tmp/edms/stored.zip', compression_level = 0, workers = 1) as archive:
+            archive.write_files([('/tmp/edms/text.txt', 'text.txt')])
+        with ZipFile('/tmp/edms/stored.zip') as zip_file:
+            self.assertEqual(zip_file.getinfo('text.txt').compress_type, ZIP_STORED)
+            self.assertEqual(zip_file.read('text.txt'), self._text)
+        with self.assertRaises(ValueError):
+            ParallelZipWriter('/tmp/edms/invalid.zip', compression_level = 10)
@@ -0,0 +1,144 @@
+import os
+import shutil
+import unittest
+import webbrowser
+from datetime import date
+from zipfile import ZipFile
+
+from backup_views import ArchivedUserManager
+from documents import Document, DocumentDoesntExistsError
+from repository import Repository, ArchivedRepository
+from users import User
+
+
+class TestArchivedRepository(unittest.TestCase):
+    """Test the read-only views of the backed up repositories"""
+
+
+    def setUp(self):
+        os.makedirs('/tmp/edms/samples')
+        self._backup_path = '/tmp/edms/backups'
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def create_repository(self, **kwargs):
+        self._repository = Repository(location = '/tmp/edms/repository', **kwargs)
+        self._user_manager = self._repository._user_manager
+        self._document_manager = self._repository._document_manager
+
+
+    def add_user(self, name):
+        return self._user_manager.add_user(User(name, 'Family', date(1990, 12, 1), '{}@mail.com'.format(name.lower()),
+                                                '1234'))
+
+
+    def add_document(self, title, author):
+        file_path = '/tmp/edms/samples/{}.txt'.format(title.lower())
+        with open(file_path, 'w') as file_obj:
+            file_obj.write(title * 1000)
+        return self._document_manager.add_document(Document(title, 'Description', author, [file_path], 'txt'))
+
+
+    def test_read_archive(self):
+        self.create_repository()
+        a_id = self.add_user('A')
+        b_id = self.add_user('B')
+        self._user_manager.add_role(a_id, 'admin')
+        document_id = self.add_document('First', a_id)
+        self._repository.create_backup('full', self._backup_path)
+        read = ZipFile.read
+        read_members = []
+        ZipFile.read = lambda archive, name, pwd = None: read_members.append(name) or read(archive, name, pwd)
+        try:
+            with ArchivedRepository(self._backup_path, 'full') as archived_repository:
+                user_manager = archived_repository.user_manager
+                document_manager = archived_repository.document_manager
+                self.assertEqual(archived_repository.name, self._repository.name)
+                self.assertEqual(user_manager.find_all_users(), [a_id, b_id])
+                self.assertEqual(user_manager.load_user(b_id).email, 'b@mail.com')
+                self.assertEqual(user_manager.list_users_by_role(), {'admin': [a_id]})
+                self.assertTrue(user_manager.has_role(a_id, 'admin'))
+                self.assertEqual(document_manager.find_all_documents(), [document_id])
+                self.assertEqual(document_manager.load_document(document_id).title, 'First')
+                self.assertEqual([d.title for _, d in document_manager.iter_documents(user_manager = user_manager)],
+                                 ['First'])
+                with self.assertRaises(DocumentDoesntExistsError):
+                    document_manager.load_document(document_id + 1)
+        finally:
+            ZipFile.read = read
+        self.assertNotIn('documents/{}/first.txt'.format(document_id), read_members)
+
+
+    def test_read_incremental_backup(self):
+        self.create_repository()
+        a_id = self.add_user('A')
+        self._repository.create_backup('first', self._backup_path, incremental = True)
+        b_id = self.add_user('B')
+        self._repository.create_backup('second', self._backup_path, incremental = True)
+        with ArchivedRepository(self._backup_path, 'second') as archived_repository:
+            self.assertEqual(archived_repository.user_manager.load_user(a_id).first_name, 'A')
+            self.assertEqual(archived_repository.user_manager.load_user(b_id).first_name, 'B')
+
+
+    def test_read_snapshot(self):
+        self.create_repository()
+        a_id = self.add_user('A')
+        self._repository.create_backup('weekly', self._backup_path, deduplicated = True)
+        with ArchivedRepository(self._backup_path, 'weekly') as archived_repository:
+            self.assertEqual(archived_repository.user_manager.count_users(), 1)
+            self.assertEqual(archived_repository.user_manager.load_user(a_id).first_name, 'A')
+
+
+    def test_sharded_users_and_roles_journal(self):
+        self.create_repository(roles_storage = 'journal', users_storage = 'sharded')
+        a_id = self.add_user('A')
+        b_id = self.add_user('B')
+        self._user_manager.update_user(a_id, User('Changed', 'Family', date(1990, 12, 1), 'a@mail.com', '1234'))
+        self._user_manager.remove_user(b_id)
+        self._user_manager.add_role(a_id, 'admin')
+        self._user_manager.add_role(a_id, 'author')
+        self._user_manager.remove_role(a_id, 'admin')
+        self._repository.create_backup('full', self._backup_path)
+        with ArchivedRepository(self._backup_path, 'full') as archived_repository:
+            user_manager = archived_repository.user_manager
+            self.assertIsInstance(user_manager, ArchivedUserManager)
+            self.assertEqual(user_manager.find_all_users(), [a_id])
+            self.assertEqual(user_manager.load_user(a_id).first_name, 'Changed')
+            self.assertEqual(user_manager.find_users_by_name('changed'), [str(a_id)])
+            self.assertEqual(user_manager.list_users_by_role(), {'author': [a_id]})
+
+
+    def test_torn_shard_record_is_skipped(self):
+        self.create_repository(users_storage = 'sharded')
+        a_id = self.add_user('A')
+        with open('/tmp/edms/repository/users/.shards/users_0.dat', 'ab') as record_file:
+            record_file.write('[{}, "Cc", "D'.format(a_id + 1))
+        b_id = self.add_user('B')
+        self.assertEqual(self._user_manager.find_all_users(), [a_id, b_id])
+        self._repository.create_backup('full', self._backup_path)
+        with ArchivedRepository(self._backup_path, 'full') as archived_repository:
+            self.assertEqual(archived_repository.user_manager.find_all_users(), [a_id, b_id])
+            self.assertEqual(archived_repository.user_manager.load_user(b_id).first_name, 'B')
+
+
+    def test_show_backup_info(self):
+        self.create_repository()
+        self.add_user('A')
+        self._repository.create_backup('full', self._backup_path)
+        opened = []
+        browser_open = webbrowser.open
+        webbrowser.open = lambda url: opened.append(url)
+        try:
+            self._repository.show_backup_info(os.path.join(self._backup_path, 'full'))
+        finally:
+            webbrowser.open = browser_open
+        self.assertEqual(len(opened), 1)
+        with open(opened[0]) as index_file:
+            self.assertIn('a@mail.com', index_file.read())
+        os.remove(opened[0])
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(opened[0]), 'tmp', 'tmp_repository')))
+        with self.assertRaises(TypeError):
+            self._repository.show_backup_info(os.path.join(self._backup_path, 'missing'))
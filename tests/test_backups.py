@@ -0,0 +1,302 @@
+import os
+import shutil
+import time
+import unittest
+from datetime import date, datetime
+from zipfile import ZipFile
+
+import backups
+from backups import BackupManifest, BrokenBackupChainError, FULL_BACKUP, INCREMENTAL_BACKUP
+from documents import Document, DocumentDoesntExistsError
+from metadata_store import migrate
+from repository import Repository
+from users import User
+
+
+class TestBackups(unittest.TestCase):
+    """Test the full and incremental backups"""
+
+
+    def setUp(self):
+        self._repository = Repository(location = '/tmp/edms/repository')
+        self._user_manager = self._repository._user_manager
+        self._backup_path = '/tmp/edms/backups'
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def add_user(self, name):
+        return self._user_manager.add_user(User(name, 'Family', date(1990, 12, 1), '{}@mail.com'.format(name.lower()),
+                                                '1234'))
+
+
+    def archived_files(self, name):
+        with ZipFile(os.path.join(self._backup_path, name + '.zip')) as archive:
+            return sorted(n for n in archive.namelist() if not n.endswith('/') and n != backups.MANIFEST_ARCHIVE_NAME)
+
+
+    def test_full_backup_has_manifest(self):
+        a_id = self.add_user('A')
+        self._repository.create_backup('full', self._backup_path)
+        manifest = BackupManifest.read(self._backup_path, 'full')
+        self.assertEqual(manifest.kind, FULL_BACKUP)
+        self.assertIn('users/{}'.format(a_id), manifest.files)
+        self.assertIn('documents', manifest.directories)
+        self.assertEqual(self.archived_files('full'), sorted(manifest.files))
+        self.assertGreater(manifest.throughput, 0)
+        os.remove(BackupManifest.manifest_file(self._backup_path, 'full'))
+        self.assertEqual(BackupManifest.read(self._backup_path, 'full').files, manifest.files)
+
+
+    def test_incremental_backup(self):
+        a_id = self.add_user('A')
+        b_id = self.add_user('B')
+        self._repository.create_backup('first', self._backup_path, incremental = True)
+        self.assertEqual(BackupManifest.read(self._backup_path, 'first').kind, FULL_BACKUP)
+        c_id = self.add_user('C')
+        self._user_manager.remove_user(b_id)
+        self._repository.create_backup('second', self._backup_path, incremental = True)
+        manifest = BackupManifest.read(self._backup_path, 'second')
+        self.assertEqual(manifest.kind, INCREMENTAL_BACKUP)
+        self.assertEqual(manifest.base, 'first')
+        self.assertIn('users/{}'.format(c_id), self.archived_files('second'))
+        self.assertNotIn('users/{}'.format(a_id), self.archived_files('second'))
+        self.assertIn('users/{}'.format(b_id), manifest.deleted)
+
+
+    def test_unchanged_files_are_not_hashed(self):
+        self.add_user('A')
+        self._repository.create_backup('first', self._backup_path, incremental = True)
+        file_digest = backups.file_digest
+        hashed = []
+        backups.file_digest = lambda file_path: hashed.append(file_path) or file_digest(file_path)
+        try:
+            self._repository.create_backup('second', self._backup_path, incremental = True)
+        finally:
+            backups.file_digest = file_digest
+        self.assertEqual(hashed, [])
+        self.assertEqual(BackupManifest.read(self._backup_path, 'second').archived, [])
+
+
+    def test_touched_file_is_not_archived(self):
+        a_id = self.add_user('A')
+        self._repository.create_backup('first', self._backup_path, incremental = True)
+        os.utime('/tmp/edms/repository/users/{}'.format(a_id), (time.time() + 10, time.time() + 10))
+        self._repository.create_backup('second', self._backup_path, incremental = True)
+        self.assertEqual(BackupManifest.read(self._backup_path, 'second').archived, [])
+
+
+    def test_restore_chain(self):
+        a_id = self.add_user('A')
+        b_id = self.add_user('B')
+        self._repository.create_backup('first', self._backup_path, incremental = True)
+        c_id = self.add_user('C')
+        self._user_manager.remove_user(b_id)
+        self._repository.create_backup('second', self._backup_path, incremental = True)
+        self.add_user('D')
+        self._repository.create_backup('third', self._backup_path, incremental = True)
+        self._repository.restore('second', self._backup_path)
+        self.assertTrue(os.path.exists('/tmp/edms/repository/users/{}'.format(a_id)))
+        self.assertFalse(os.path.exists('/tmp/edms/repository/users/{}'.format(b_id)))
+        self.assertTrue(os.path.exists('/tmp/edms/repository/users/{}'.format(c_id)))
+        self.assertFalse(os.path.exists('/tmp/edms/repository/users/{}'.format(c_id + 1)))
+        self.assertTrue(os.path.isdir('/tmp/edms/repository/documents'))
+        with open('/tmp/edms/repository/users/{}'.format(c_id)) as user_file:
+            self.assertEqual(user_file.readline().rstrip('\n'), 'C')
+
+
+    def test_restore_sqlite_repository(self):
+        migrate('/tmp/edms/repository', 'sqlite')
+        repository = Repository(location = '/tmp/edms/repository')
+        user_manager = repository._user_manager
+        a_id = user_manager.add_user(User('A', 'Family', date(1990, 12, 1), 'a@mail.com', '1234'))
+        user_manager.add_role(a_id, 'author')
+        repository.create_backup('full', self._backup_path)
+        b_id = user_manager.add_user(User('B', 'Family', date(1990, 12, 1), 'b@mail.com', '1234'))
+        user_manager.add_role(b_id, 'author')
+        repository.restore('full', self._backup_path)
+        self.assertEqual(user_manager.find_all_users(), [a_id])
+        self.assertEqual(user_manager.list_users_by_role(), {'author': [a_id]})
+        c_id = user_manager.add_user(User('C', 'Family', date(1990, 12, 1), 'c@mail.com', '1234'))
+        self.assertEqual(Repository(location = '/tmp/edms/repository')._user_manager.find_all_users(), [a_id, c_id])
+
+
+    def test_restore_point_in_time(self):
+        a_id = self.add_user('A')
+        self._repository.create_backup('first', self._backup_path, incremental = True)
+        point_in_time = datetime.utcnow()
+        b_id = self.add_user('B')
+        self._repository.create_backup('second', self._backup_path, incremental = True)
+        self._repository.restore(backup_path = self._backup_path, point_in_time = point_in_time)
+        self.assertTrue(os.path.exists('/tmp/edms/repository/users/{}'.format(a_id)))
+        self.assertFalse(os.path.exists('/tmp/edms/repository/users/{}'.format(b_id)))
+        with self.assertRaises(ValueError):
+            self._repository.restore(backup_path = self._backup_path, point_in_time = datetime(2000, 1, 1))
+
+
+    def test_broken_chain_keeps_repository(self):
+        a_id = self.add_user('A')
+        self._repository.create_backup('first', self._backup_path, incremental = True)
+        self.add_user('B')
+        self._repository.create_backup('second', self._backup_path, incremental = True)
+        os.remove(os.path.join(self._backup_path, 'first.zip'))
+        os.remove(BackupManifest.manifest_file(self._backup_path, 'first'))
+        with self.assertRaises(BrokenBackupChainError):
+            self._repository.restore('second', self._backup_path)
+        self.assertTrue(os.path.exists('/tmp/edms/repository/users/{}'.format(a_id)))
+
+
+    def test_chain_length_is_limited(self):
+        chain_length = backups.MAX_INCREMENTAL_CHAIN
+        backups.MAX_INCREMENTAL_CHAIN = 1
+        try:
+            for name in ['first', 'second', 'third']:
+                self.add_user(name.capitalize())
+                self._repository.create_backup(name, self._backup_path, incremental = True)
+        finally:
+            backups.MAX_INCREMENTAL_CHAIN = chain_length
+        self.assertEqual([BackupManifest.read(self._backup_path, name).kind for name in ['first', 'second', 'third']],
+                         [FULL_BACKUP, INCREMENTAL_BACKUP, FULL_BACKUP])
+
+
+    def test_incremental_backup_must_be_whole(self):
+        with self.assertRaises(ValueError):
+            self._repository.create_backup('partial', self._backup_path, backup_logs = False, incremental = True)
+
+
+    def test_partial_backup_keeps_repository(self):
+        a_id = self.add_user('A')
+        self._repository.create_backup('partial', self._backup_path, backup_users = False)
+        self.assertTrue(os.path.exists('/tmp/edms/repository/users/{}'.format(a_id)))
+        self.assertFalse(os.path.exists('./partial'))
+        manifest = BackupManifest.read(self._backup_path, 'partial')
+        self.assertIn('users', manifest.directories)
+        self.assertEqual([p for p in manifest.files if p.startswith('users/')], [])
+        self.assertEqual(sorted(os.listdir(self._backup_path)), ['partial' + backups.MANIFEST_SUFFIX, 'partial.zip'])
+        self._repository.restore('partial', self._backup_path)
+        self.assertTrue(os.path.isdir('/tmp/edms/repository/users'))
+        self.assertEqual(os.listdir('/tmp/edms/repository/users'), [])
+
+
+    def test_include_and_exclude_patterns(self):
+        a_id = self.add_user('A')
+        b_id = self.add_user('B')
+        self._repository.create_backup('included', self._backup_path, include = ['users/*'],
+                                       exclude = ['users/.*', 'users/{}'.format(b_id)])
+        self.assertEqual(self.archived_files('included'), ['users/{}'.format(a_id), 'users/roles.txt'])
+
+
+    def test_incremental_backup_after_partial_backup(self):
+        a_id = self.add_user('A')
+        self._repository.create_backup('partial', self._backup_path, backup_users = False)
+        self._repository.create_backup('incremental', self._backup_path, incremental = True)
+        self.assertIn('users/{}'.format(a_id), self.archived_files('incremental'))
+        self._repository.restore('incremental', self._backup_path)
+        self.assertTrue(os.path.exists('/tmp/edms/repository/users/{}'.format(a_id)))
+
+
+class TestSelectiveRestore(unittest.TestCase):
+    """Test the restore of the selected parts of a repository"""
+
+
+    def setUp(self):
+        self._repository = Repository(location = '/tmp/edms/repository')
+        self._user_manager = self._repository._user_manager
+        self._document_manager = self._repository._document_manager
+        self._backup_path = '/tmp/edms/backups'
+        os.makedirs('/tmp/edms/samples')
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def add_user(self, name):
+        return self._user_manager.add_user(User(name, 'Family', date(1990, 12, 1), '{}@mail.com'.format(name.lower()),
+                                                '1234'))
+
+
+    def add_document(self, title):
+        file_path = '/tmp/edms/samples/{}.txt'.format(title.lower())
+        with open(file_path, 'w') as file_obj:
+            file_obj.write(title)
+        return self._document_manager.add_document(Document(title, 'Description', 1, [file_path], 'txt'))
+
+
+    def test_restore_section(self):
+        a_id = self.add_user('A')
+        self._repository.create_backup('full', self._backup_path)
+        b_id = self.add_user('B')
+        document_id = self.add_document('Later')
+        extract = ZipFile.extract
+        extracted = []
+        ZipFile.extract = lambda archive, member, location = None, pwd = None: \
+            extracted.append(member) or extract(archive, member, location, pwd)
+        try:
+            self._repository.restore('full', self._backup_path, backup_documents = False, backup_logs = False,
+                                     backup_projects = False, backup_reports = False)
+        finally:
+            ZipFile.extract = extract
+        self.assertTrue(extracted)
+        self.assertEqual([m for m in extracted if not m.startswith('users/')], [])
+        self.assertTrue(os.path.exists('/tmp/edms/repository/users/{}'.format(a_id)))
+        self.assertFalse(os.path.exists('/tmp/edms/repository/users/{}'.format(b_id)))
+        self.assertEqual([d.title for d in self._document_manager.find_documents_by_title('Later')], ['Later'])
+        self.assertEqual(self._document_manager.find_all_documents(), [document_id])
+
+
+    def test_restore_single_user(self):
+        a_id = self.add_user('A')
+        b_id = self.add_user('B')
+        self._repository.create_backup('full', self._backup_path)
+        self._user_manager.update_user(a_id, User('Changed', 'Family', date(1990, 12, 1), 'changed@mail.com', '1234'))
+        self._user_manager.remove_user(b_id)
+        c_id = self.add_user('C')
+        self._repository.restore('full', self._backup_path, user_ids = [a_id])
+        self.assertEqual(self._user_manager.load_user(a_id).first_name, 'A')
+        self.assertEqual(self._user_manager.find_users_by_exact_email('a@mail.com'), [str(a_id)])
+        self.assertEqual(self._user_manager.find_users_by_exact_email('changed@mail.com'), [])
+        self.assertFalse(self._user_manager.has_user(b_id))
+        self.assertTrue(self._user_manager.has_user(c_id))
+        with self.assertRaises(ValueError):
+            self._repository.restore('full', self._backup_path, user_ids = [c_id])
+        self.assertTrue(self._user_manager.has_user(c_id))
+
+
+    def test_restore_single_document(self):
+        first_id = self.add_document('First')
+        second_id = self.add_document('Second')
+        self._repository.create_backup('full', self._backup_path)
+        self._document_manager.remove_document(first_id)
+        self._document_manager.remove_document(second_id)
+        self._repository.restore('full', self._backup_path, document_ids = [first_id])
+        self.assertEqual([d.title for d in self._document_manager.find_documents_by_title('First')], ['First'])
+        with self.assertRaises(DocumentDoesntExistsError):
+            self._document_manager.find_documents_by_title('Second')
+        self.assertEqual(self._document_manager.find_all_documents(), [first_id])
+
+
+    def test_restore_roles(self):
+        a_id = self.add_user('A')
+        self._user_manager.add_role(a_id, 'admin')
+        self._repository.create_backup('full', self._backup_path)
+        self._user_manager.add_role(a_id, 'manager')
+        b_id = self.add_user('B')
+        self._repository.restore('full', self._backup_path, restore_roles = True)
+        self.assertTrue(self._user_manager.has_role(a_id, 'admin'))
+        self.assertFalse(self._user_manager.has_role(a_id, 'manager'))
+        self.assertTrue(self._user_manager.has_user(b_id))
+
+
+    def test_restore_from_incremental_backup(self):
+        a_id = self.add_user('A')
+        self._repository.create_backup('first', self._backup_path, incremental = True)
+        b_id = self.add_user('B')
+        self._repository.create_backup('second', self._backup_path, incremental = True)
+        self._user_manager.remove_user(a_id)
+        self._user_manager.remove_user(b_id)
+        self._repository.restore('second', self._backup_path, user_ids = [a_id, b_id])
+        self.assertTrue(self._user_manager.has_user(a_id))
+        self.assertTrue(self._user_manager.has_user(b_id))
@@ -1,10 +1,15 @@
+import os
 import shutil
 import unittest
 from os import path, makedirs
 
 from docgen import generator
+from documents import BulkAddError
+from documents import BulkLoadError
 from documents import Document
+from documents import DocumentDoesntExistsError
 from documents import DocumentManager
+from documents import LazyDocument
 
 
 class TestDocumentManager(unittest.TestCase):
@@ -187,3 +192,183 @@ class TestDocumentManager(unittest.TestCase):
         titles = {document.title for document in documents}
         self.assertIn('A', titles)
         self.assertIn('C', titles)
+
+
+    def test_catalog_picks_up_external_changes(self):
+        a = Document('A', 'description of A', 1, ['/tmp/edms/samples/a1.pdf'], 'pdf')
+        a_id = self._document_manager.add_document(a)
+        self.assertEqual(self._document_manager.find_document_by_id(a_id).title, 'A')
+        other_document_manager = DocumentManager('/tmp/edms/documents')
+        b = Document('B', 'description of B', 2, ['/tmp/edms/samples/b.doc'], 'doc')
+        b_id = other_document_manager.add_document(b)
+        self.assertEqual(self._document_manager.count_documents(), 2)
+        self.assertEqual(self._document_manager.find_document_by_id(b_id).title, 'B')
+        c = Document('C', 'description of C', 1, ['/tmp/edms/samples/c1.pdf'], 'pdf')
+        other_document_manager.update_document(a_id, c)
+        self.assertEqual(self._document_manager.find_document_by_id(a_id).title, 'C')
+        other_document_manager.remove_document(b_id)
+        with self.assertRaises(ValueError):
+            self._document_manager.find_document_by_id(b_id)
+
+
+    def test_find_document_by_id_reads_only_its_metadata(self):
+        import documents
+        for name in ['a1.pdf', 'a2.pdf', 'b.doc']:
+            self._document_manager.add_document(
+                Document(name, 'description', 1, ['/tmp/edms/samples/{}'.format(name)], 'pdf'))
+        fresh_document_manager = DocumentManager('/tmp/edms/documents')
+        read_files = []
+        original_read_ini_file = documents.read_ini_file
+
+        def counting_read_ini_file(file_path):
+            read_files.append(file_path)
+            return original_read_ini_file(file_path)
+
+        documents.read_ini_file = counting_read_ini_file
+        try:
+            fresh_document_manager.find_document_by_id(2)
+            fresh_document_manager.find_document_by_id(2)
+        finally:
+            documents.read_ini_file = original_read_ini_file
+        self.assertEqual(read_files, ['/tmp/edms/documents/2/2_document_metadata.edd'])
+
+
+    def test_secondary_indexes_are_persisted(self):
+        a = Document('Alpha', 'description of A', [1, 2], ['/tmp/edms/samples/a1.pdf'], 'pdf')
+        b = Document('beta', 'description of B', 2, ['/tmp/edms/samples/b.doc'], 'doc')
+        a_id = self._document_manager.add_document(a)
+        b_id = self._document_manager.add_document(b)
+        self.assertTrue(os.path.exists('/tmp/edms/documents/document_index.jsonl'))
+        other_document_manager = DocumentManager('/tmp/edms/documents')
+        self.assertEqual([d.title for d in other_document_manager.find_documents_by_title('ALPHA')], ['Alpha'])
+        self.assertEqual(len(other_document_manager.find_documents_by_author(2)), 2)
+        self.assertEqual([d.title for d in other_document_manager.find_documents_by_format('doc')], ['beta'])
+        self._document_manager.remove_document(b_id)
+        self.assertEqual(len(other_document_manager.find_documents_by_author(2)), 1)
+        with self.assertRaises(DocumentDoesntExistsError):
+            other_document_manager.find_documents_by_format('doc')
+        self._document_manager.update_document(a_id, Document('Gamma', 'desc', 3, [], 'txt'))
+        self.assertEqual([d.title for d in other_document_manager.find_documents_by_author(3)], ['Gamma'])
+
+
+    def test_rebuild_indexes(self):
+        a = Document('A', 'description of A', 1, ['/tmp/edms/samples/a1.pdf'], 'pdf')
+        self._document_manager.add_document(a)
+        os.remove('/tmp/edms/documents/document_index.jsonl')
+        other_document_manager = DocumentManager('/tmp/edms/documents')
+        self.assertEqual(len(other_document_manager.find_documents_by_title('a')), 1)
+        with open('/tmp/edms/documents/document_index.jsonl', 'w') as index_file:
+            index_file.write('')
+        other_document_manager.rebuild_indexes()
+        self.assertEqual(len(other_document_manager.find_documents_by_format('pdf')), 1)
+
+
+    def test_add_documents(self):
+        documents = [Document('A', 'description of A', 1, ['/tmp/edms/samples/a1.pdf', '/tmp/edms/samples/a2.pdf'],
+                              'pdf'),
+                     Document('B', 'description of B', 2, ['/tmp/edms/samples/b.doc'], 'doc'),
+                     Document('C', 'description of C', 1, ['/tmp/edms/samples/c1.html'], 'html')]
+        document_ids = self._document_manager.add_documents(documents)
+        self.assertEqual(document_ids, [1, 2, 3])
+        self.assertEqual(self._document_manager.count_documents(), 3)
+        self.assertEqual(self._document_manager.find_document_by_id(1).files, ['a1.pdf', 'a2.pdf'])
+        self.assertEqual(self._document_manager.find_document_by_id(2).title, 'B')
+        self.assertEqual(len(self._document_manager.find_documents_by_author(1)), 2)
+        self.assertTrue(path.exists('/tmp/edms/documents/3/c1.html'))
+
+
+    def test_add_documents_reports_failed_documents(self):
+        documents = [Document('A', 'description of A', 1, ['/tmp/edms/samples/a1.pdf'], 'pdf'),
+                     Document('B', 'description of B', 2, ['/tmp/edms/samples/b.doc', '/tmp/edms/samples/x.doc'],
+                              'doc'),
+                     Document('C', 'description of C', 1, ['/tmp/edms/samples/c1.html'], 'html')]
+        with self.assertRaises(BulkAddError) as context:
+            self._document_manager.add_documents(documents)
+        self.assertEqual(context.exception.document_ids, [1, None, 3])
+        self.assertEqual(list(context.exception.errors), [1])
+        self.assertEqual(self._document_manager.count_documents(), 2)
+        self.assertTrue(path.exists('/tmp/edms/samples/b.doc'))
+
+
+    def test_lazy_document_parses_only_read_fields(self):
+        document = Document('A', 'description of A', [1, 2], ['/tmp/edms/samples/a1.pdf', '/tmp/edms/samples/a2.pdf'],
+                            'pdf')
+        document_id = self._document_manager.add_document(document)
+        lazy_document = self._document_manager.load_document(document_id, lazy = True)
+        self.assertIsInstance(lazy_document, LazyDocument)
+        self.assertEqual(lazy_document.document_id, document_id)
+        self.assertEqual(lazy_document.title, 'A')
+        with self.assertRaises(AttributeError):
+            Document._creation_date.__get__(lazy_document)
+        eager_document = self._document_manager.load_document(document_id)
+        for name in ['title', 'description', 'author', 'files', 'doc_format', 'creation_date', 'modification_date',
+                     'state']:
+            self.assertEqual(getattr(lazy_document, name), getattr(eager_document, name))
+        self.assertEqual(lazy_document.is_public(), eager_document.is_public())
+        lazy_document.change_state('pending')
+        self.assertEqual(lazy_document.state, 'pending')
+
+
+    def test_load_all_documents_lazy(self):
+        self._document_manager.add_document(Document('A', 'description of A', 1, ['/tmp/edms/samples/a1.pdf'], 'pdf'))
+        self._document_manager.add_document(Document('B', 'description of B', 2, ['/tmp/edms/samples/b.doc'], 'doc'))
+        documents = self._document_manager.load_all_documents(lazy = True)
+        self.assertEqual(dict((document_id, document.title) for document_id, document in documents.iteritems()),
+                         {1: 'A', 2: 'B'})
+
+
+    def test_document_has_no_instance_dictionary(self):
+        document = Document('A', 'description of A', 1, ['/tmp/edms/samples/a1.pdf'], 'pdf')
+        self.assertFalse(hasattr(document, '__dict__'))
+        with self.assertRaises(AttributeError):
+            document.unknown = 1
+
+
+    def test_load_all_documents_concurrently(self):
+        for i in range(20):
+            generator.DocumentGenerator().generate_random_file('/tmp/edms/samples/f{}.pdf'.format(i))
+            self._document_manager.add_document(Document('Title {}'.format(i), 'Description', [1, i + 2],
+                                                         ['/tmp/edms/samples/f{}.pdf'.format(i)], 'pdf'))
+        sequential = self._document_manager.load_all_documents()
+        for parameters in [{'workers': 4}, {'workers': 4, 'processes': 2}]:
+            concurrent = self._document_manager.load_all_documents(**parameters)
+            self.assertEqual(sorted(concurrent), sorted(sequential))
+            for document_id, document in sequential.iteritems():
+                self.assertEqual(str(concurrent[document_id]), str(document))
+                self.assertEqual(concurrent[document_id].creation_date, document.creation_date)
+                self.assertEqual(concurrent[document_id].state, document.state)
+
+
+    def test_load_all_documents_concurrently_collects_errors(self):
+        a_id = self._document_manager.add_document(Document('A', 'description of A', 1, ['/tmp/edms/samples/a1.pdf'],
+                                                            'pdf'))
+        b_id = self._document_manager.add_document(Document('B', 'description of B', 2, ['/tmp/edms/samples/b.doc'],
+                                                            'doc'))
+        os.remove('/tmp/edms/documents/{0}/{0}_document_metadata.edd'.format(b_id))
+        with self.assertRaises(BulkLoadError) as context:
+            self._document_manager.load_all_documents(workers = 2)
+        self.assertEqual(list(context.exception.documents), [a_id])
+        self.assertEqual(list(context.exception.errors), [b_id])
+
+
+    def test_iter_documents(self):
+        for i in range(5):
+            generator.DocumentGenerator().generate_random_file('/tmp/edms/samples/f{}.pdf'.format(i))
+            self._document_manager.add_document(Document('Title {}'.format(i), 'Description', i % 2 + 1,
+                                                         ['/tmp/edms/samples/f{}.pdf'.format(i)], 'pdf'))
+        self.assertEqual([document_id for document_id, _ in self._document_manager.iter_documents(batch_size = 2)],
+                         [1, 2, 3, 4, 5])
+        touched = []
+
+        def written_by_second_author(document):
+            touched.append(document)
+            return document.author == 2
+
+        result = list(self._document_manager.iter_documents(filter = written_by_second_author))
+        self.assertEqual([(document_id, document.title) for document_id, document in result],
+                         [(2, 'Title 1'), (4, 'Title 3')])
+        self.assertNotIsInstance(result[0][1], LazyDocument)
+        with self.assertRaises(AttributeError):
+            Document._creation_date.__get__(touched[0])
+        with self.assertRaises(ValueError):
+            list(self._document_manager.iter_documents(batch_size = 0))
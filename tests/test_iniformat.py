@@ -0,0 +1,131 @@
+import os
+import shutil
+import unittest
+from os import makedirs
+
+from iniformat.cache import IniFileCache, FrozenDict, enable_cache, disable_cache, cached_read_ini_file
+from iniformat.reader import read_ini_file, parse_many, parse_ini_string, get_property
+from iniformat.writer import write_ini_file, group_commit, in_group_commit, ATOMIC_FILE_MODE
+
+
+class TestIniFormat(unittest.TestCase):
+    """Test the ini file reader and writer"""
+
+
+    def setUp(self):
+        makedirs('/tmp/edms/ini')
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def test_write_and_read(self):
+        data = {'first': {'a': '1', 'b': 'two words'}, 'second': {}}
+        write_ini_file('/tmp/edms/ini/data.ini', data)
+        self.assertEqual(read_ini_file('/tmp/edms/ini/data.ini'), data)
+
+
+    def test_value_with_equal_sign(self):
+        content = parse_ini_string('[section]\nformula = a=b+c\n')
+        self.assertEqual(content, {'section': {'formula': 'a=b+c'}})
+        self.assertEqual(get_property('key=x=y'), ('key', 'x=y'))
+        with self.assertRaises(ValueError):
+            get_property('no separator')
+
+
+    def test_lines_without_property_are_skipped(self):
+        content = parse_ini_string('[section]\ncomment line\n\n key = value \n[other]')
+        self.assertEqual(content, {'section': {'key': 'value'}, 'other': {}})
+
+
+    def test_property_before_section(self):
+        with self.assertRaises(KeyError):
+            parse_ini_string('key=value\n[section]\n')
+
+
+    def test_parse_many(self):
+        file_paths = []
+        for i in range(3):
+            file_path = '/tmp/edms/ini/{}.ini'.format(i)
+            write_ini_file(file_path, {'document': {'id': str(i)}})
+            file_paths.append(file_path)
+        self.assertEqual(parse_many(file_paths), [read_ini_file(file_path) for file_path in file_paths])
+
+
+    def test_cache_hits_and_misses(self):
+        write_ini_file('/tmp/edms/ini/data.ini', {'section': {'key': 'value'}})
+        cache = IniFileCache(capacity = 2)
+        first = cache.read('/tmp/edms/ini/data.ini')
+        second = cache.read('/tmp/edms/ini/data.ini')
+        self.assertIs(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        with open('/tmp/edms/ini/data.ini', 'a') as ini_file:
+            ini_file.write('[other]\n')
+        self.assertEqual(cache.read('/tmp/edms/ini/data.ini')['other'], {})
+        self.assertEqual(cache.statistics(), {'hits': 1, 'misses': 2, 'size': 1, 'capacity': 2})
+
+
+    def test_cache_is_read_only(self):
+        write_ini_file('/tmp/edms/ini/data.ini', {'section': {'key': 'value'}})
+        content = IniFileCache().read('/tmp/edms/ini/data.ini')
+        self.assertIsInstance(content['section'], FrozenDict)
+        with self.assertRaises(TypeError):
+            content['section']['key'] = 'other'
+        self.assertEqual(content.to_dict(), {'section': {'key': 'value'}})
+
+
+    def test_cache_eviction(self):
+        cache = IniFileCache(capacity = 2)
+        for i in range(3):
+            write_ini_file('/tmp/edms/ini/{}.ini'.format(i), {'section': {'id': str(i)}})
+            cache.read('/tmp/edms/ini/{}.ini'.format(i))
+        cache.read('/tmp/edms/ini/0.ini')
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+        cache.read('/tmp/edms/ini/2.ini')
+        self.assertEqual(cache.hits, 1)
+
+
+    def test_module_level_cache(self):
+        write_ini_file('/tmp/edms/ini/data.ini', {'section': {'key': 'value'}})
+        self.assertIsInstance(cached_read_ini_file('/tmp/edms/ini/data.ini'), dict)
+        cache = enable_cache(capacity = 4)
+        try:
+            cached_read_ini_file('/tmp/edms/ini/data.ini')
+            write_ini_file('/tmp/edms/ini/data.ini', {'section': {'key': 'other'}})
+            self.assertEqual(cached_read_ini_file('/tmp/edms/ini/data.ini')['section']['key'], 'other')
+            self.assertEqual(cache.misses, 2)
+        finally:
+            disable_cache()
+
+
+    def test_atomic_write(self):
+        write_ini_file('/tmp/edms/ini/data.ini', {'section': {'key': 'old'}})
+        write_ini_file('/tmp/edms/ini/data.ini', {'section': {'key': 'new'}}, atomic = True)
+        self.assertEqual(read_ini_file('/tmp/edms/ini/data.ini'), {'section': {'key': 'new'}})
+        self.assertEqual(os.listdir('/tmp/edms/ini'), ['data.ini'])
+
+
+    def test_atomic_write_permissions(self):
+        write_ini_file('/tmp/edms/ini/new.ini', {'section': {'key': 'new'}}, atomic = True)
+        self.assertEqual(os.stat('/tmp/edms/ini/new.ini').st_mode & 0o777, ATOMIC_FILE_MODE)
+        os.chmod('/tmp/edms/ini/new.ini', 0o600)
+        write_ini_file('/tmp/edms/ini/new.ini', {'section': {'key': 'newer'}}, atomic = True)
+        self.assertEqual(os.stat('/tmp/edms/ini/new.ini').st_mode & 0o777, 0o600)
+
+
+    def test_failed_atomic_write_keeps_the_old_file(self):
+        write_ini_file('/tmp/edms/ini/data.ini', {'section': {'key': 'old'}})
+        with self.assertRaises(TypeError):
+            write_ini_file('/tmp/edms/ini/data.ini', {'section': {None: 'new'}}, atomic = True)
+        self.assertEqual(read_ini_file('/tmp/edms/ini/data.ini'), {'section': {'key': 'old'}})
+
+
+    def test_group_commit(self):
+        with group_commit():
+            for i in range(3):
+                write_ini_file('/tmp/edms/ini/{}.ini'.format(i), {'section': {'id': str(i)}}, atomic = True)
+            self.assertTrue(in_group_commit())
+            self.assertEqual(read_ini_file('/tmp/edms/ini/2.ini'), {'section': {'id': '2'}})
+        self.assertFalse(in_group_commit())
+        self.assertEqual(sorted(os.listdir('/tmp/edms/ini')), ['0.ini', '1.ini', '2.ini'])
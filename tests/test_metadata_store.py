@@ -0,0 +1,132 @@
+import os
+import shutil
+import unittest
+from datetime import date
+from os import path, makedirs
+
+from docgen import generator
+from documents import Document
+from documents import DocumentManager
+from metadata_store import SQLiteMetadataStore, migrate, open_store
+from projects import Project, ProjectManager
+from repository import Repository
+from users import User, UserManager, RoleManager
+
+
+class TestSQLiteMetadataStore(unittest.TestCase):
+    """Test the SQLite metadata store"""
+
+
+    def setUp(self):
+        makedirs('/tmp/edms/documents')
+        makedirs('/tmp/edms/samples')
+        document_generator = generator.DocumentGenerator()
+        for name in ['a1.pdf', 'a2.pdf', 'b.doc']:
+            document_generator.generate_random_file('/tmp/edms/samples/{}'.format(name))
+        self._store = open_store('/tmp/edms/metadata.db')
+        self._document_manager = DocumentManager('/tmp/edms/documents', metadata_store = self._store)
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def test_wal_mode(self):
+        self.assertEqual(self._store._query('PRAGMA journal_mode')[0][0], 'wal')
+
+
+    def test_reopened_after_replace(self):
+        os.remove('/tmp/edms/metadata.db')
+        self.assertIsNot(open_store('/tmp/edms/metadata.db'), self._store)
+
+
+    def test_documents(self):
+        a = Document('Title A', 'description of A', [1, 2], ['/tmp/edms/samples/a1.pdf', '/tmp/edms/samples/a2.pdf'],
+                     'pdf')
+        b = Document('B', 'description of B', 2, ['/tmp/edms/samples/b.doc'], 'doc')
+        a_id, b_id = self._document_manager.add_documents([a, b])
+        self.assertFalse(path.exists(path.join('/tmp/edms/documents', str(a_id), '{}_document_metadata.edd'.format(
+            a_id))))
+        self.assertEqual(self._document_manager.count_documents(), 2)
+        self.assertEqual(self._document_manager.find_all_documents(), [a_id, b_id])
+        retrieved = self._document_manager.load_document(a_id)
+        self.assertEqual(retrieved.title, 'Title A')
+        self.assertEqual(retrieved.author, [1, 2])
+        self.assertEqual(retrieved.files, ['a1.pdf', 'a2.pdf'])
+        self.assertEqual([d.title for d in self._document_manager.find_documents_by_title('title a')], ['Title A'])
+        self.assertEqual([d.title for d in self._document_manager.find_documents_by_author(2)], ['Title A', 'B'])
+        self.assertEqual([d.title for d in self._document_manager.find_documents_by_format('doc')], ['B'])
+        self._document_manager.remove_document(a_id)
+        self.assertEqual([d.title for d in self._document_manager.find_documents_by_author(2)], ['B'])
+        self.assertEqual(self._document_manager.count_documents(), 1)
+
+
+    def test_transaction_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with self._store.transaction():
+                self._store.save_project(1, {'name': 'P', 'description': 'D', 'members': '[]', 'documents': '[]'})
+                raise RuntimeError()
+        self.assertEqual(self._store.project_ids(), [])
+
+
+class TestMigration(unittest.TestCase):
+    """Test the migration between the flat file and the SQLite backends"""
+
+
+    def setUp(self):
+        self._repository = Repository(location = '/tmp/edms')
+        makedirs('/tmp/edms/samples')
+        generator.DocumentGenerator().generate_random_file('/tmp/edms/samples/a1.pdf')
+        user_manager = self._repository._user_manager
+        self._user_id = user_manager.add_user(User('First', 'Family', date(1990, 12, 1), 'user@mail.com', '1234'))
+        user_manager.add_role(self._user_id, 'author')
+        self._document_id = self._repository._document_manager.add_document(
+            Document('Title', 'Description', self._user_id, ['/tmp/edms/samples/a1.pdf'], 'pdf'))
+        project_manager = ProjectManager('/tmp/edms/projects', user_manager)
+        self._project_id = project_manager.add_project(Project('Project', 'Description', [self._user_id]))
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def assert_repository_content(self):
+        user_manager = UserManager('/tmp/edms', '/tmp/edms/paths.ini')
+        document_manager = DocumentManager('/tmp/edms', '/tmp/edms/paths.ini')
+        project_manager = ProjectManager('/tmp/edms/projects', user_manager)
+        self.assertEqual(user_manager.find_all_users(), [self._user_id])
+        self.assertEqual(user_manager.find_user_by_id(self._user_id).email, 'user@mail.com')
+        self.assertEqual(user_manager.find_users_by_name('first fam'), [str(self._user_id)])
+        self.assertTrue(user_manager.has_role(self._user_id, 'author'))
+        self.assertEqual(document_manager.find_all_documents(), [self._document_id])
+        self.assertEqual(document_manager.load_document(self._document_id).author, self._user_id)
+        self.assertEqual([d.title for d in document_manager.find_documents_by_author(self._user_id)], ['Title'])
+        self.assertEqual(project_manager.load_projects_ids(), [self._project_id])
+        self.assertEqual(project_manager.load_project(self._project_id).name, 'Project')
+        self.assertEqual([user_id for user_id, _ in user_manager.iter_users()], [self._user_id])
+        self.assertEqual([document.title for _, document in document_manager.iter_documents()], ['Title'])
+        self.assertEqual([project.name for _, project in project_manager.iter_projects()], ['Project'])
+
+
+    def test_migrate_to_sqlite_and_back(self):
+        migrate('/tmp/edms', 'sqlite')
+        self.assertTrue(path.exists('/tmp/edms/metadata.db'))
+        self.assertFalse(path.exists(path.join('/tmp/edms/users', str(self._user_id))))
+        self.assertEqual(RoleManager.parse_roles_file('/tmp/edms/users/roles.txt'), {})
+        self.assert_repository_content()
+        user_manager = UserManager('/tmp/edms', '/tmp/edms/paths.ini')
+        self.assertEqual(user_manager.add_user(User('Second', 'Family', date(1991, 1, 1), 'second@mail.com', '1')),
+                         self._user_id + 1)
+        user_manager.remove_user(self._user_id + 1)
+
+        migrate('/tmp/edms', 'flat')
+        self.assertFalse(path.exists('/tmp/edms/metadata.db'))
+        self.assertTrue(path.exists(path.join('/tmp/edms/users', str(self._user_id))))
+        self.assertTrue(path.exists(path.join('/tmp/edms/documents', str(self._document_id),
+                                              '{}_document_metadata.edd'.format(self._document_id))))
+        self.assert_repository_content()
+
+
+    def test_migrate_to_current_backend(self):
+        with self.assertRaises(ValueError):
+            migrate('/tmp/edms', 'flat')
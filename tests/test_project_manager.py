@@ -3,7 +3,7 @@ import shutil
 import unittest
 
 from projects import Project
-from projects import ProjectManager
+from projects import ProjectManager, LazyProject
 from repository import Repository
 
 
@@ -108,3 +108,46 @@ class TestProjectManager(unittest.TestCase):
         self.assertEqual(len(result), 0)
         result = self._project_manager.find_projects_by_name('PROGRESS')
         self.assertEqual(len(result), 1)
+
+
+class TestProjectIterator(unittest.TestCase):
+    """Test the iteration over the projects"""
+
+
+    def setUp(self):
+        repo = Repository(location = '/tmp/edms')
+        self._project_manager = ProjectManager('/tmp/edms/projects', repo._user_manager)
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def test_iter_projects(self):
+        project_ids = [self._project_manager.add_project(Project('Project {}'.format(i), 'Description'))
+                       for i in range(5)]
+        self.assertEqual([project_id for project_id, _ in self._project_manager.iter_projects(batch_size = 2)],
+                         project_ids)
+        result = self._project_manager.iter_projects(filter = lambda project: project.name.endswith('3'))
+        self.assertEqual([(project_id, project.name) for project_id, project in result],
+                         [(project_ids[3], 'Project 3')])
+
+
+    def test_iter_projects_filters_lazy_projects(self):
+        project_ids = [self._project_manager.add_project(Project('Project {}'.format(i), 'Description'))
+                       for i in range(5)]
+        build_project = ProjectManager.build_project
+        built = []
+        ProjectManager.build_project = classmethod(lambda cls, project_data: built.append(project_data['name']) or
+                                                   build_project(project_data))
+        filtered = []
+        try:
+            result = list(self._project_manager.iter_projects(
+                filter = lambda project: filtered.append(project) or project.name == 'Project 1'))
+        finally:
+            ProjectManager.build_project = build_project
+        self.assertTrue(all(isinstance(project, LazyProject) for project in filtered))
+        self.assertEqual([project.project_id for project in filtered], project_ids)
+        self.assertEqual(built, ['Project 1'])
+        self.assertEqual([(project_id, type(project), project.description) for project_id, project in result],
+                         [(project_ids[1], Project, 'Description')])
@@ -0,0 +1,89 @@
+import os
+import shutil
+import unittest
+from os import makedirs
+
+from documents import Document
+from documents import DocumentManager, DocumentCatalog
+
+
+class TestDocumentSearch(unittest.TestCase):
+    """Test the full-text search of the documents"""
+
+
+    def setUp(self):
+        makedirs('/tmp/edms/documents')
+        makedirs('/tmp/edms/samples')
+        self._document_manager = DocumentManager('/tmp/edms/documents')
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def add_document(self, title, description, file_name, content):
+        file_path = '/tmp/edms/samples/{}'.format(file_name)
+        with open(file_path, 'w') as file_obj:
+            file_obj.write(content)
+        return self._document_manager.add_document(Document(title, description, 1, [file_path], 'txt'))
+
+
+    def test_search_fields(self):
+        title_id = self.add_document('Quarterly report', 'Numbers', 'a.txt', 'nothing here')
+        description_id = self.add_document('Notes', 'Quarterly numbers', 'b.txt', 'nothing here')
+        content_id = self.add_document('Minutes', 'Meeting', 'c.html', '<p>The quarterly plan</p>')
+        self.add_document('Other', 'Unrelated', 'd.txt', 'nothing here')
+        result = self._document_manager.search_documents('QUARTERLY')
+        self.assertEqual(result.total, 3)
+        self.assertEqual(result.document_ids, [title_id, description_id, content_id])
+        self.assertIn('[quarterly]', result.hits[2].snippet)
+
+
+    def test_all_keywords_must_match(self):
+        a_id = self.add_document('Budget plan', 'Draft', 'a.txt', 'for the year')
+        self.add_document('Budget', 'Final', 'b.txt', 'for the month')
+        self.assertEqual(self._document_manager.search_documents('budget year').document_ids, [a_id])
+        self.assertEqual(self._document_manager.search_documents('"budget" OR (*').document_ids, [])
+
+
+    def test_pagination(self):
+        for i in range(25):
+            self.add_document('Report {}'.format(i), 'Description', 'a{}.txt'.format(i), 'text')
+        first_page = self._document_manager.search_documents('report', page_size = 10)
+        last_page = self._document_manager.search_documents('report', page = 3, page_size = 10)
+        self.assertEqual(first_page.total, 25)
+        self.assertEqual(first_page.pages, 3)
+        self.assertTrue(first_page.has_next())
+        self.assertEqual(len(last_page.hits), 5)
+        self.assertFalse(last_page.has_next())
+        with self.assertRaises(ValueError):
+            self._document_manager.search_documents('report', page = 0)
+
+
+    def test_incremental_update(self):
+        document_id = self.add_document('Report', 'Description', 'a.txt', 'text')
+        self._document_manager.update_document(document_id, Document('Summary', 'Description', 1, [], 'txt'))
+        self.assertEqual(self._document_manager.search_documents('report').total, 0)
+        self.assertEqual(self._document_manager.search_documents('summary').document_ids, [document_id])
+        self._document_manager.remove_document(document_id)
+        self.assertEqual(self._document_manager.search_documents('summary').total, 0)
+
+
+    def test_documents_of_other_managers(self):
+        document_id = self.add_document('Report', 'Description', 'a.txt', 'text')
+        other_manager = DocumentManager('/tmp/edms/documents')
+        self.assertEqual(other_manager.search_documents('report').document_ids, [document_id])
+        self._document_manager.remove_document(document_id)
+        self.assertEqual(other_manager.search_documents('report').total, 0)
+
+
+    def test_index_does_not_change_the_documents_directory(self):
+        document_id = self.add_document('Report', 'Description', 'a.txt', 'text')
+        self._document_manager.search_documents('report')
+        self._document_manager._search_index.close()
+        directory_stamp = DocumentCatalog.file_stamp('/tmp/edms/documents')
+        self._document_manager.update_document(document_id, Document('Summary', 'Description', 1, [], 'txt'))
+        self.assertEqual(self._document_manager.search_documents('summary').document_ids, [document_id])
+        self._document_manager._search_index.close()
+        self.assertEqual(DocumentCatalog.file_stamp('/tmp/edms/documents'), directory_stamp)
+        self.assertFalse([name for name in os.listdir('/tmp/edms/documents') if name.startswith('search_index.db')])
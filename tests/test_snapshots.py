@@ -0,0 +1,195 @@
+import os
+import shutil
+import unittest
+import webbrowser
+from datetime import date, datetime
+
+import snapshots
+from repository import Repository
+from snapshots import SnapshotStore, CorruptSnapshotError
+from users import User
+
+
+class TestSnapshotStore(unittest.TestCase):
+    """Test the deduplicated backup store"""
+
+
+    def setUp(self):
+        os.makedirs('/tmp/edms/repository/documents')
+        os.makedirs('/tmp/edms/repository/logs')
+        self.write_file('documents/first.txt', 'first ' * 1000)
+        self.write_file('documents/copy.txt', 'first ' * 1000)
+        self.write_file('documents/picture.png', 'png' * 10)
+        self._store = SnapshotStore('/tmp/edms/store')
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def write_file(self, relative_path, content):
+        with open(os.path.join('/tmp/edms/repository', relative_path), 'wb') as data_file:
+            data_file.write(content)
+
+
+    def chunk_files(self):
+        return sorted(f for _, _, file_names in os.walk('/tmp/edms/store/chunks') for f in file_names)
+
+
+    def test_content_is_stored_once(self):
+        snapshot = self._store.create_snapshot('/tmp/edms/repository', 'first')
+        self.assertEqual(snapshot.files['documents/first.txt'][2], snapshot.files['documents/copy.txt'][2])
+        self.assertEqual(len(self.chunk_files()), 2)
+        self.assertEqual(snapshot.directories, ['documents', 'logs'])
+        self.write_file('documents/second.txt', 'second')
+        self._store.create_snapshot('/tmp/edms/repository', 'second')
+        self.assertEqual(len(self.chunk_files()), 3)
+        with self.assertRaises(ValueError):
+            self._store.create_snapshot('/tmp/edms/repository', 'second')
+        self.assertEqual(self._store.unique_name('second'), 'second_1')
+
+
+    def test_files_are_chunked(self):
+        chunk_size = snapshots.CHUNK_SIZE
+        snapshots.CHUNK_SIZE = 1000
+        try:
+            snapshot = self._store.create_snapshot('/tmp/edms/repository', 'first')
+        finally:
+            snapshots.CHUNK_SIZE = chunk_size
+        self.assertEqual(len(snapshot.files['documents/first.txt'][2]), 6)
+        with open(self._store.chunk_file(snapshot.files['documents/picture.png'][2][0]), 'rb') as chunk_file:
+            self.assertEqual(chunk_file.read(), snapshots.STORED_CHUNK + 'png' * 10)
+        self._store.restore_snapshot(snapshot, '/tmp/edms/restored')
+        with open('/tmp/edms/restored/documents/first.txt', 'rb') as data_file:
+            self.assertEqual(data_file.read(), 'first ' * 1000)
+
+
+    def test_unchanged_files_are_not_read(self):
+        self._store.create_snapshot('/tmp/edms/repository', 'first')
+        store_file = SnapshotStore._store_file
+        stored = []
+        SnapshotStore._store_file = lambda store, file_path, relative_path: \
+            stored.append(relative_path) or store_file(store, file_path, relative_path)
+        try:
+            self.write_file('documents/second.txt', 'second')
+            self._store.create_snapshot('/tmp/edms/repository', 'second')
+        finally:
+            SnapshotStore._store_file = store_file
+        self.assertEqual(stored, ['documents/second.txt'])
+
+
+    def test_restore(self):
+        mtime = os.stat('/tmp/edms/repository/documents/first.txt').st_mtime
+        snapshot = self._store.create_snapshot('/tmp/edms/repository', 'first')
+        self._store.restore_snapshot(snapshot, '/tmp/edms/restored')
+        with open('/tmp/edms/restored/documents/copy.txt', 'rb') as data_file:
+            self.assertEqual(data_file.read(), 'first ' * 1000)
+        self.assertAlmostEqual(os.stat('/tmp/edms/restored/documents/first.txt').st_mtime, mtime, places = 5)
+        self.assertTrue(os.path.isdir('/tmp/edms/restored/logs'))
+
+
+    def test_selective_restore(self):
+        snapshot = self._store.create_snapshot('/tmp/edms/repository', 'first')
+        os.remove('/tmp/edms/repository/documents/first.txt')
+        self.write_file('documents/copy.txt', 'changed')
+        os.makedirs('/tmp/edms/repository/logs/later')
+        self._store.restore_snapshot(snapshot, '/tmp/edms/repository', ['documents/first.txt'])
+        with open('/tmp/edms/repository/documents/first.txt', 'rb') as data_file:
+            self.assertEqual(data_file.read(), 'first ' * 1000)
+        with open('/tmp/edms/repository/documents/copy.txt', 'rb') as data_file:
+            self.assertEqual(data_file.read(), 'changed')
+        self._store.restore_snapshot(snapshot, '/tmp/edms/repository', ['logs'])
+        self.assertFalse(os.path.exists('/tmp/edms/repository/logs/later'))
+        with self.assertRaises(ValueError):
+            self._store.restore_snapshot(snapshot, '/tmp/edms/repository', ['documents/missing.txt'])
+
+
+    def test_corrupt_chunk(self):
+        snapshot = self._store.create_snapshot('/tmp/edms/repository', 'first')
+        with open(self._store.chunk_file(snapshot.files['documents/picture.png'][2][0]), 'wb') as chunk_file:
+            chunk_file.write(snapshots.STORED_CHUNK + 'gif')
+        with self.assertRaises(CorruptSnapshotError):
+            self._store.restore_snapshot(snapshot, '/tmp/edms/restored')
+        with self.assertRaises(CorruptSnapshotError):
+            self._store.restore_snapshot(snapshot, '/tmp/edms/repository')
+        with open('/tmp/edms/repository/documents/picture.png', 'rb') as data_file:
+            self.assertEqual(data_file.read(), 'png' * 10)
+        os.remove(self._store.chunk_file(snapshot.files['documents/picture.png'][2][0]))
+        with self.assertRaises(CorruptSnapshotError):
+            self._store.restore_snapshot(snapshot, '/tmp/edms/repository')
+        self.assertTrue(os.path.exists('/tmp/edms/repository/documents/first.txt'))
+
+
+    def test_garbage_collection(self):
+        self._store.create_snapshot('/tmp/edms/repository', 'first')
+        os.remove('/tmp/edms/repository/documents/picture.png')
+        self.write_file('documents/second.txt', 'second')
+        self._store.create_snapshot('/tmp/edms/repository', 'second')
+        self.assertEqual(self._store.collect_garbage(), (0, 0))
+        self.assertTrue(self._store.remove_snapshot('first'))
+        self.assertFalse(self._store.remove_snapshot('first'))
+        deleted_chunks, deleted_bytes = self._store.collect_garbage()
+        self.assertEqual(deleted_chunks, 1)
+        self.assertGreater(deleted_bytes, 0)
+        self.assertEqual(len(self.chunk_files()), 2)
+        self.write_file('documents/third.txt', 'third')
+        self._store.create_snapshot('/tmp/edms/repository', 'third')
+        self.write_file('documents/third.txt', 'changed')
+        self._store.create_snapshot('/tmp/edms/repository', 'fourth')
+        self._store.collect_garbage(keep = 1)
+        self.assertEqual([s.name for s in self._store.list_snapshots()], ['fourth'])
+        self.assertEqual(len(self.chunk_files()), 3)
+
+
+class TestDeduplicatedBackups(unittest.TestCase):
+    """Test the deduplicated backups of the repository"""
+
+
+    def setUp(self):
+        self._repository = Repository(location = '/tmp/edms/repository')
+        self._user_manager = self._repository._user_manager
+        self._backup_path = '/tmp/edms/backups'
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def add_user(self, name):
+        return self._user_manager.add_user(User(name, 'Family', date(1990, 12, 1), '{}@mail.com'.format(name.lower()),
+                                                '1234'))
+
+
+    def test_backup_and_restore(self):
+        a_id = self.add_user('A')
+        self._repository.create_backup('weekly', self._backup_path, deduplicated = True)
+        point_in_time = datetime.utcnow()
+        b_id = self.add_user('B')
+        self._repository.create_backup('weekly', self._backup_path, deduplicated = True)
+        store = SnapshotStore(self._backup_path)
+        self.assertEqual([s.name for s in store.list_snapshots()], ['weekly', 'weekly_1'])
+        self._repository.restore('weekly', self._backup_path)
+        self.assertTrue(os.path.exists('/tmp/edms/repository/users/{}'.format(a_id)))
+        self.assertFalse(os.path.exists('/tmp/edms/repository/users/{}'.format(b_id)))
+        self._repository.restore('weekly_1', self._backup_path)
+        self.assertTrue(os.path.exists('/tmp/edms/repository/users/{}'.format(b_id)))
+        self._repository.restore(backup_path = self._backup_path, point_in_time = point_in_time)
+        self.assertFalse(os.path.exists('/tmp/edms/repository/users/{}'.format(b_id)))
+        with self.assertRaises(ValueError):
+            self._repository.create_backup('weekly', self._backup_path, incremental = True, deduplicated = True)
+
+
+    def test_show_backup_info(self):
+        self.add_user('A')
+        self._repository.create_backup('weekly', self._backup_path, deduplicated = True)
+        opened = []
+        browser_open = webbrowser.open
+        webbrowser.open = lambda url: opened.append(url)
+        try:
+            self._repository.show_backup_info(os.path.join(self._backup_path, 'weekly'))
+        finally:
+            webbrowser.open = browser_open
+        self.assertEqual(len(opened), 1)
+        with open(opened[0]) as index_file:
+            self.assertIn('a@mail.com', index_file.read())
+        os.remove(opened[0])
@@ -0,0 +1,89 @@
+import os
+import shutil
+import unittest
+from os import makedirs
+
+from storage_utils import get_next_id, reserve_ids, IndexJournal, NEXT_ID_FILE_NAME, JOURNAL_LOCK_SUFFIX
+from users import UserIndex
+
+
+class TestStorageUtils(unittest.TestCase):
+    """Test the identifier allocation"""
+
+
+    def setUp(self):
+        makedirs('/tmp/edms/storage')
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def test_first_id(self):
+        self.assertEqual(get_next_id('/tmp/edms/storage'), 1)
+        self.assertEqual(get_next_id('/tmp/edms/storage'), 2)
+
+
+    def test_bootstrap_from_existing_directory(self):
+        for name in ['3', '7', 'roles.txt']:
+            makedirs(os.path.join('/tmp/edms/storage', name))
+        self.assertEqual(get_next_id('/tmp/edms/storage'), 8)
+        with open(os.path.join('/tmp/edms/storage', NEXT_ID_FILE_NAME)) as counter_file:
+            self.assertEqual(counter_file.read().strip(), '9')
+
+
+    def test_ids_are_not_reused(self):
+        first_id = get_next_id('/tmp/edms/storage')
+        makedirs(os.path.join('/tmp/edms/storage', str(first_id)))
+        os.rmdir(os.path.join('/tmp/edms/storage', str(first_id)))
+        self.assertEqual(get_next_id('/tmp/edms/storage'), first_id + 1)
+
+
+    def test_reserve_block_skips_existing_ids(self):
+        get_next_id('/tmp/edms/storage')
+        makedirs('/tmp/edms/storage/3')
+        self.assertEqual(reserve_ids('/tmp/edms/storage', 4), [2, 4, 5, 6])
+        self.assertEqual(get_next_id('/tmp/edms/storage'), 7)
+
+
+class TestIndexJournal(unittest.TestCase):
+    """Test the journal of the indexes"""
+
+
+    def setUp(self):
+        makedirs('/tmp/edms/storage')
+        self._entries = dict()
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def replay(self, record):
+        self._entries[record['id']] = record
+
+
+    def reset(self):
+        self._entries.clear()
+
+
+    def test_rewrite_is_locked_and_leaves_no_temporary_file(self):
+        journal = IndexJournal('/tmp/edms/storage/journal.jsonl')
+        journal.append([{'id': 1}, {'id': 2}], self.replay, self.reset)
+        with journal.locked():
+            with journal.locked():
+                journal.rewrite([{'id': 2}], self.replay, self.reset)
+        self.assertEqual(self._entries, {2: {'id': 2}})
+        self.assertEqual(sorted(os.listdir('/tmp/edms/storage')), ['journal.jsonl', 'journal.jsonl' + JOURNAL_LOCK_SUFFIX])
+
+
+    def test_compaction_keeps_lines_of_other_writers(self):
+        for user_id in [1, 2]:
+            with open(os.path.join('/tmp/edms/storage', str(user_id)), 'w') as user_file:
+                user_file.write('User\nFamily\n1990-12-01\nuser@mail.com\n1234\n')
+        first = UserIndex('/tmp/edms/storage')
+        second = UserIndex('/tmp/edms/storage')
+        first.add(1, ('A', 'Family', '1990-12-01', 'a@mail.com', '1234'))
+        second.add(2, ('B', 'Family', '1990-12-01', 'b@mail.com', '1234'))
+        first.compact()
+        self.assertEqual(UserIndex('/tmp/edms/storage').find_by_name('family'), set([1, 2]))
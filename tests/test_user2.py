@@ -27,3 +27,15 @@ class TestUser(unittest.TestCase):
     def test_email_validation(self):
         with self.assertRaises(ValueError):
             user = User('First', 'Family', date(1990, 12, 1), 'user.mail.com', '1234')
+
+
+    def test_trusted_creation(self):
+        user = User.trusted('First', 'Family', date(1990, 12, 1), 'user@mail.com', '1234')
+        self.assertIsInstance(user, User)
+        self.assertEqual(str(user), str(User('First', 'Family', date(1990, 12, 1), 'user@mail.com', '1234')))
+
+
+    def test_password_validation(self):
+        self.assertTrue(User.is_valid_password('1234'))
+        self.assertTrue(User.is_valid_password(['1', '2']))
+        self.assertFalse(User.is_valid_password(u'1234'))
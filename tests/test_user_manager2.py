@@ -1,6 +1,7 @@
 import shutil
 import unittest
 from datetime import date
+from os import path, utime
 
 from repository import Repository
 from users import User
@@ -154,3 +155,71 @@ class TestUserManager(unittest.TestCase):
         self.assertEqual(len(result), 1)
         result = self._user_manager.find_users_by_email('postfix')
         self.assertEqual(len(result), 0)
+
+
+    def test_find_users_by_exact_email(self):
+        a = User('Alexander', 'Hughes', date(1990, 12, 1), 'a.hughes@mail.com', '1234')
+        b = User('Bruce', 'Butler', date(1990, 12, 2), 'hughes@mail.com', '****')
+        user_ids = [self._user_manager.add_user(user) for user in [a, b]]
+        self.assertEqual(self._user_manager.find_users_by_exact_email('HUGHES@mail.com'), [str(user_ids[1])])
+        self.assertEqual(self._user_manager.find_users_by_exact_email('mail.com'), [])
+
+
+    def test_user_index_is_persisted(self):
+        a = User('Alexander', 'Hughes', date(1990, 12, 1), 'a.hughes@mail.com', '1234')
+        b = User('Bruce', 'Butler', date(1990, 12, 2), 'brrr@mail.org', '****')
+        user_ids = [self._user_manager.add_user(user) for user in [a, b]]
+        self.assertTrue(path.exists('/tmp/edms/users/.user_index.jsonl'))
+        user_manager = Repository(location = '/tmp/edms')._user_manager
+        self.assertEqual(user_manager.find_users_by_name('butler'), [str(user_ids[1])])
+        self.assertEqual(user_manager.find_users_by_email('hughes'), [str(user_ids[0])])
+
+
+    def test_user_index_follows_changes(self):
+        a = User('Alexander', 'Hughes', date(1990, 12, 1), 'a.hughes@mail.com', '1234')
+        user_id = self._user_manager.add_user(a)
+        self.assertEqual(self._user_manager.find_users_by_name('Hughes'), [str(user_id)])
+        self._user_manager.remove_user(user_id)
+        self.assertEqual(self._user_manager.find_users_by_name('Hughes'), [])
+        with open('/tmp/edms/users/100', 'w') as user_file:
+            user_file.write('Bruce\nButler\n1990-12-02\nbrrr@mail.org\n****\n')
+        utime('/tmp/edms/users', (0, 0))
+        self.assertEqual(self._user_manager.find_users_by_name('Butler'), ['100'])
+
+
+    def test_load_users(self):
+        a = User('Alexander', 'Hughes', date(1990, 12, 1), 'a.hughes@mail.com', '1234')
+        b = User('Bruce', 'Butler', date(1990, 12, 2), 'brrr@mail.org', '****')
+        user_ids = [self._user_manager.add_user(user) for user in [a, b]]
+        for workers in [None, 4]:
+            users = self._user_manager.load_users(user_ids, workers = workers)
+            self.assertEqual(sorted(users), user_ids)
+            self.assertEqual(users[user_ids[1]].email, 'brrr@mail.org')
+        with self.assertRaises(ValueError):
+            self._user_manager.load_users(user_ids + [100])
+
+
+    def test_load_users_cache(self):
+        user_id = self._user_manager.add_user(User('Alexander', 'Hughes', date(1990, 12, 1), 'a@mail.com', '1234'))
+        user = self._user_manager.load_users([user_id])[user_id]
+        self.assertIs(self._user_manager.find_user_by_id(user_id), user)
+        self._user_manager.update_user(user_id, User('Alexander', 'Hughes', date(1990, 12, 1), 'b@mail.com', '1234'))
+        self.assertEqual(self._user_manager.load_users([user_id])[user_id].email, 'b@mail.com')
+
+
+    def test_iter_users(self):
+        a = User('Alexander', 'Hughes', date(1990, 12, 1), 'a.hughes@mail.com', '1234')
+        b = User('Bruce', 'Butler', date(1980, 12, 2), 'brrr@mail.org', '****')
+        c = User('Cheryl', 'Parker', date(1970, 12, 3), 'cheryl576@mail.gov', 'admin')
+        user_ids = [self._user_manager.add_user(user) for user in [a, b, c]]
+        self.assertEqual([user_id for user_id, _ in self._user_manager.iter_users(batch_size = 2)], user_ids)
+        result = list(self._user_manager.iter_users(filter = lambda user: user.birth.year < 1985))
+        self.assertEqual([(user_id, user.email) for user_id, user in result],
+                         [(user_ids[1], 'brrr@mail.org'), (user_ids[2], 'cheryl576@mail.gov')])
+
+
+    def test_iter_users_filter_gets_unvalidated_users(self):
+        user_id = self._user_manager.add_user(User('Alexander', 'Hughes', date(1990, 12, 1), 'a@mail.com', '1234'))
+        with open('/tmp/edms/users/{}'.format(user_id), 'w') as user_file:
+            user_file.write('Alexander\nHughes\n1990-12-01\nnot an email\n1234\n')
+        self.assertEqual(list(self._user_manager.iter_users(filter = lambda user: user.first_name == 'Bruce')), [])
@@ -1,10 +1,15 @@
+import fcntl
 import os
 import shutil
 import unittest
 from datetime import date
+from json import dumps, loads
 
 from repository import Repository
-from users import User
+from iniformat.reader import read_ini_file
+from iniformat.writer import write_ini_file
+from storage_utils import JOURNAL_LOCK_SUFFIX
+from users import User, Role, RoleManager, ADD_ROLE, REMOVE_ROLE
 
 
 class TestUserRoles(unittest.TestCase):
@@ -241,3 +246,184 @@ class TestUserRoles(unittest.TestCase):
         self.assertEqual(len(admins), 0)
         self.assertEqual(len(authors), 2)
         self.assertEqual(len(reviewers), 2)
+
+
+    def test_roles_file_is_parsed_once(self):
+        user_id = self._user_manager.add_user(User('First', 'Family', date(1990, 12, 1), 'user@mail.com', '1234'))
+        self._user_manager.add_role(user_id, 'author')
+        parse_roles_file = RoleManager.parse_roles_file
+        parsed_files = []
+
+        def counting_parse_roles_file(roles_file):
+            parsed_files.append(roles_file)
+            return parse_roles_file(roles_file)
+
+        RoleManager.parse_roles_file = staticmethod(counting_parse_roles_file)
+        try:
+            for i in range(10):
+                self.assertTrue(self._user_manager.has_role(user_id, 'author'))
+                self.assertEqual(self._user_manager.list_users_by_role(), {'author': [user_id]})
+        finally:
+            RoleManager.parse_roles_file = parse_roles_file
+        self.assertEqual(parsed_files, [])
+
+
+    def test_modified_roles_file_is_reloaded(self):
+        a_id = self._user_manager.add_user(User('A', 'Family', date(1990, 12, 1), 'a@mail.com', '1234'))
+        b_id = self._user_manager.add_user(User('B', 'Family', date(1990, 12, 2), 'b@mail.com', '1234'))
+        self._user_manager.add_role(a_id, 'author')
+        self.assertEqual([user.first_name for user in self._user_manager.find_users_by_role('author')], ['A'])
+        with open(self._role_path, 'w') as role_file:
+            role_file.write('{}: author\n{}: author,reviewer\n'.format(a_id, b_id))
+        self.assertEqual([user.first_name for user in self._user_manager.find_users_by_role('author')], ['A', 'B'])
+        self.assertTrue(self._user_manager.has_role(b_id, 'reviewer'))
+        self.assertEqual(self._user_manager.list_users_by_role(), {'author': [a_id, b_id], 'reviewer': [b_id]})
+
+
+    def test_apply_role_changes(self):
+        a_id = self._user_manager.add_user(User('A', 'Family', date(1990, 12, 1), 'a@mail.com', '1234'))
+        b_id = self._user_manager.add_user(User('B', 'Family', date(1990, 12, 2), 'b@mail.com', '1234'))
+        self._user_manager.add_role(a_id, 'author')
+        write_roles = RoleManager.write_roles
+        written_roles = []
+
+        def counting_write_roles(role_manager, users_roles):
+            written_roles.append(users_roles)
+            write_roles(role_manager, users_roles)
+
+        RoleManager.write_roles = counting_write_roles
+        try:
+            changes = [(ADD_ROLE, a_id, 'author'), (ADD_ROLE, a_id, 'reviewer'), (ADD_ROLE, b_id, 'manager'),
+                       (REMOVE_ROLE, a_id, 'author'), (REMOVE_ROLE, b_id, 'admin')]
+            no_op_changes = self._user_manager.apply_role_changes(changes)
+        finally:
+            RoleManager.write_roles = write_roles
+        self.assertEqual(no_op_changes, [(ADD_ROLE, a_id, 'author'), (REMOVE_ROLE, b_id, 'admin')])
+        self.assertEqual(len(written_roles), 1)
+        self.assertEqual(self._user_manager.list_users_by_role(), {'reviewer': [a_id], 'manager': [b_id]})
+        self.assertEqual(RoleManager.parse_roles_file(self._role_path)[a_id], [Role('reviewer')])
+
+
+    def test_apply_role_changes_is_validated_first(self):
+        user_id = self._user_manager.add_user(User('A', 'Family', date(1990, 12, 1), 'a@mail.com', '1234'))
+        for changes in [[(ADD_ROLE, user_id, 'author'), (ADD_ROLE, user_id, 'invalid')],
+                        [(ADD_ROLE, user_id, 'author'), (ADD_ROLE, 10, 'author')],
+                        [(ADD_ROLE, user_id, 'author'), ('grant', user_id, 'author')]]:
+            with self.assertRaises(ValueError):
+                self._user_manager.apply_role_changes(changes)
+        self.assertEqual(self._user_manager.list_users_by_role(), {})
+        self.assertEqual(self._user_manager.apply_role_changes([(REMOVE_ROLE, user_id, 'author')]),
+                         [(REMOVE_ROLE, user_id, 'author')])
+
+
+    def test_removing_one_of_the_roles(self):
+        user_id = self._user_manager.add_user(User('A', 'Family', date(1990, 12, 1), 'a@mail.com', '1234'))
+        self._user_manager.add_role(user_id, 'author')
+        self._user_manager.add_role(user_id, 'reviewer')
+        self._user_manager.remove_role(user_id, 'author')
+        self.assertFalse(self._user_manager.has_role(user_id, 'author'))
+        self.assertTrue(self._user_manager.has_role(user_id, 'reviewer'))
+
+
+class TestRolesJournal(unittest.TestCase):
+    """Test the journal storage of the user roles"""
+
+
+    def setUp(self):
+        repo = Repository(location = '/tmp/edms', roles_file_type = 'json', roles_storage = 'journal')
+        self._user_manager = repo._user_manager
+        self._role_path = '/tmp/edms/users/roles.json'
+        self._journal_path = '/tmp/edms/users/.roles_journal.jsonl'
+        self._a_id = self._user_manager.add_user(User('A', 'Family', date(1990, 12, 1), 'a@mail.com', '1234'))
+        self._b_id = self._user_manager.add_user(User('B', 'Family', date(1990, 12, 2), 'b@mail.com', '1234'))
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def test_changes_are_appended(self):
+        self._user_manager.add_role(self._a_id, 'author')
+        self._user_manager.apply_role_changes([(ADD_ROLE, self._b_id, 'admin'), (REMOVE_ROLE, self._a_id, 'author'),
+                                               (ADD_ROLE, self._a_id, 'reviewer')])
+        self.assertEqual(os.path.getsize(self._role_path), 0)
+        with open(self._journal_path) as journal:
+            self.assertEqual([loads(line) for line in journal][1:],
+                             [{'user': self._b_id, 'action': ADD_ROLE, 'role': 'admin'},
+                              {'user': self._a_id, 'action': REMOVE_ROLE, 'role': 'author'},
+                              {'user': self._a_id, 'action': ADD_ROLE, 'role': 'reviewer'}])
+        self.assertTrue(self._user_manager.has_role(self._a_id, 'reviewer'))
+        self.assertFalse(self._user_manager.has_role(self._a_id, 'author'))
+        role_manager = RoleManager('/tmp/edms', '/tmp/edms/paths.ini')
+        self.assertEqual(role_manager.users_by_role(), {'admin': [self._b_id], 'reviewer': [self._a_id]})
+
+
+    def test_compaction(self):
+        self._user_manager.add_role(self._b_id, 'admin')
+        for i in range(1001):
+            self._user_manager.apply_role_changes([(REMOVE_ROLE if i % 2 else ADD_ROLE, self._a_id, 'author')])
+        with open(self._journal_path) as journal:
+            self.assertLess(len(journal.readlines()), 1000)
+        self.assertEqual(RoleManager.parse_roles_file(self._role_path)[self._b_id], [Role('admin')])
+        self.assertEqual(self._user_manager.list_users_by_role(), {'admin': [self._b_id], 'author': [self._a_id]})
+        self._user_manager._role_manager.compact()
+        self.assertEqual(os.path.getsize(self._journal_path), 0)
+        self.assertEqual(RoleManager.parse_roles_file(self._role_path),
+                         {self._a_id: [Role('author')], self._b_id: [Role('admin')]})
+
+
+    def test_switching_to_file_storage_folds_the_journal(self):
+        self._user_manager.add_role(self._a_id, 'manager')
+        paths = read_ini_file('/tmp/edms/paths.ini')
+        paths['roles']['storage'] = 'file'
+        write_ini_file('/tmp/edms/paths.ini', paths)
+        role_manager = RoleManager('/tmp/edms', '/tmp/edms/paths.ini')
+        self.assertFalse(os.path.exists(self._journal_path))
+        self.assertEqual(RoleManager.parse_roles_file(self._role_path), {self._a_id: [Role('manager')]})
+        self.assertEqual(role_manager.users_with_role('manager'), [self._a_id])
+
+
+    def test_changes_of_other_managers_are_kept(self):
+        first = RoleManager('/tmp/edms', '/tmp/edms/paths.ini')
+        second = RoleManager('/tmp/edms', '/tmp/edms/paths.ini')
+        first.apply_changes([(ADD_ROLE, self._a_id, 'author')])
+        second.apply_changes([(ADD_ROLE, self._a_id, 'reviewer')])
+        first.apply_changes([(ADD_ROLE, self._b_id, 'admin')])
+        first.compact()
+        second.apply_changes([(REMOVE_ROLE, self._a_id, 'author')])
+        self.assertEqual(RoleManager('/tmp/edms', '/tmp/edms/paths.ini').users_by_role(),
+                         {'admin': [self._b_id], 'reviewer': [self._a_id]})
+        self.assertEqual(first.users_by_role(), {'admin': [self._b_id], 'reviewer': [self._a_id]})
+
+
+    def test_legacy_records_are_replayed(self):
+        with open(self._journal_path, 'a') as journal:
+            journal.write(dumps({'user': self._a_id, 'roles': ['author', 'admin']}) + '\n')
+            journal.write(dumps({'user': self._a_id, 'action': REMOVE_ROLE, 'role': 'admin'}) + '\n')
+        self.assertEqual(RoleManager('/tmp/edms', '/tmp/edms/paths.ini').user_roles(self._a_id), [Role('author')])
+
+
+    def test_compaction_holds_the_journal_lock(self):
+        role_manager = self._user_manager._role_manager
+        role_manager.apply_changes([(ADD_ROLE, self._a_id, 'author')])
+        journal = role_manager._journal
+        rewrite = journal.rewrite
+        locked = []
+
+        def checked_rewrite(records, replay, reset):
+            with open(journal.journal_file + JOURNAL_LOCK_SUFFIX, 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    locked.append(False)
+                except IOError:
+                    locked.append(True)
+            return rewrite(records, replay, reset)
+
+        journal.rewrite = checked_rewrite
+        try:
+            role_manager.compact()
+        finally:
+            journal.rewrite = rewrite
+        self.assertEqual(locked, [True])
+        self.assertEqual(RoleManager.parse_roles_file(self._role_path)[self._a_id], [Role('author')])
@@ -0,0 +1,136 @@
+import os
+import shutil
+import unittest
+from datetime import date
+
+import user_shards
+from repository import Repository
+from user_shards import ShardedUserStore, SHARD_SIZE
+from users import User
+
+
+class TestShardedUserStore(unittest.TestCase):
+    """Test the sharded record files of the users"""
+
+
+    def setUp(self):
+        self._store = ShardedUserStore('/tmp/edms/shards')
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def test_write_and_read(self):
+        self._store.write(1, ('First', 'Family', '1990-12-01', 'first@mail.com', '1234'))
+        self._store.write(SHARD_SIZE + 2, ('Second', 'Family', '1991-01-01', 'second@mail.com', 'abcd'))
+        self.assertEqual(self._store.read(1), ('First', 'Family', '1990-12-01', 'first@mail.com', '1234'))
+        self.assertEqual(self._store.read(SHARD_SIZE + 2)[0], 'Second')
+        self.assertIsNone(self._store.read(2))
+        self.assertEqual(self._store.user_ids(), [1, SHARD_SIZE + 2])
+        self.assertEqual(self._store.shards(), [0, 1])
+
+
+    def test_update_and_delete(self):
+        self._store.write(1, ('First', 'Family', '1990-12-01', 'first@mail.com', '1234'))
+        self._store.write(1, ('First', 'Family', '1990-12-01', 'new@mail.com', '1234'))
+        self.assertEqual(self._store.read(1)[3], 'new@mail.com')
+        self.assertTrue(self._store.delete(1))
+        self.assertFalse(self._store.delete(1))
+        self.assertFalse(self._store.contains(1))
+        self.assertIsNone(self._store.read(1))
+        with open(self._store.record_file(0)) as record_file:
+            self.assertEqual(len(record_file.readlines()), 3)
+
+
+    def test_compaction(self):
+        garbage_limit = user_shards.COMPACTION_MIN_GARBAGE
+        user_shards.COMPACTION_MIN_GARBAGE = 0
+        try:
+            self._store.write(1, ('First', 'Family', '1990-12-01', 'first@mail.com', '1234'))
+            self._store.write(2, ('Second', 'Family', '1991-01-01', 'second@mail.com', 'abcd'))
+            for i in range(10):
+                self._store.write(1, ('First', 'Family', '1990-12-01', 'first{}@mail.com'.format(i), '1234'))
+        finally:
+            user_shards.COMPACTION_MIN_GARBAGE = garbage_limit
+        with open(self._store.record_file(0)) as record_file:
+            self.assertLessEqual(len(record_file.readlines()), 3)
+        self.assertEqual(self._store.read(1)[3], 'first9@mail.com')
+        self.assertEqual(self._store.read(2)[3], 'second@mail.com')
+
+
+    def test_stale_index_is_rebuilt(self):
+        self._store.write(1, ('First', 'Family', '1990-12-01', 'first@mail.com', '1234'))
+        self._store.write(2, ('Second', 'Family', '1991-01-01', 'second@mail.com', 'abcd'))
+        self._store.delete(1)
+        # A compacted record file with the old index, as if the compaction was interrupted.
+        with open(self._store.record_file(0)) as record_file:
+            lines = record_file.readlines()
+        with open(self._store.record_file(0), 'w') as record_file:
+            record_file.write(lines[1])
+        self.assertEqual(self._store.read(2)[0], 'Second')
+        self.assertIsNone(self._store.read(1))
+
+
+    def test_missing_or_truncated_index_is_rebuilt(self):
+        self._store.write(1, ('First', 'Family', '1990-12-01', 'first@mail.com', '1234'))
+        self._store.write(2, ('Second', 'Family', '1991-01-01', 'second@mail.com', 'abcd'))
+        os.remove(self._store.index_file(0))
+        self.assertEqual(ShardedUserStore('/tmp/edms/shards').user_ids(), [1, 2])
+        with open(self._store.index_file(0), 'r+b') as index_file:
+            index_file.truncate(os.path.getsize(self._store.index_file(0)) - 1)
+        self.assertEqual(self._store.read(2)[0], 'Second')
+        with open(self._store.index_file(0), 'wb') as index_file:
+            index_file.write('EUI')
+        self.assertTrue(ShardedUserStore('/tmp/edms/shards').contains(1))
+        os.remove(self._store.index_file(0))
+        self._store.write(3, ('Third', 'Family', '1992-01-01', 'third@mail.com', 'abcd'))
+        self.assertEqual(self._store.user_ids(), [1, 2, 3])
+
+
+class TestShardedUserManager(unittest.TestCase):
+    """Test the user manager with the sharded layout"""
+
+
+    def setUp(self):
+        repo = Repository(location = '/tmp/edms', users_storage = 'sharded')
+        self._user_manager = repo._user_manager
+
+
+    def tearDown(self):
+        shutil.rmtree('/tmp/edms')
+
+
+    def test_users_are_packed(self):
+        a_id = self._user_manager.add_user(User('A', 'Family', date(1990, 12, 1), 'a@mail.com', '1234'))
+        b_id = self._user_manager.add_user(User('B', 'Family', date(1990, 12, 2), 'b@mail.com', '1234'))
+        self.assertFalse(os.path.exists('/tmp/edms/users/{}'.format(a_id)))
+        self.assertEqual(self._user_manager.find_all_users(), [a_id, b_id])
+        self.assertEqual(self._user_manager.find_user_by_id(b_id).first_name, 'B')
+        self.assertEqual(self._user_manager.find_users_by_email('b@mail'), [str(b_id)])
+        self._user_manager.remove_user(a_id)
+        self.assertEqual(self._user_manager.count_users(), 1)
+        with self.assertRaises(ValueError):
+            self._user_manager.find_user_by_id(a_id)
+
+
+    def test_user_files_are_readable(self):
+        with open('/tmp/edms/users/7', 'w') as user_file:
+            user_file.write('Old\nFamily\n1980-01-01\nold@mail.com\n1234\n')
+        self.assertEqual(self._user_manager.find_user_by_id(7).first_name, 'Old')
+        new_id = self._user_manager.add_user(User('New', 'Family', date(1990, 12, 1), 'new@mail.com', '1234'))
+        self.assertEqual(new_id, 8)
+        self.assertEqual(self._user_manager.find_all_users(), [7, 8])
+        self._user_manager.update_user(7, User('Old', 'Family', date(1980, 1, 1), 'changed@mail.com', '1234'))
+        self.assertFalse(os.path.exists('/tmp/edms/users/7'))
+        self.assertEqual(self._user_manager.find_user_by_id(7).email, 'changed@mail.com')
+
+
+    def test_pack_user_files(self):
+        for user_id in [3, 4]:
+            with open('/tmp/edms/users/{}'.format(user_id), 'w') as user_file:
+                user_file.write('Old\nFamily\n1980-01-01\nold{}@mail.com\n1234\n'.format(user_id))
+        self.assertEqual(self._user_manager.pack_user_files(), 2)
+        self.assertFalse(os.path.exists('/tmp/edms/users/3'))
+        self.assertEqual([user.email for user in self._user_manager.load_users([3, 4]).itervalues()],
+                         ['old3@mail.com', 'old4@mail.com'])
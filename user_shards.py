@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+"""Sharded record files of the users
+
+The users are packed into record files instead of one file per user. The users with the IDs from ``n * SHARD_SIZE``
+to ``(n + 1) * SHARD_SIZE - 1`` belong to the ``n``-th shard, a shard is stored in two files of the shards directory:
+
+    users_<n>.dat   the records of the users, one JSON list per line: [user ID, first name, family name, birth date,
+                    email address, password], the record of a deleted user (tombstone) is [user ID]
+    users_<n>.idx   the offset index: a header with the number of the garbage bytes of the record file, followed by a
+                    fixed width (offset, length) entry per user ID, a zero length means there is no such user
+
+The record files are append-only: a saved user is appended and it's index entry is overwritten, so a read or a write is
+O(1). The superseded records and the tombstones are garbage, a shard is compacted (the live records are copied to a new
+record file) when more than half of it's record file is garbage. The writers are serialized by a lock file. A record
+read through the index is checked (it must be a record of the requested user), an index which doesn't match the record
+file (e.g. after a crash during a compaction) is rebuilt from the record file. A missing index, an index with an invalid
+header or an index truncated in the middle of an entry is rebuilt too, if the record file of the shard exists.
+"""
+
+# Imports -----------------------------------------------------------------------------------------------------------
+import logging
+import os
+import struct
+from contextlib import contextmanager
+from json import dumps, loads
+from threading import RLock
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Authorship information  -------------------------------------------------------------------------------------------
+__author__ = "Zsolt Bokor Levente"
+__copyright__ = "Copyright 2016, Morgan Stanley - Training 360 Project"
+__credits__ = __author__
+__version__ = "1.0.0"
+__maintainer__ = __author__
+__email__ = ["bokor.zsolt5@gmail.com", "bokorzsolt@yahoo.com"]
+__status__ = "Development"
+
+# -------------------------------------------------------------------------------------------------------------------
+
+SHARDS_DIRECTORY_NAME = '.shards'
+SHARD_SIZE = 4096
+RECORD_FILE_NAME_FORMAT = 'users_{}.dat'
+INDEX_FILE_NAME_FORMAT = 'users_{}.idx'
+LOCK_FILE_NAME = '.lock'
+INDEX_HEADER = struct.Struct('<4sQ')
+INDEX_MAGIC = 'EUIX'
+INDEX_ENTRY = struct.Struct('<QI')
+COMPACTION_MIN_GARBAGE = 64 * 1024
+module_logger = logging.getLogger('repository.user_shards')
+
+
+class CorruptShardError(Exception):
+    """
+    This exception is raised when a record read through the offset index doesn't belong to the requested user.
+    """
+    pass
+
+
+class ShardedUserStore(object):
+    """Stores the fields of the users in sharded record files with offset indexes.
+
+    The :py:class:ShardedUserStore is defined by the :py:attr:location of the shards directory.
+    """
+
+    def __init__(self, location):
+        """
+        Initialisation of a new :py:class:ShardedUserStore object, the shards directory is created if it's missing.
+
+        :param location: The path of the shards directory.
+        """
+        self._location = location
+        self._lock = RLock()
+        self._lock_depth = 0
+        self._valid_indexes = dict()
+        if not os.path.isdir(location):
+            os.makedirs(location)
+
+    @property
+    def location(self):
+        """
+        The property of the :py:attr:_location attribute.
+
+        :return: The path of the shards directory.
+        """
+        return self._location
+
+    def record_file(self, shard):
+        """
+        :param shard: The number of the shard.
+        :return: The path of the record file of the shard.
+        """
+        return os.path.join(self._location, RECORD_FILE_NAME_FORMAT.format(shard))
+
+    def index_file(self, shard):
+        """
+        :param shard: The number of the shard.
+        :return: The path of the offset index of the shard.
+        """
+        return os.path.join(self._location, INDEX_FILE_NAME_FORMAT.format(shard))
+
+    @contextmanager
+    def _locked(self):
+        """
+        Holds the lock of the writers of the shards, the lock file is locked only by the outermost holder (a second
+        flock on a new descriptor of the same file would block).
+
+        :return:
+        """
+        with self._lock:
+            if self._lock_depth > 0:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(os.path.join(self._location, LOCK_FILE_NAME), 'a') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+                    if fcntl:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    @classmethod
+    def _read_at(cls, file_path, offset, length):
+        """
+        Reads a part of a file.
+
+        :param file_path: The path of the file.
+        :param offset: The position of the first byte.
+        :param length: The number of bytes to read.
+        :return: The bytes read, it's shorter than ``length`` at the end of the file or empty if the file is missing.
+        """
+        try:
+            with open(file_path, 'rb') as data_file:
+                data_file.seek(offset)
+                return data_file.read(length)
+        except IOError:
+            return ''
+
+    def _index_is_valid(self, shard):
+        """
+        Checks the header and the length of the offset index of a shard. The result is cached by the inode and the size
+        of the index, so the header is read again only if the index was changed.
+
+        :param shard: The number of the shard.
+        :return: Bool, FALSE if the index is missing, it's header is invalid or it ends in the middle of an entry.
+        """
+        try:
+            index_stat = os.stat(self.index_file(shard))
+        except OSError:
+            return False
+        index_stamp = (index_stat.st_ino, index_stat.st_size)
+        if self._valid_indexes.get(shard) == index_stamp:
+            return True
+        if index_stat.st_size < INDEX_HEADER.size or (index_stat.st_size - INDEX_HEADER.size) % INDEX_ENTRY.size:
+            return False
+        header = ShardedUserStore._read_at(self.index_file(shard), 0, INDEX_HEADER.size)
+        if len(header) < INDEX_HEADER.size or INDEX_HEADER.unpack(header)[0] != INDEX_MAGIC:
+            return False
+        self._valid_indexes[shard] = index_stamp
+        return True
+
+    def _check_index(self, shard):
+        """
+        Rebuilds the offset index of a shard if it's invalid (see :py:meth:_index_is_valid) and the record file of the
+        shard exists, otherwise the users of the shard would be missing.
+
+        :param shard: The number of the shard.
+        :return:
+        """
+        if self._index_is_valid(shard) or not os.path.exists(self.record_file(shard)):
+            return
+        with self._locked():
+            if not self._index_is_valid(shard) and os.path.exists(self.record_file(shard)):
+                self.rebuild_index(shard)
+
+    def _index_entry(self, user_id):
+        """
+        Reads the index entry of a user, an invalid index is rebuilt first.
+
+        :param user_id: The ID of the user.
+        :return: A tuple of the offset and the length of the record, the length is 0 if there is no such user.
+        """
+        shard, slot = divmod(user_id, SHARD_SIZE)
+        self._check_index(shard)
+        entry = ShardedUserStore._read_at(self.index_file(shard), INDEX_HEADER.size + slot * INDEX_ENTRY.size,
+                                          INDEX_ENTRY.size)
+        if len(entry) < INDEX_ENTRY.size:
+            return 0, 0
+        return INDEX_ENTRY.unpack(entry)
+
+    @classmethod
+    def parse_record(cls, line):
+        """
+        Parses a line of a record file.
+
+        :param line: The line of the record file.
+        :exception ValueError is raised if the line is not a record.
+        :return: A tuple of the user ID and the tuple of the fields of the user, the fields are None for a tombstone.
+        """
+        record = loads(line)
+        if not isinstance(record, list) or len(record) not in [1, 6] or not isinstance(record[0], int):
+            raise ValueError("The {!r} line is not a user record!".format(line))
+        if len(record) == 1:
+            return int(record[0]), None
+        return int(record[0]), tuple(field.encode('utf-8') for field in record[1:])
+
+    @classmethod
+    def shard_records(cls, lines, shard):
+        """
+        Parses the lines of the record file of a shard. The torn records of the interrupted writes (a line which is not
+        a record or which has no line break) and the records of the other shards are skipped.
+
+        :param lines: An iterable of the lines of the record file, with their line breaks.
+        :param shard: The number of the shard.
+        :return: A generator of (offset, length, user ID, fields) tuples, the fields are None for a tombstone.
+        """
+        size = 0
+        for line in lines:
+            offset = size
+            size += len(line)
+            try:
+                user_id, fields = ShardedUserStore.parse_record(line)
+            except ValueError:
+                continue
+            if not line.endswith('\n') or user_id // SHARD_SIZE != shard:
+                continue
+            yield offset, len(line), user_id, fields
+
+    @classmethod
+    def record_file_shard(cls, file_name):
+        """
+        Determines the shard of a record file by it's name.
+
+        :param file_name: The name of the record file.
+        :return: The number of the shard, or None if the file is not a record file.
+        """
+        if not file_name.startswith('users_') or not file_name.endswith('.dat'):
+            return None
+        try:
+            return int(file_name[len('users_'):-len('.dat')])
+        except ValueError:
+            return None
+
+    def _read_record(self, user_id):
+        """
+        Reads the record of a user through the offset index.
+
+        :param user_id: The ID of the user.
+        :exception CorruptShardError is raised if the index entry doesn't point to a record of the user.
+        :return: The tuple of the fields of the user, or None if there is no such user.
+        """
+        offset, length = self._index_entry(user_id)
+        if length == 0:
+            return None
+        line = ShardedUserStore._read_at(self.record_file(user_id // SHARD_SIZE), offset, length)
+        try:
+            record_user_id, fields = ShardedUserStore.parse_record(line)
+        except ValueError:
+            raise CorruptShardError("The index entry of the user {} is invalid!".format(user_id))
+        if record_user_id != user_id or fields is None or not line.endswith('\n'):
+            raise CorruptShardError("The index entry of the user {} is invalid!".format(user_id))
+        return fields
+
+    def read(self, user_id):
+        """
+        Reads the fields of a user.
+
+        :param user_id: The ID of the user.
+        :return: A tuple of the first name, family name, birth date string, email address and password, or None if
+        there is no such user.
+        """
+        user_id = int(user_id)
+        try:
+            return self._read_record(user_id)
+        except CorruptShardError:
+            with self._locked():
+                try:
+                    return self._read_record(user_id)
+                except CorruptShardError:
+                    self.rebuild_index(user_id // SHARD_SIZE)
+                    return self._read_record(user_id)
+
+    def contains(self, user_id):
+        """
+        :param user_id: The ID of a user.
+        :return: Bool, TRUE if the user is stored.
+        """
+        return self._index_entry(int(user_id))[1] > 0
+
+    def shards(self):
+        """
+        Lists the shards.
+
+        :return: A sorted list of the shard numbers.
+        """
+        shards = set()
+        for file_name in os.listdir(self._location):
+            if file_name.startswith('users_') and file_name.endswith(('.dat', '.idx')):
+                try:
+                    shards.add(int(file_name[len('users_'):-len('.dat')]))
+                except ValueError:
+                    pass
+        return sorted(shards)
+
+    def user_ids(self):
+        """
+        Lists the stored users by reading the offset indexes.
+
+        :return: A sorted list of the user IDs.
+        """
+        user_ids = []
+        for shard in self.shards():
+            user_ids.extend(self.user_ids_of_shard(shard))
+        return user_ids
+
+    def max_user_id(self):
+        """
+        :return: The greatest stored user ID, or 0 if there is no user.
+        """
+        user_ids = self.user_ids()
+        return user_ids[-1] if user_ids else 0
+
+    def write(self, user_id, fields):
+        """
+        Saves the fields of a user, the record is appended to the record file of the shard.
+
+        :param user_id: The ID of the user.
+        :param fields: A tuple of the first name, family name, birth date string, email address and password.
+        :return:
+        """
+        user_id = int(user_id)
+        self._append(user_id, dumps([user_id] + [field.decode('utf-8') for field in fields]) + '\n', True)
+
+    def delete(self, user_id):
+        """
+        Deletes a user, a tombstone is appended to the record file of the shard.
+
+        :param user_id: The ID of the user.
+        :return: Bool, FALSE if there was no such user.
+        """
+        user_id = int(user_id)
+        with self._locked():
+            if not self.contains(user_id):
+                return False
+            self._append(user_id, dumps([user_id]) + '\n', False)
+            return True
+
+    def _append(self, user_id, line, live):
+        """
+        Appends a record to the record file of the shard of a user and updates the offset index.
+
+        :param user_id: The ID of the user.
+        :param line: The record line.
+        :param live: Bool, TRUE for a user record, FALSE for a tombstone.
+        :return:
+        """
+        shard, slot = divmod(user_id, SHARD_SIZE)
+        with self._locked():
+            old_length = self._index_entry(user_id)[1]
+            with open(self.record_file(shard), 'ab') as record_file:
+                record_file.seek(0, os.SEEK_END)
+                offset = record_file.tell()
+                if offset > 0 and ShardedUserStore._read_at(self.record_file(shard), offset - 1, 1) != '\n':
+                    # The torn record of an interrupted write is closed, so it doesn't swallow the new record.
+                    record_file.write('\n')
+                    offset += 1
+                record_file.write(line)
+                record_size = offset + len(line)
+            garbage = self._read_garbage(shard) + old_length + (0 if live else len(line))
+            with open(self._ensure_index(shard), 'r+b') as index_file:
+                index_file.seek(INDEX_HEADER.size + slot * INDEX_ENTRY.size)
+                index_file.write(INDEX_ENTRY.pack(offset, len(line)) if live else INDEX_ENTRY.pack(0, 0))
+                index_file.seek(0)
+                index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, garbage))
+            if garbage > COMPACTION_MIN_GARBAGE and 2 * garbage > record_size:
+                self.compact(shard)
+
+    def _ensure_index(self, shard):
+        """
+        Creates the offset index of a shard if it's missing.
+
+        :param shard: The number of the shard.
+        :return: The path of the offset index.
+        """
+        index_file = self.index_file(shard)
+        if not os.path.exists(index_file):
+            with open(index_file, 'wb') as new_index_file:
+                new_index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, 0))
+        return index_file
+
+    def _read_garbage(self, shard):
+        """
+        :param shard: The number of the shard.
+        :return: The number of the garbage bytes in the record file of the shard.
+        """
+        header = ShardedUserStore._read_at(self.index_file(shard), 0, INDEX_HEADER.size)
+        if len(header) < INDEX_HEADER.size:
+            return 0
+        magic, garbage = INDEX_HEADER.unpack(header)
+        return garbage if magic == INDEX_MAGIC else 0
+
+    def rebuild_index(self, shard):
+        """
+        Rebuilds the offset index of a shard by scanning it's record file, the last record of a user wins.
+
+        :param shard: The number of the shard.
+        :return:
+        """
+        with self._locked():
+            entries = dict()
+            size = 0
+            if os.path.exists(self.record_file(shard)):
+                with open(self.record_file(shard), 'rb') as record_file:
+                    for offset, length, user_id, fields in ShardedUserStore.shard_records(record_file, shard):
+                        if fields is None:
+                            entries.pop(user_id % SHARD_SIZE, None)
+                        else:
+                            entries[user_id % SHARD_SIZE] = (offset, length)
+                    size = os.fstat(record_file.fileno()).st_size
+            live_size = sum(length for _, length in entries.itervalues())
+            self._write_index(shard, entries, size - live_size)
+            module_logger.warning("The offset index of the {} shard of {} is rebuilt.".format(shard, self._location))
+
+    def _write_index(self, shard, entries, garbage):
+        """
+        Replaces the offset index of a shard, the new index is renamed into place.
+
+        :param shard: The number of the shard.
+        :param entries: A dictionary of the (offset, length) entries keyed by slot.
+        :param garbage: The number of the garbage bytes of the record file.
+        :return:
+        """
+        slots = max(entries) + 1 if entries else 0
+        content = [INDEX_HEADER.pack(INDEX_MAGIC, garbage)]
+        for slot in xrange(slots):
+            content.append(INDEX_ENTRY.pack(*entries.get(slot, (0, 0))))
+        temporary_file = self.index_file(shard) + '.tmp'
+        with open(temporary_file, 'wb') as index_file:
+            index_file.write(''.join(content))
+        os.rename(temporary_file, self.index_file(shard))
+
+    def compact(self, shard):
+        """
+        Copies the live records of a shard to a new record file and rewrites the offset index. The record file is
+        replaced first: if the index is not replaced (e.g. because of a crash) it's rebuilt at the next read.
+
+        :param shard: The number of the shard.
+        :return:
+        """
+        with self._locked():
+            for user_id in self.user_ids_of_shard(shard):
+                # A stale index is rebuilt before the records are copied.
+                self.read(user_id)
+            with open(self.record_file(shard), 'rb') as record_file:
+                records = record_file.read()
+            entries = dict()
+            temporary_file = self.record_file(shard) + '.tmp'
+            with open(temporary_file, 'wb') as new_record_file:
+                new_offset = 0
+                for user_id in self.user_ids_of_shard(shard):
+                    offset, length = self._index_entry(user_id)
+                    new_record_file.write(records[offset:offset + length])
+                    entries[user_id % SHARD_SIZE] = (new_offset, length)
+                    new_offset += length
+            os.rename(temporary_file, self.record_file(shard))
+            self._write_index(shard, entries, 0)
+            module_logger.info("The {} shard of {} is compacted.".format(shard, self._location))
+
+    def user_ids_of_shard(self, shard):
+        """
+        Lists the users of a shard, an invalid index is rebuilt first.
+
+        :param shard: The number of the shard.
+        :return: A sorted list of the user IDs.
+        """
+        self._check_index(shard)
+        entries = ShardedUserStore._read_at(self.index_file(shard), INDEX_HEADER.size, SHARD_SIZE * INDEX_ENTRY.size)
+        return [shard * SHARD_SIZE + slot for slot in xrange(len(entries) // INDEX_ENTRY.size)
+                if INDEX_ENTRY.unpack_from(entries, slot * INDEX_ENTRY.size)[1] > 0]
@@ -5,7 +5,7 @@ The data of the users are stored in the users directory (by default).
 
 The file names are the identifiers of the users.
 
-A new user identifier is generated by finding the maximal value of the identifiers and increasing by one.
+A new user identifier is allocated from the ID counter file of the users directory (see :py:mod:storage_utils).
 
 The fields of a user object stored in the text file line-by-line as:
 
@@ -15,20 +15,29 @@ The fields of a user object stored in the text file line-by-line as:
     email
     password
 
+The names and the email addresses of the users are indexed in the :py:const:USER_INDEX_FILE_NAME journal of the users
+directory. If the repository is configured to use the SQLite backend (see :py:mod:metadata_store), the users and the
+roles are stored in the database instead of the text files.
 """
 
 # Imports -----------------------------------------------------------------------------------------------------------
 import logging
+import re
 import xml.etree.ElementTree as ET
-from collections import Counter
-from datetime import datetime, date
-from json import load, dump
-from os import path, remove, listdir
-from re import match
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import date
+from json import load, loads, dumps
+from multiprocessing.pool import ThreadPool
+from os import path, remove, listdir, stat
 from shutil import move
+from threading import RLock
 
 import storage_utils
-from iniformat.reader import read_ini_file
+from iniformat.cache import cached_read_ini_file
+from iniformat.writer import write_atomically
+from metadata_store import configured_store, current_store
+from user_shards import ShardedUserStore, SHARDS_DIRECTORY_NAME
 
 # Authorship information  -------------------------------------------------------------------------------------------
 __author__ = "Zsolt Bokor Levente"
@@ -43,7 +52,23 @@ __status__ = "Development"
 
 DELIMITER_CHAR = ':'
 ROLE_DELIMITER_CHAR = ','
+USER_INDEX_FILE_NAME = '.user_index.jsonl'
+NGRAM_LENGTH = 3
+ADD_ROLE = 'add'
+REMOVE_ROLE = 'remove'
+ROLES_FILE_STORAGE = 'file'
+ROLES_JOURNAL_STORAGE = 'journal'
+ROLES_JOURNAL_FILE_NAME = '.roles_journal.jsonl'
+ROLES_JOURNAL_COMPACTION_THRESHOLD = 1000
+USER_CACHE_CAPACITY = 10000
+USER_FILES_STORAGE = 'files'
+USER_SHARDS_STORAGE = 'sharded'
+EMAIL_PATTERN = re.compile('^[_a-z0-9-]+(\.[_a-z0-9-]+)*@[a-z0-9-]+(\.[a-z0-9-]+)*(\.[a-z]{2,4})$')
 module_logger = logging.getLogger('repository.users')
+_role_managers = dict()
+_role_managers_lock = RLock()
+_user_caches = dict()
+_user_caches_lock = RLock()
 
 
 # -------------------------------------------------------------------------------------------------------------------
@@ -148,6 +173,27 @@ class User(object):
         else:
             raise TypeError("The {} password is not a valid string!".format(password))
 
+    @classmethod
+    def trusted(cls, first_name, family_name, birth, email, password):
+        """
+        Creates a :py:class:User object without validating the fields. It's used to build the users read from the
+        storage, their fields were validated when they were saved.
+
+        :param first_name: The :py:class:User object's first name.
+        :param family_name: The :py:class:User object's family name
+        :param birth: The :py:class:User object's birth date.
+        :param email: The :py:class:User object's email address.
+        :param password: The :py:class:User object's password.
+        :return: :py:class:User object.
+        """
+        user = cls.__new__(cls)
+        user._first_name = first_name
+        user._family_name = family_name
+        user._birth = birth
+        user._email = email
+        user._password = password
+        return user
+
     @classmethod
     def is_valid_name(cls, name):
         """
@@ -175,7 +221,7 @@ class User(object):
         :param email: String email address.
         :return: Bool, TRUE if the regex mathes the ``email``.
         """
-        return match('^[_a-z0-9-]+(\.[_a-z0-9-]+)*@[a-z0-9-]+(\.[a-z0-9-]+)*(\.[a-z]{2,4})$', email)
+        return EMAIL_PATTERN.match(email)
 
     @classmethod
     def is_valid_password(cls, password):
@@ -185,6 +231,8 @@ class User(object):
         :param password: String, password.
         :return: Bool, TRUE if the ``password`` is instanceo of string.
         """
+        if isinstance(password, str):
+            return True
         for char in password:
             if not isinstance(char, str):
                 return False
@@ -254,6 +302,49 @@ class User(object):
         return '{} {} {} {}'.format(self.full_name, self.birth, self.email, self.password)
 
 
+class LazyUser(User):
+    """:py:class:User read from the storage, it's fields are converted only when they are read and they are not
+    validated. It's used to evaluate the filters of :py:meth:UserManager.iter_users cheaply.
+    """
+
+    def __init__(self, first_name, family_name, birth, email, password):
+        """
+        Initialisation of a new :py:class:LazyUser object.
+
+        :param first_name: The stored first name.
+        :param family_name: The stored family name.
+        :param birth: The stored birth date string in YEAR-MONTH-DAY format.
+        :param email: The stored email address.
+        :param password: The stored password.
+        """
+        self._fields = (first_name, family_name, birth, email, password)
+
+    def __getattr__(self, name):
+        """
+        Converts a field of the :py:class:User when it's read for the first time.
+
+        :param name: The name of the attribute.
+        :exception AttributeError is raised if the ``name`` is not a field of the :py:class:User.
+        :return: The value of the field.
+        """
+        if name == '_fields':
+            raise AttributeError(name)
+        elif name == '_first_name':
+            value = self._fields[0]
+        elif name == '_family_name':
+            value = self._fields[1]
+        elif name == '_birth':
+            value = UserManager.parse_birth(self._fields[2])
+        elif name == '_email':
+            value = self._fields[3]
+        elif name == '_password':
+            value = self._fields[4]
+        else:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        setattr(self, name, value)
+        return value
+
+
 class Role(object):
     """Represents the roles of the users.
 
@@ -305,6 +396,19 @@ class RoleManager(object):
 
     The :py:class:RoleManager is defined by a :py:attr:_location path attribute. This equals to the :py:class:Repository
     object's users directory.
+
+    The parsed roles file is cached with an inverted index of the user IDs by role. The cache is keyed on the
+    modification time, the size and the inode of the roles file, so the file is parsed again only if it was changed
+    (by another :py:class:RoleManager or process). The roles stored by the SQLite backend are not cached, the lookups
+    are indexed queries of the database.
+
+    If the storage of the roles section of the paths file is :py:const:ROLES_JOURNAL_STORAGE, the roles file is a
+    snapshot and the changes are appended to the :py:const:ROLES_JOURNAL_FILE_NAME journal: a grant or a revocation
+    is appended as an :py:const:ADD_ROLE or :py:const:REMOVE_ROLE event of one role, so the changes of concurrent
+    writers commute, and a rewrite of the roles is appended as the new roles of the changed users. The journal is
+    replayed on the snapshot when the roles are read, and it's folded into the snapshot when it gets longer than
+    :py:const:ROLES_JOURNAL_COMPACTION_THRESHOLD lines (and twice the number of the users). The writers hold the
+    lock of the journal from reading its tail until their records are appended or the journal is folded.
     """
 
     def __init__(self, repository_location, paths_file):
@@ -313,56 +417,405 @@ class RoleManager(object):
 
         :param repository_location: The path of the users directory linked to the :py:class:Repository object.
         :param paths_file: Tbe paths file path of the :py:class:Repository object.
+        :exception ValueError is raised if the configured roles storage is unknown.
         """
-        metadata_data = read_ini_file(paths_file)
+        metadata_data = cached_read_ini_file(paths_file)
         self._location = path.join(repository_location, metadata_data['directories']['users'])
+        metadata_store = configured_store(repository_location, paths_file)
+        self._database_path = metadata_store.database_path if metadata_store else None
+        self._roles_storage = RoleManager.configured_storage(paths_file)
+        self._lock = RLock()
+        self._roles_file = None
+        self._roles_stamp = None
+        self._users_roles = dict()
+        self._users_by_role = dict()
+        self._journal = None
+        journal_file = path.join(self._location, ROLES_JOURNAL_FILE_NAME)
+        if not self.metadata_store and (self._roles_storage == ROLES_JOURNAL_STORAGE or path.exists(journal_file)):
+            self._journal = storage_utils.IndexJournal(journal_file, ROLES_JOURNAL_COMPACTION_THRESHOLD)
+            if self._roles_storage != ROLES_JOURNAL_STORAGE:
+                # The journal left by the journal storage is folded into the roles file.
+                self.compact()
+                remove(journal_file)
+                self._journal = None
+
+    @classmethod
+    def configured_storage(cls, paths_file):
+        """
+        Determines the roles storage configured in the roles section of the paths file.
+
+        :param paths_file: The paths file of the :py:class:Repository object.
+        :exception ValueError is raised if the configured storage is unknown.
+        :return: :py:const:ROLES_FILE_STORAGE or :py:const:ROLES_JOURNAL_STORAGE.
+        """
+        roles_storage = cached_read_ini_file(paths_file).get('roles', {}).get('storage', ROLES_FILE_STORAGE)
+        if roles_storage not in [ROLES_FILE_STORAGE, ROLES_JOURNAL_STORAGE]:
+            raise ValueError("The {} roles storage is unknown, it should be {} or {}!".format(
+                roles_storage, ROLES_FILE_STORAGE, ROLES_JOURNAL_STORAGE))
+        return roles_storage
+
+    @property
+    def roles_storage(self):
+        """
+        The property of the :py:attr:_roles_storage attribute.
+
+        :return: :py:const:ROLES_FILE_STORAGE or :py:const:ROLES_JOURNAL_STORAGE.
+        """
+        return self._roles_storage
+
+    @property
+    def metadata_store(self):
+        """
+        The :py:class:SQLiteMetadataStore of the :py:attr:_database_path, it's looked up for every operation (see
+        :py:func:metadata_store.current_store).
+
+        :return: The :py:class:SQLiteMetadataStore of the repository, or None if the roles file is used.
+        """
+        return current_store(self._database_path)
+
+    def _stat_roles_file(self):
+        """
+        Determines the path and the stamp of the roles file, the directory is listed only if the last known roles file
+        is missing.
+
+        :return: A tuple of the path and the (modification time, size, inode) stamp of the roles file.
+        """
+        if self._roles_file is not None:
+            try:
+                file_stat = stat(self._roles_file)
+                return self._roles_file, (file_stat.st_mtime, file_stat.st_size, file_stat.st_ino)
+            except OSError:
+                pass
+        roles_file = path.join(self._location, RoleManager.get_roles_file(self._location))
+        file_stat = stat(roles_file)
+        return roles_file, (file_stat.st_mtime, file_stat.st_size, file_stat.st_ino)
+
+    def _cache(self, roles_file, roles_stamp, users_roles):
+        """
+        Replaces the cached roles and rebuilds the inverted index.
+
+        :param roles_file: The path of the roles file.
+        :param roles_stamp: The stamp of the roles file.
+        :param users_roles: A dictionary, the key is a user ID and the value is the list of the :py:class:Role objects.
+        :return:
+        """
+        users_by_role = dict()
+        for user_id, roles in users_roles.iteritems():
+            for role in roles:
+                users_by_role.setdefault(role.role, set()).add(user_id)
+        self._roles_file = roles_file
+        self._roles_stamp = roles_stamp
+        self._users_roles = users_roles
+        self._users_by_role = users_by_role
+
+    def _cached_roles(self):
+        """
+        Returns the cached roles, the roles file is parsed again if it was modified since it was cached.
+
+        :return: A tuple of the cached roles and the inverted index, they must not be modified.
+        """
+        with self._lock:
+            roles_file, roles_stamp = self._stat_roles_file()
+            if roles_file != self._roles_file or roles_stamp != self._roles_stamp:
+                self._cache(roles_file, roles_stamp, RoleManager.parse_roles_file(roles_file))
+                if self._journal is not None:
+                    self._journal.rewind()
+            if self._journal is not None:
+                self._journal.read(self._replay, self._reload)
+            return self._users_roles, self._users_by_role
+
+    def _reload(self):
+        """
+        Parses the roles file again, it's called when the journal was replaced.
+
+        :return:
+        """
+        roles_file, roles_stamp = self._stat_roles_file()
+        self._cache(roles_file, roles_stamp, RoleManager.parse_roles_file(roles_file))
+
+    @contextmanager
+    def _locked(self):
+        """
+        Holds the lock of the manager and the lock of the journal (if the journal storage is used), so the tail of the
+        journal read by a writer can't be changed by the other processes until the writer's records are appended.
+
+        :return:
+        """
+        with self._lock:
+            if self._journal is None:
+                yield
+            else:
+                with self._journal.locked():
+                    yield
+
+    @classmethod
+    def replayed_roles(cls, roles, record, roles_file):
+        """
+        Determines the roles of a user after a record of the roles journal.
+
+        :param roles: The list of the :py:class:Role objects of the user, or None if the user has no roles.
+        :param record: A dictionary with the user ID and either the role names of the user (None if the user was
+        removed from the roles), or the :py:const:ADD_ROLE or :py:const:REMOVE_ROLE action and the role name.
+        :param roles_file: The name of the roles file, a user without roles has an empty role in a TXT roles file.
+        :return: The new list of the :py:class:Role objects of the user, or None if the user was removed from the roles.
+        """
+        if 'roles' in record:
+            return None if record['roles'] is None else [Role(str(role)) for role in record['roles']]
+        role = Role(str(record['role']))
+        # The empty role of a user without roles is not kept beside real roles.
+        roles = [user_role for user_role in roles or [] if user_role.role]
+        if record['action'] == ADD_ROLE:
+            return roles if role in roles else roles + [role]
+        roles = [user_role for user_role in roles if user_role.role != role.role]
+        if not roles and roles_file.endswith('txt'):
+            return [Role('')]
+        return roles
+
+    def _replay(self, record):
+        """
+        Applies one record of the journal to the cached roles.
+
+        :param record: A record of the journal, see :py:meth:replayed_roles.
+        :return:
+        """
+        user_id = record['user']
+        old_roles = self._users_roles.pop(user_id, None)
+        roles = RoleManager.replayed_roles(old_roles, record, self._roles_file)
+        for role in old_roles or []:
+            user_ids = self._users_by_role.get(role.role)
+            if user_ids is not None:
+                user_ids.discard(user_id)
+                if not user_ids:
+                    del self._users_by_role[role.role]
+        if roles is not None:
+            self._users_roles[user_id] = roles
+            for role in roles:
+                self._users_by_role.setdefault(role.role, set()).add(user_id)
+
+    def _append(self, records):
+        """
+        Appends records to the journal and compacts it if it's too long. The caller must hold the lock of the journal
+        (see :py:meth:_locked) since it has read the tail of the journal which the records are built from.
+
+        :param records: The list of the records, see :py:meth:replayed_roles.
+        :return:
+        """
+        self._journal.append(records, self._replay, self._reload)
+        if self._journal.needs_compaction(len(self._users_roles)):
+            self.compact()
+
+    def _stored_role_names(self, roles):
+        """
+        Determines the role names of a user as they are read back from the roles file.
+
+        :param roles: A list of :py:class:Role objects or role strings.
+        :return: A list of role strings.
+        """
+        role_names = [str(role) for role in roles or []]
+        # A user without roles is read back from a TXT roles file with an empty role.
+        if not role_names and self._roles_file.endswith('txt'):
+            return ['']
+        return role_names
+
+    def compact(self):
+        """
+        Folds the roles journal into the roles file: the roles file is rewritten atomically, then the journal is
+        emptied. The records of the journal are idempotent, so replaying them on the new roles file after a crash
+        between the two steps gives the same roles. The lock of the journal is held from reading its tail until it's
+        emptied, so the records appended by the other processes are not lost.
+
+        :return:
+        """
+        with self._locked():
+            if self._journal is None:
+                return
+            users_roles, _ = self._cached_roles()
+            self._write_roles_file(dict((user_id, list(roles)) for user_id, roles in users_roles.iteritems()))
+            self._journal.rewrite([], self._replay, self._reload)
+            module_logger.info("The roles journal of {} is compacted.".format(self._location))
+
+    def invalidate(self):
+        """
+        Drops the cached roles.
+
+        :return:
+        """
+        with self._lock:
+            self._roles_file = None
+            self._roles_stamp = None
+            self._users_roles = dict()
+            self._users_by_role = dict()
 
     def read_roles(self):
         """Read roles from the file.
 
         :return: The roles file data.
         """
-        return RoleManager.parse_roles_file(path.join(self._location, RoleManager.get_roles_file(self._location)))
+        if self.metadata_store:
+            return dict((user_id, [Role(role) for role in roles]) for user_id, roles in
+                        self.metadata_store.read_roles().iteritems())
+        users_roles, _ = self._cached_roles()
+        return dict((user_id, list(roles)) for user_id, roles in users_roles.iteritems())
+
+    def user_roles(self, user_id):
+        """
+        Determines the roles of a user.
+
+        :param user_id: :py:class:User object's ID.
+        :return: A list of :py:class:Role objects, or None if the user is not in the roles file.
+        """
+        if self.metadata_store:
+            roles = self.metadata_store.read_user_roles(user_id)
+            return None if roles is None else [Role(role) for role in roles]
+        users_roles, _ = self._cached_roles()
+        roles = users_roles.get(user_id)
+        return None if roles is None else list(roles)
+
+    def users_with_role(self, role):
+        """
+        Determines the users which have a role.
+
+        :param role: Role string.
+        :return: The sorted list of the user IDs.
+        """
+        if self.metadata_store:
+            return self.metadata_store.find_users_by_role(role)
+        _, users_by_role = self._cached_roles()
+        return sorted(users_by_role.get(role, ()))
+
+    def users_by_role(self):
+        """
+        Groups the user IDs by role.
+
+        :return: A dictionary, the key is a role string and the value is the sorted list of the user IDs.
+        """
+        if self.metadata_store:
+            users_by_role = dict()
+            for user_id, roles in sorted(self.metadata_store.read_roles().iteritems()):
+                for role in roles:
+                    users_by_role.setdefault(role, []).append(user_id)
+            return users_by_role
+        _, users_by_role = self._cached_roles()
+        return dict((role, sorted(user_ids)) for role, user_ids in users_by_role.iteritems())
+
+    def apply_changes(self, changes):
+        """
+        Applies role grants and revocations in memory and writes the roles once, if any of them changed the roles.
+        With the journal storage only the grants and revocations which changed the roles are appended to the journal.
+
+        :param changes: List of (action, user ID, role string) tuples, the action is :py:const:ADD_ROLE or
+        :py:const:REMOVE_ROLE.
+        :return: The list of the changes which didn't change the roles.
+        """
+        with self._locked():
+            if self.metadata_store:
+                users_roles = self.read_roles()
+            else:
+                users_roles, _ = self._cached_roles()
+            changed_users_roles = dict()
+            records = []
+            no_op_changes = []
+            for change in changes:
+                action, user_id, role = change
+                user_id = int(user_id)
+                role = Role(role)
+                if user_id in changed_users_roles:
+                    roles = changed_users_roles[user_id]
+                else:
+                    # The empty role of a user without roles is not kept beside real roles.
+                    roles = [user_role for user_role in users_roles.get(user_id, []) if user_role.role]
+                if (action == ADD_ROLE) == (role in roles):
+                    no_op_changes.append(change)
+                    continue
+                records.append({'user': user_id, 'action': action, 'role': role.role})
+                if action == ADD_ROLE:
+                    changed_users_roles[user_id] = roles + [role]
+                else:
+                    changed_users_roles[user_id] = [user_role for user_role in roles if user_role.role != role.role]
+            if changed_users_roles:
+                if self._journal is not None:
+                    self._append(records)
+                else:
+                    new_users_roles = dict((user_id, list(roles)) for user_id, roles in users_roles.iteritems())
+                    new_users_roles.update(changed_users_roles)
+                    self.write_roles(new_users_roles)
+            return no_op_changes
 
     def write_roles(self, users_roles):
         """Write roles to the file. The type of the roles file can be: TXT, XML, JSON.
 
+        :param users_roles: A :py:class:User object's roles defined by the :py:class:Roles object.
+        :return:
+        """
+        if self.metadata_store:
+            self.metadata_store.write_roles(dict((user_id, [str(role) for role in roles]) for user_id, roles in
+                                                  users_roles.iteritems()))
+            return
+        with self._locked():
+            if self._journal is None:
+                self._write_roles_file(users_roles)
+                return
+            cached_users_roles, _ = self._cached_roles()
+            changed_users_roles = dict()
+            if self._roles_file.endswith('txt'):
+                for user_id in set(cached_users_roles) - set(int(user_id) for user_id in users_roles):
+                    changed_users_roles[user_id] = None
+            for user_id, roles in users_roles.iteritems():
+                cached_roles = cached_users_roles.get(int(user_id))
+                if cached_roles is None or self._stored_role_names(cached_roles) != self._stored_role_names(roles):
+                    changed_users_roles[int(user_id)] = roles
+            if changed_users_roles:
+                self._append([{'user': user_id, 'roles': None if roles is None else self._stored_role_names(roles)}
+                              for user_id, roles in sorted(changed_users_roles.iteritems())])
+
+    def _write_roles_file(self, users_roles):
+        """
+        Writes the roles file atomically and caches the written roles.
+
         :param users_roles: A :py:class:User object's roles defined by the :py:class:Roles object.
         :return:
         """
         roles_file = path.join(self._location, RoleManager.get_roles_file(self._location))
         if roles_file.endswith('txt'):
-            with open(roles_file, 'w') as file_obj:
-                for id_key, roles_value in users_roles.iteritems():
-                    roles_str = ''
-                    for role in roles_value:
-                        roles_str += '{},'.format(role)
-                    file_obj.write('{}: {}\n'.format(id_key, roles_str[:-1]))
+            # A user without roles is read back with an empty role.
+            written_users_roles = dict((user_id, roles or [Role('')]) for user_id, roles in users_roles.iteritems())
+            lines = []
+            for id_key, roles_value in users_roles.iteritems():
+                roles_str = ''
+                for role in roles_value:
+                    roles_str += '{},'.format(role)
+                lines.append('{}: {}\n'.format(id_key, roles_str[:-1]))
+            content = ''.join(lines)
 
         elif roles_file.endswith('json'):
-            existing_users_roles = self.read_roles()
-            with open(roles_file, 'w') as file_obj:
-                existing_users_roles.update(users_roles)
-                serializable_existing_users_roles = dict()
-                for id_key, roles_value in existing_users_roles.iteritems():
-                    serializable_roles = []
-                    for role_obj in roles_value:
-                        serializable_roles.append(role_obj.role)
-                    serializable_existing_users_roles[id_key] = serializable_roles
-                dump(serializable_existing_users_roles, file_obj)
+            written_users_roles = self.read_roles()
+            written_users_roles.update(users_roles)
+            serializable_existing_users_roles = dict()
+            for id_key, roles_value in written_users_roles.iteritems():
+                serializable_roles = []
+                for role_obj in roles_value:
+                    serializable_roles.append(str(role_obj))
+                serializable_existing_users_roles[id_key] = serializable_roles
+            content = dumps(serializable_existing_users_roles)
 
         elif roles_file.endswith('xml'):
-            existing_users_roles = self.read_roles()
-            existing_users_roles.update(users_roles)
+            written_users_roles = self.read_roles()
+            written_users_roles.update(users_roles)
             root = ET.Element('users')
-            for id_key, roles_value in existing_users_roles.iteritems():
+            for id_key, roles_value in written_users_roles.iteritems():
                 user = ET.SubElement(root, 'user')
                 user.set('id', str(id_key))
                 for role in roles_value:
                     role_element = ET.SubElement(user, 'role')
-                    role_element.text = role
-            tree = ET.ElementTree(root)
-            tree.write(roles_file)
+                    role_element.text = str(role)
+            content = ET.tostring(root)
+        else:
+            return
+        write_atomically(roles_file, content)
+        file_stat = stat(roles_file)
+        self._cache(roles_file, (file_stat.st_mtime, file_stat.st_size, file_stat.st_ino),
+                    dict((int(user_id), [role if isinstance(role, Role) else Role(role) for role in roles or []])
+                         for user_id, roles in written_users_roles.iteritems()))
 
     @classmethod
     def get_roles_file(cls, folder_path):
@@ -395,25 +848,36 @@ class RoleManager(object):
         roles linked to the :py:class:User ID.
         """
         with open(roles_file) as file_obj:
-            if file_obj.readline() == '':
-                return dict()
+            return RoleManager.parse_roles(file_obj.read(), roles_file)
+
+    @classmethod
+    def parse_roles(cls, content, roles_file):
+        """
+        Parses the content of a roles file, e.g. a roles file read from a backup archive.
+
+        :param content: The content of the roles file.
+        :param roles_file: The name of the roles file, it's extension determines the format.
+        :exception WrongFileTypeError is raised if the roles file type is not TXT, XML or JSON.
+        :return: A dictionary, the key is a :py:class:User ID and the value is the list of the :py:class:Role objects
+        of the user.
+        """
+        if content == '':
+            return dict()
         if roles_file.endswith('txt'):
-            with open(roles_file) as file_obj:
-                users_roles = dict()
-                for line in file_obj:
-                    row = line.split(':')
-                    user_id = int(row[0].strip())
-                    raw_roles = row[1].strip().split(',')
-                    user_roles = []
-                    for role in raw_roles:
-                        user_roles.append(Role(role.strip()))
-                    users_roles[user_id] = user_roles
+            users_roles = dict()
+            for line in content.splitlines():
+                row = line.split(':')
+                user_id = int(row[0].strip())
+                raw_roles = row[1].strip().split(',')
+                user_roles = []
+                for role in raw_roles:
+                    user_roles.append(Role(role.strip()))
+                users_roles[user_id] = user_roles
             return users_roles
 
         elif roles_file.endswith('json'):
             users_roles = dict()
-            with open(roles_file) as file_obj:
-                data = load(file_obj)
+            data = loads(content)
             for id_key, roles_value in data.iteritems():
                 user_roles = []
                 for r in roles_value:
@@ -422,8 +886,7 @@ class RoleManager(object):
             return users_roles
 
         elif roles_file.endswith('xml'):
-            tree = ET.parse(roles_file)
-            users_root = tree.getroot()
+            users_root = ET.fromstring(content)
             users_roles = dict()
             for user in users_root:
                 user_id = int(user.attrib['id'])
@@ -438,6 +901,435 @@ class RoleManager(object):
                 "The {} file's type is inappropriate it should be TXT, JSON or XML!".format(roles_file))
 
 
+class UserCache(object):
+    """Least recently used cache of the built :py:class:User objects.
+
+    The cached :py:class:User objects are keyed by ID and they are valid while the stored fields of the user are the
+    same, so a user file or record which was modified is validated and built again. The :py:class:User objects are
+    read-only, the cached objects are shared by the callers.
+    """
+
+    def __init__(self, capacity = USER_CACHE_CAPACITY):
+        """
+        Initialisation of a new :py:class:UserCache object.
+
+        :param capacity: The maximal number of cached users.
+        """
+        self._entries = OrderedDict()
+        self._capacity = capacity
+        self._lock = RLock()
+
+    def build(self, user_id, fields):
+        """
+        Returns the :py:class:User object of the stored fields of a user, it's built only if it's not cached with the
+        same fields.
+
+        :param user_id: The ID of the user.
+        :param fields: A tuple of the first name, family name, birth date string, email address and password.
+        :return: :py:class:User object.
+        """
+        user_id = int(user_id)
+        fields = tuple(fields)
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None and entry[0] == fields:
+                self._entries[user_id] = entry
+                return entry[1]
+        user = UserManager.build_user(fields)
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._entries[user_id] = (fields, user)
+            if len(self._entries) > self._capacity:
+                self._entries.popitem(last = False)
+        return user
+
+    def discard(self, user_id):
+        """
+        Drops a user from the cache.
+
+        :param user_id: The ID of the user.
+        :return:
+        """
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+
+    def clear(self):
+        """
+        Drops all the cached users.
+
+        :return:
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def shared_user_cache(location):
+    """Returns the :py:class:UserCache of a users directory, the managers of a process share one cache per directory.
+
+    :param location: The path of the users directory.
+    :return: :py:class:UserCache object.
+    """
+    location = path.abspath(location)
+    with _user_caches_lock:
+        user_cache = _user_caches.get(location)
+        if user_cache is None:
+            user_cache = _user_caches[location] = UserCache()
+        return user_cache
+
+
+def shared_role_manager(repository_location, paths_file):
+    """Returns the :py:class:RoleManager of a repository, the managers of a process share one cached
+    :py:class:RoleManager per users directory. A new one is created if the storage backend of the repository was
+    changed.
+
+    :param repository_location: The path of the :py:class:Repository object.
+    :param paths_file: The paths file of the :py:class:Repository object.
+    :return: :py:class:RoleManager object.
+    """
+    users_location = path.abspath(path.join(repository_location,
+                                            cached_read_ini_file(paths_file)['directories']['users']))
+    metadata_store = configured_store(repository_location, paths_file)
+    with _role_managers_lock:
+        role_manager = _role_managers.get(users_location)
+        if role_manager is None or role_manager.metadata_store is not metadata_store or \
+                        role_manager.roles_storage != RoleManager.configured_storage(paths_file):
+            role_manager = _role_managers[users_location] = RoleManager(repository_location, paths_file)
+        return role_manager
+
+
+class UserIndex(object):
+    """Index of the names and the email addresses of the users stored in the users directory.
+
+    The lower case full names and email addresses are split into trigrams, a substring search intersects the sets of
+    the user IDs of the trigrams of the searched string and checks the candidates, so the user files are not read. The
+    exact email addresses are indexed too. The index is persisted in the :py:const:USER_INDEX_FILE_NAME journal (see
+    :py:class:IndexJournal), the users created or deleted without updating the journal are picked up when the users
+    directory is modified.
+    """
+
+    def __init__(self, location, shards = None):
+        """
+        Initialisation of a new :py:class:UserIndex object.
+
+        :param location: The path of the users directory.
+        :param shards: The :py:class:ShardedUserStore of the users directory, or None if the users are stored in one
+        file per user.
+        """
+        self._location = location
+        self._shards = shards
+        self._journal = storage_utils.IndexJournal(path.join(location, USER_INDEX_FILE_NAME))
+        self._lock = RLock()
+        self._loaded = False
+        self._directory_stamp = None
+        self._clear()
+
+    def _clear(self):
+        """
+        Empties the in-memory index.
+
+        :return:
+        """
+        self._entries = dict()
+        self._name_ngrams = dict()
+        self._email_ngrams = dict()
+        self._emails = dict()
+
+    @classmethod
+    def ngrams(cls, text):
+        """
+        Splits a text into it's trigrams.
+
+        :param text: Unicode text.
+        :return: A set of the trigrams.
+        """
+        return set(text[i:i + NGRAM_LENGTH] for i in xrange(len(text) - NGRAM_LENGTH + 1))
+
+    @classmethod
+    def search_key(cls, text):
+        """
+        Determines the indexed form of a name or an email address.
+
+        :param text: A str or unicode.
+        :return: The lower case unicode text.
+        """
+        if isinstance(text, str):
+            text = text.decode('utf-8')
+        return text.lower()
+
+    @classmethod
+    def index_entry(cls, fields):
+        """
+        Determines the indexed values of a user from it's stored fields.
+
+        :param fields: A tuple of the first name, family name, birth date, email address and password.
+        :return: A dictionary with the lower case full name and email address.
+        """
+        return {'name': UserIndex.search_key('{} {}'.format(fields[0].strip(), fields[1].strip())),
+                'email': UserIndex.search_key(fields[3].strip())}
+
+    def _insert(self, user_id, entry):
+        """
+        Adds a user to the in-memory index, the previous entry of the user is replaced.
+
+        :param user_id: The ID of the user.
+        :param entry: The indexed values returned by :py:meth:index_entry.
+        :return:
+        """
+        self._delete(user_id)
+        self._entries[user_id] = entry
+        for ngram in UserIndex.ngrams(entry['name']):
+            self._name_ngrams.setdefault(ngram, set()).add(user_id)
+        for ngram in UserIndex.ngrams(entry['email']):
+            self._email_ngrams.setdefault(ngram, set()).add(user_id)
+        self._emails.setdefault(entry['email'], set()).add(user_id)
+
+    def _delete(self, user_id):
+        """
+        Removes a user from the in-memory index.
+
+        :param user_id: The ID of the user.
+        :return:
+        """
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        for index, keys in [(self._name_ngrams, UserIndex.ngrams(entry['name'])),
+                            (self._email_ngrams, UserIndex.ngrams(entry['email'])), (self._emails, [entry['email']])]:
+            for key in keys:
+                user_ids = index.get(key)
+                if user_ids is not None:
+                    user_ids.discard(user_id)
+                    if not user_ids:
+                        del index[key]
+
+    def _replay(self, record):
+        """
+        Applies one record of the journal to the in-memory index.
+
+        :param record: A record of the journal.
+        :return:
+        """
+        if record.get('removed'):
+            self._delete(record['id'])
+        else:
+            self._insert(record['id'], {'name': record['name'], 'email': record['email']})
+
+    def _append(self, records):
+        """
+        Appends records to the journal and compacts it if it's too long.
+
+        :param records: List of dictionaries to write as JSON lines.
+        :return:
+        """
+        self._journal.append(records, self._replay, self._clear)
+        if self._journal.needs_compaction(len(self._entries)):
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrites the journal with one line per indexed user. The lines appended by other processes are read under the
+        lock of the journal before it's rewritten, so they are not lost.
+
+        :return:
+        """
+        with self._lock, self._journal.locked():
+            self._read_journal()
+            self._rewrite()
+
+    def _rewrite(self):
+        """
+        Rewrites the journal from the in-memory index, the caller holds the lock of the journal.
+
+        :return:
+        """
+        records = []
+        for user_id, entry in sorted(self._entries.iteritems()):
+            record = {'id': user_id}
+            record.update(entry)
+            records.append(record)
+        self._journal.rewrite(records, self._replay, self._clear)
+
+    def _read_user(self, user_id):
+        """
+        Reads the stored fields of a user.
+
+        :param user_id: The ID of the user.
+        :return: A tuple of the fields, or None if the user file doesn't exists.
+        """
+        if self._shards is not None:
+            fields = self._shards.read(user_id)
+            if fields is not None:
+                return fields
+        try:
+            with open(path.join(self._location, str(user_id))) as user_file:
+                return tuple(user_file.readline().rstrip('\n') for _ in range(5))
+        except IOError:
+            return None
+
+    def _stored_user_ids(self):
+        """
+        Lists the IDs of the user files.
+
+        :return: A set of user IDs.
+        """
+        user_ids = set()
+        for file_name in listdir(self._location):
+            try:
+                user_ids.add(int(file_name))
+            except ValueError:
+                pass
+        if self._shards is not None:
+            user_ids.update(self._shards.user_ids())
+        return user_ids
+
+    def rebuild(self):
+        """
+        Rebuilds the index from the user files and rewrites the journal.
+
+        :return:
+        """
+        with self._lock, self._journal.locked():
+            self._clear()
+            for user_id in self._stored_user_ids():
+                fields = self._read_user(user_id)
+                if fields is not None:
+                    self._insert(user_id, UserIndex.index_entry(fields))
+            self._loaded = True
+            self._rewrite()
+            self._directory_stamp = UserIndex.directory_stamp(self._location)
+            module_logger.info("The user index of {} is rebuilt.".format(self._location))
+
+    @classmethod
+    def directory_stamp(cls, directory):
+        """
+        Determines the modification time of a directory.
+
+        :param directory: The path of the directory.
+        :return: The modification time, or None if the directory doesn't exists.
+        """
+        try:
+            return stat(directory).st_mtime
+        except OSError:
+            return None
+
+    def _read_journal(self):
+        """
+        Reads the new lines of the journal, the first time it builds the journal if it's missing.
+
+        :return:
+        """
+        if not self._loaded:
+            self._loaded = True
+            if not self._journal.read(self._replay, self._clear):
+                self.rebuild()
+        else:
+            self._journal.read(self._replay, self._clear)
+
+    def synchronize(self):
+        """
+        Brings the in-memory index up to date: reads the new lines of the journal and indexes the users which were
+        created or removed without updating the journal.
+
+        :return:
+        """
+        with self._lock:
+            self._read_journal()
+            directory_stamp = UserIndex.directory_stamp(self._location)
+            if directory_stamp == self._directory_stamp:
+                return
+            self._directory_stamp = directory_stamp
+            stored_user_ids = self._stored_user_ids()
+            records = []
+            for user_id in set(self._entries) - stored_user_ids:
+                records.append({'id': user_id, 'removed': True})
+            for user_id in stored_user_ids - set(self._entries):
+                fields = self._read_user(user_id)
+                if fields is not None:
+                    record = {'id': user_id}
+                    record.update(UserIndex.index_entry(fields))
+                    records.append(record)
+            self._append(records)
+
+    def add(self, user_id, fields):
+        """
+        Indexes a saved user.
+
+        :param user_id: The ID of the user.
+        :param fields: A tuple of the first name, family name, birth date, email address and password.
+        :return:
+        """
+        with self._lock:
+            self._read_journal()
+            record = {'id': int(user_id)}
+            record.update(UserIndex.index_entry(fields))
+            self._append([record])
+            self._directory_stamp = UserIndex.directory_stamp(self._location)
+
+    def discard(self, user_id):
+        """
+        Removes a user from the index.
+
+        :param user_id: The ID of the removed user.
+        :return:
+        """
+        with self._lock:
+            self._read_journal()
+            if int(user_id) in self._entries:
+                self._append([{'id': int(user_id), 'removed': True}])
+            self._directory_stamp = UserIndex.directory_stamp(self._location)
+
+    def _find_substring(self, text, field):
+        """
+        Searches for the users which indexed field contains a text.
+
+        :param text: The text to search for.
+        :param field: The name of the field in the entries, 'name' or 'email'.
+        :return: A set of user IDs.
+        """
+        text = UserIndex.search_key(text)
+        with self._lock:
+            self.synchronize()
+            ngram_index = self._name_ngrams if field == 'name' else self._email_ngrams
+            if len(text) < NGRAM_LENGTH:
+                candidates = self._entries.keys()
+            else:
+                candidate_sets = sorted((ngram_index.get(ngram, set()) for ngram in UserIndex.ngrams(text)), key = len)
+                candidates = reduce(set.intersection, candidate_sets[1:], set(candidate_sets[0]))
+            return set(user_id for user_id in candidates if text in self._entries[user_id][field])
+
+    def find_by_name(self, name):
+        """
+        Searches for the users which full name contains the ``name``, the search is case insensitive.
+
+        :param name: A part of the full name.
+        :return: A set of user IDs.
+        """
+        return self._find_substring(name, 'name')
+
+    def find_by_email(self, email):
+        """
+        Searches for the users which email address contains the ``email``, the search is case insensitive.
+
+        :param email: A part of the email address.
+        :return: A set of user IDs.
+        """
+        return self._find_substring(email, 'email')
+
+    def find_by_exact_email(self, email):
+        """
+        Searches for the users with an email address, the comparison is case insensitive.
+
+        :param email: The email address.
+        :return: A set of user IDs.
+        """
+        with self._lock:
+            self.synchronize()
+            return set(self._emails.get(UserIndex.search_key(email.strip()), ()))
+
+
 class UserManager(object):
     """
     Manage user objects.
@@ -455,8 +1347,42 @@ class UserManager(object):
         """
         self.paths_file = paths_file
         self.repository_location = repository_location
-        metadata_data = read_ini_file(self.paths_file)
+        metadata_data = cached_read_ini_file(self.paths_file)
         self._location = path.join(self.repository_location, metadata_data['directories']['users'])
+        metadata_store = configured_store(self.repository_location, self.paths_file)
+        self._database_path = metadata_store.database_path if metadata_store else None
+        self._shards = None
+        if not self.metadata_store and UserManager.configured_storage(self.paths_file) == USER_SHARDS_STORAGE:
+            self._shards = ShardedUserStore(path.join(self._location, SHARDS_DIRECTORY_NAME))
+        self._index = None if self.metadata_store else UserIndex(self._location, self._shards)
+        self._role_manager = shared_role_manager(self.repository_location, self.paths_file)
+        self._user_cache = shared_user_cache(self._location)
+
+    @property
+    def metadata_store(self):
+        """
+        The :py:class:SQLiteMetadataStore of the :py:attr:_database_path, it's looked up for every operation (see
+        :py:func:metadata_store.current_store).
+
+        :return: The :py:class:SQLiteMetadataStore of the repository, or None if the flat files are used.
+        """
+        return current_store(self._database_path)
+
+    @classmethod
+    def configured_storage(cls, paths_file):
+        """
+        Determines the layout of the user files configured in the users section of the paths file.
+
+        :param paths_file: The paths file of the :py:class:Repository object.
+        :exception ValueError is raised if the configured layout is unknown.
+        :return: :py:const:USER_FILES_STORAGE (one file per user) or :py:const:USER_SHARDS_STORAGE (sharded record
+        files, see :py:mod:user_shards).
+        """
+        users_storage = cached_read_ini_file(paths_file).get('users', {}).get('storage', USER_FILES_STORAGE)
+        if users_storage not in [USER_FILES_STORAGE, USER_SHARDS_STORAGE]:
+            raise ValueError("The {} users storage is unknown, it should be {} or {}!".format(
+                users_storage, USER_FILES_STORAGE, USER_SHARDS_STORAGE))
+        return users_storage
 
     def save_user(self, user_id, user):
         """Save user to file.
@@ -465,12 +1391,24 @@ class UserManager(object):
         :param user: :py:class:User object.
         :return:
         """
-        with open(path.join(self._location, str(user_id)), 'w') as user_file:
-            user_file.write(user.first_name + '\n')
-            user_file.write(user.family_name + '\n')
-            user_file.write(str(user.birth) + '\n')
-            user_file.write(user.email + '\n')
-            user_file.write(''.join(user.password) + '\n')
+        if self.metadata_store:
+            self.metadata_store.save_user(int(user_id), user.first_name, user.family_name, str(user.birth),
+                                           user.email, ''.join(user.password))
+            return
+        fields = (user.first_name, user.family_name, str(user.birth), user.email, ''.join(user.password))
+        if self._shards is not None:
+            self._shards.write(user_id, fields)
+            # The user file of the old layout is superseded by the record.
+            if path.isfile(path.join(self._location, str(user_id))):
+                remove(path.join(self._location, str(user_id)))
+        else:
+            with open(path.join(self._location, str(user_id)), 'w') as user_file:
+                user_file.write(user.first_name + '\n')
+                user_file.write(user.family_name + '\n')
+                user_file.write(str(user.birth) + '\n')
+                user_file.write(user.email + '\n')
+                user_file.write(''.join(user.password) + '\n')
+        self._index.add(user_id, fields)
 
     def load_user(self, user_id):
         """Load user from file.
@@ -478,14 +1416,125 @@ class UserManager(object):
         :param user_id: :py:class:User object's ID.
         :return: :py:class:User object.
         """
+        if self.metadata_store:
+            fields = self.metadata_store.load_user(int(user_id))
+            if fields is None:
+                raise ValueError('The user id {} does not exist!'.format(user_id))
+            return self._user_cache.build(user_id, fields)
+        return self._user_cache.build(user_id, self.read_user_record(user_id))
+
+    def load_users(self, user_ids, workers = None):
+        """
+        Loads many :py:class:User objects at once: the records are read in one query (or the user files are read by a
+        pool of ``workers`` threads) and the objects are built through the cache of the users directory, so an
+        unchanged user is not validated again.
+
+        :param user_ids: The IDs of the :py:class:User objects.
+        :param workers: The number of threads reading the user files, None reads them one after the other.
+        :exception ValueError is raised if a :py:class:User object doesn't exists.
+        :return: A dictionary of the :py:class:User objects keyed by ID.
+        """
+        user_ids = sorted(set(int(user_id) for user_id in user_ids))
+        users = dict((user_id, self._user_cache.build(user_id, fields)) for user_id, fields in
+                     self._read_users(user_ids, workers))
+        missing_user_ids = [user_id for user_id in user_ids if user_id not in users]
+        if missing_user_ids:
+            raise ValueError('The user id {} does not exist!'.format(', '.join(str(i) for i in missing_user_ids)))
+        return users
+
+    def _read_users(self, user_ids, workers = None):
+        """
+        Reads the stored fields of users, the missing users are skipped.
+
+        :param user_ids: The sorted list of the IDs of the :py:class:User objects.
+        :param workers: The number of threads reading the user files, None reads them one after the other.
+        :return: A list of (user ID, fields) tuples ordered by ID.
+        """
+        if self.metadata_store:
+            return [(row[0], row[1:]) for row in self.metadata_store.load_users(user_ids)]
+
+        def read_user(user_id):
+            try:
+                return user_id, self.read_user_record(user_id)
+            except IOError:
+                return user_id, None
+
+        if workers and len(user_ids) > 1:
+            pool = ThreadPool(min(workers, len(user_ids)))
+            try:
+                records = pool.map(read_user, user_ids)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            records = [read_user(user_id) for user_id in user_ids]
+        return [(user_id, fields) for user_id, fields in records if fields is not None]
+
+    def read_user_record(self, user_id):
+        """
+        Reads the stored fields of a user from the sharded record files or from it's file.
+
+        :param user_id: :py:class:User object's ID.
+        :exception IOError is raised if the user doesn't exists.
+        :return: A tuple of the first name, family name, birth date string, email address and password.
+        """
+        if self._shards is not None:
+            fields = self._shards.read(user_id)
+            if fields is not None:
+                return fields
+        return self.read_user_file(user_id)
+
+    def read_user_file(self, user_id):
+        """
+        Reads the stored fields of a user from it's file.
+
+        :param user_id: :py:class:User object's ID.
+        :return: A tuple of the first name, family name, birth date string, email address and password.
+        """
         with open(path.join(self._location, str(user_id))) as user_file:
-            first_name = user_file.readline().rstrip('\n')
-            family_name = user_file.readline().rstrip('\n')
-            birth = datetime.strptime(user_file.readline().rstrip('\n'), "%Y-%m-%d").date()
-            email = user_file.readline().rstrip('\n')
-            password = user_file.readline().rstrip('\n')
-        user = User(first_name, family_name, birth, email, password)
-        return user
+            return tuple(user_file.readline().rstrip('\n') for _ in range(5))
+
+    @classmethod
+    def build_user(cls, fields):
+        """
+        Builds a :py:class:User object from it's stored fields, the fields are not validated again.
+
+        :param fields: A tuple of the first name, family name, birth date string, email address and password.
+        :return: :py:class:User object.
+        """
+        first_name, family_name, birth, email, password = fields
+        return User.trusted(first_name, family_name, UserManager.parse_birth(birth), email, password)
+
+    @classmethod
+    def parse_birth(cls, birth):
+        """
+        Converts a stored birth date string to a date, it's faster than :py:meth:datetime.strptime.
+
+        :param birth: The birth date string in YEAR-MONTH-DAY format.
+        :exception ValueError is raised if the ``birth`` is not a date in YEAR-MONTH-DAY format.
+        :return: Date object.
+        """
+        year, month, day = birth.split('-')
+        return date(int(year), int(month), int(day))
+
+    def iter_users(self, filter = None, batch_size = storage_utils.ITER_BATCH_SIZE):
+        """
+        Iterates over the :py:class:User objects in the order of their IDs, the users are read in batches of
+        ``batch_size`` users, so the memory usage doesn't depend on the number of the users.
+
+        The ``filter`` predicate is called with a :py:class:LazyUser, so only the fields read by the predicate are
+        converted, a rejected user is never validated and built.
+
+        :param filter: A function which gets a :py:class:User and returns True if the user is needed, None accepts
+        every user.
+        :param batch_size: The number of users read at once.
+        :return: A generator of (user ID, :py:class:User object) tuples.
+        """
+        for batch in storage_utils.batched(sorted(self.find_all_users()), batch_size):
+            for user_id, fields in self._read_users(batch):
+                if filter is not None and not filter(LazyUser(*fields)):
+                    continue
+                yield user_id, self._user_cache.build(user_id, fields)
 
     def add_user(self, user):
         """
@@ -494,10 +1543,36 @@ class UserManager(object):
         :param user: :py:class:User object
         :return: :py:class:User object's ID.
         """
+        if self._shards is not None and not path.exists(path.join(self._location, storage_utils.NEXT_ID_FILE_NAME)):
+            # The counter can't be bootstrapped from the directory, the records are not files.
+            storage_utils.ensure_next_id(self._location, self._shards.max_user_id() + 1)
         user_id = storage_utils.get_next_id(self._location)
+        while self._shards is not None and self._shards.contains(user_id):
+            user_id = storage_utils.get_next_id(self._location)
         self.save_user(user_id, user)
         return user_id
 
+    def pack_user_files(self):
+        """
+        Moves the users stored in one file per user into the sharded record files.
+
+        :exception RuntimeError is raised if the sharded layout is not configured.
+        :return: The number of the moved users.
+        """
+        if self._shards is None:
+            raise RuntimeError("The users of {} are not stored in sharded record files!".format(self._location))
+        user_ids = []
+        for file_name in listdir(self._location):
+            try:
+                user_ids.append(int(file_name))
+            except ValueError:
+                pass
+        for user_id in sorted(user_ids):
+            self._shards.write(user_id, self.read_user_file(user_id))
+            remove(path.join(self._location, str(user_id)))
+        module_logger.info("{} user files of {} are packed into the shards.".format(len(user_ids), self._location))
+        return len(user_ids)
+
     def update_user(self, user_id, user):
         """
         Updates a :py:class:User object in the filesystem.
@@ -518,10 +1593,40 @@ class UserManager(object):
         :return:
         """
         user_file_path = path.join(self._location, str(user_id))
-        if path.exists(user_file_path):
+        if self.metadata_store and self.metadata_store.has_user(int(user_id)):
+            self.metadata_store.remove_user(int(user_id))
+        elif not self.metadata_store and self._shards is not None and self._shards.delete(user_id):
+            self._index.discard(user_id)
+        elif not self.metadata_store and path.exists(user_file_path):
             remove(user_file_path)
+            self._index.discard(user_id)
         else:
             raise ValueError('The user id {} does not exist!'.format(user_id))
+        self._user_cache.discard(user_id)
+
+    def reload_users(self, user_ids):
+        """
+        Indexes users again whose files were replaced outside of the :py:class:UserManager object (e.g. by a restore),
+        the users whose files were deleted are removed from the index.
+
+        :param user_ids: The IDs of the replaced users.
+        :return:
+        """
+        for user_id in user_ids:
+            self._user_cache.discard(user_id)
+            if self._index is not None:
+                self._index.discard(user_id)
+                if path.isfile(path.join(self._location, str(user_id))):
+                    self._index.add(user_id, self.read_user_file(user_id))
+
+    def reload_roles(self):
+        """
+        Drops the cached roles after the roles file was replaced outside of the :py:class:UserManager object (e.g. by a
+        restore).
+
+        :return:
+        """
+        self._role_manager.invalidate()
 
     def find_user_by_id(self, user_id):
         """
@@ -531,8 +1636,9 @@ class UserManager(object):
         :exception ValueError is raised if :py:class:User object with the ``user_id`` ID doesn't exists.
         :return: :py:class:User object.
         """
-        user_file_path = path.join(self._location, str(user_id))
-        if path.exists(user_file_path):
+        if self.metadata_store:
+            return self.load_user(user_id)
+        if self.has_user(user_id):
             user = self.load_user(user_id)
             return user
         else:
@@ -546,15 +1652,9 @@ class UserManager(object):
         :param name: A string to search for in the :py:attr:first_name and :py:attr:family_name.
         :return: :py:class:User objects in a list.
         """
-        all_files = UserManager.all_files_in_folder(self._location)
-        found_users = []
-        for user_file in all_files:
-            with open(path.join(self._location, user_file)) as file_obj:
-                first_name = file_obj.readline().strip()
-                family_name = file_obj.readline().strip()
-                if name.lower() in '{} {}'.format(first_name.lower(), family_name.lower()):
-                    found_users.append(user_file)
-        return found_users
+        if self.metadata_store:
+            return [str(user_id) for user_id in self.metadata_store.find_users_by_name(name)]
+        return [str(user_id) for user_id in sorted(self._index.find_by_name(name))]
 
     def find_users_by_email(self, email):
         """
@@ -563,14 +1663,21 @@ class UserManager(object):
         :param email: The email address to search for.
         :return: :py:class:User objects in a list.
         """
-        all_files = UserManager.all_files_in_folder(self._location)
-        found_users = []
-        for user_file in all_files:
-            with open(path.join(self._location, user_file)) as file_obj:
-                for i, line in enumerate(file_obj):
-                    if i + 1 == 4 and email.lower() in line.strip().lower():
-                        found_users.append(user_file)
-        return found_users
+        if self.metadata_store:
+            return [str(user_id) for user_id in self.metadata_store.find_users_by_email(email)]
+        return [str(user_id) for user_id in sorted(self._index.find_by_email(email))]
+
+    def find_users_by_exact_email(self, email):
+        """
+        Find :py:class:User objects by the whole email address, the comparison is case insensitive.
+
+        :param email: The email address to search for.
+        :return: The IDs of the :py:class:User objects in a list, the IDs are strings like the IDs found by
+        :py:meth:find_users_by_email.
+        """
+        if self.metadata_store:
+            return [str(user_id) for user_id in self.metadata_store.find_users_by_exact_email(email)]
+        return [str(user_id) for user_id in sorted(self._index.find_by_exact_email(email))]
 
     def find_users_by_role(self, role):
         """
@@ -579,15 +1686,10 @@ class UserManager(object):
         :param role: Role string.
         :return: :py:class:User objects in a list.
         """
-        role_manager = RoleManager(self.repository_location, self.paths_file)
-        users_roles = role_manager.read_roles()
-        found_users = []
         role = Role(role).role
-        for id_key, roles_value in users_roles.iteritems():
-            for role_obj in roles_value:
-                if role == role_obj.role:
-                    found_users.append(self.find_user_by_id(id_key))
-        return found_users
+        user_ids = self._role_manager.users_with_role(role)
+        users = self.load_users(user_ids)
+        return [users[user_id] for user_id in user_ids]
 
     def add_role(self, user_id, role):
         """
@@ -597,16 +1699,7 @@ class UserManager(object):
         :param role: Role string to add to the :py:class:User object.
         :return:
         """
-        role = Role(role)
-        _ = self.find_user_by_id(user_id)
-        role_manager = RoleManager(self.repository_location, self.paths_file)
-        users_roles = role_manager.read_roles()
-        if user_id not in users_roles:
-            users_roles[user_id] = [role]
-        else:
-            if role not in users_roles[user_id]:
-                users_roles[user_id].append(role)
-        role_manager.write_roles(users_roles)
+        self.apply_role_changes([(ADD_ROLE, user_id, role)])
 
     def remove_role(self, user_id, role):
         """
@@ -616,18 +1709,58 @@ class UserManager(object):
         :param role: Role string to remove from the :py:class:User object.
         :return:
         """
-        role_manager = RoleManager(self.repository_location, self.paths_file)
-        users_roles = role_manager.read_roles()
-        _ = self.find_user_by_id(user_id)
-        if user_id not in users_roles:
+        self._check_role_changes([(REMOVE_ROLE, user_id, role)])
+        if self._role_manager.user_roles(user_id) is None:
             raise RuntimeError(
                 "The user with {} user ID has no roles, can't remove {} role!".format(user_id, Role(role)))
-        else:
-            if Role(role) in users_roles[user_id]:
-                users_roles[user_id] = users_roles[user_id].remove(Role(role))
-            if not users_roles[user_id]:
-                users_roles[user_id] = []
-        role_manager.write_roles(users_roles)
+        self._role_manager.apply_changes([(REMOVE_ROLE, user_id, role)])
+
+    def apply_role_changes(self, changes):
+        """
+        Adds and removes roles of many :py:class:User objects with one write of the roles file (or one transaction of
+        the metadata database). All the changes are validated before the roles are changed, then they are applied in
+        order. Adding a role which the user already has or removing a role which the user doesn't have is a no-op.
+
+        :param changes: Iterable of (action, user ID, role string) tuples, the action is :py:const:ADD_ROLE or
+        :py:const:REMOVE_ROLE.
+        :exception ValueError is raised if an action, a role or a user ID is invalid, then no role is changed.
+        :return: The list of the no-op changes.
+        """
+        changes = list(changes)
+        self._check_role_changes(changes)
+        return self._role_manager.apply_changes(changes)
+
+    def _check_role_changes(self, changes):
+        """
+        Validates role changes.
+
+        :param changes: List of (action, user ID, role string) tuples.
+        :exception ValueError is raised if an action, a role or a user ID is invalid.
+        :return:
+        """
+        checked_user_ids = set()
+        for action, user_id, role in changes:
+            if action not in [ADD_ROLE, REMOVE_ROLE]:
+                raise ValueError("The '{}' role change is invalid, it should be '{}' or '{}'!".format(
+                    action, ADD_ROLE, REMOVE_ROLE))
+            Role(role)
+            if user_id not in checked_user_ids:
+                if not self.has_user(user_id):
+                    raise ValueError('The user id {} does not exist!'.format(user_id))
+                checked_user_ids.add(user_id)
+
+    def has_user(self, user_id):
+        """
+        Checks if a :py:class:User object is stored.
+
+        :param user_id: :py:class:User object's ID.
+        :return: Bool, TRUE if the user exists.
+        """
+        if self.metadata_store:
+            return self.metadata_store.has_user(user_id)
+        if self._shards is not None and self._shards.contains(user_id):
+            return True
+        return path.isfile(path.join(self._location, str(user_id)))
 
     def has_role(self, user_id, role):
         """
@@ -637,12 +1770,11 @@ class UserManager(object):
         :param role: Role string to search for within the :py:class:User object.
         :return: Bool, TRUE if the :py:class:User object has a ``role``.
         """
-        role_manager = RoleManager(self.repository_location, self.paths_file)
-        users_roles = role_manager.read_roles()
-        if user_id not in users_roles:
+        user_roles = self._role_manager.user_roles(user_id)
+        if user_roles is None:
             raise RuntimeError("No user with {} ID!".format(user_id))
         else:
-            return Role(role) in users_roles[user_id]
+            return Role(role) in user_roles
 
     def list_users_by_role(self):
         """
@@ -651,16 +1783,7 @@ class UserManager(object):
         :return: A dictionary whithin the key of the distinct roles and the value of the :py:class:User objects ID in a
         list.
         """
-        role_manager = RoleManager(self.repository_location, self.paths_file)
-        users_roles = role_manager.read_roles()
-        users_by_roles = dict()
-        for id_key, roles_values in users_roles.iteritems():
-            for role in roles_values:
-                if role.role in users_by_roles:
-                    users_by_roles[role.role].append(id_key)
-                else:
-                    users_by_roles[role.role] = [id_key]
-        return users_by_roles
+        return self._role_manager.users_by_role()
 
     def check_role_file(self, roles_file = None):
         """
@@ -669,8 +1792,7 @@ class UserManager(object):
         :param roles_file: The path of the role file.
         :return: Bool, TRUE if no errors was found in the content of the file.
         """
-        role_manager = RoleManager(self.repository_location, self.paths_file)
-        user_roles = role_manager.read_roles()
+        user_roles = self._role_manager.read_roles()
         if not roles_file:
             roles_file = path.join(self._location, RoleManager.get_roles_file(self._location))
         if RoleManager.get_roles_file(self._location).endswith('txt'):
@@ -787,7 +1909,7 @@ class UserManager(object):
         files_and_folders = listdir(file_path)
         all_files = []
         for item in files_and_folders:
-            if path.isfile(path.join(file_path, item)) and item.split('.')[0] != 'roles':
+            if path.isfile(path.join(file_path, item)) and item.split('.')[0] != 'roles' and not item.startswith('.'):
                 if len(file_format) != 0:
                     if item.endswith(file_format):
                         all_files.append(item)
@@ -801,6 +1923,8 @@ class UserManager(object):
 
         :return: A list of the available :py:class:User object IDs.
         """
+        if self.metadata_store:
+            return self.metadata_store.user_ids()
         all_available_users = []
         for file_or_folder in listdir(self._location):
             if path.isfile(path.join(self._location, file_or_folder)):
@@ -808,6 +1932,8 @@ class UserManager(object):
                     all_available_users.append(int(file_or_folder))
                 except:
                     pass
+        if self._shards is not None:
+            return sorted(set(all_available_users).union(self._shards.user_ids()))
         return all_available_users
 
     def count_users(self):